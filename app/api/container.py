@@ -0,0 +1,187 @@
+"""Application-scoped services, built once in the lifespan and shared by requests."""
+
+import asyncio
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Set
+from pymongo import MongoClient
+from app.core.cancellation import CancellationToken
+from app.core.concurrency import AdaptiveConcurrencyLimiter
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.repositories import IDocumentRepository, MongoDocumentRepository
+from app.services import (
+    DocumentService,
+    IFileStorageService,
+    IOCRService,
+    LocalFileStorageService,
+    NearDuplicateIndex,
+    QwenOCRService,
+    RemoteInferencePipeline,
+    RetentionService
+)
+
+logger = get_logger(__name__)
+
+# Why an in-flight request was cancelled by a drain; the client should retry elsewhere
+SHUTDOWN_REASON = "shutdown"
+
+
+class ServiceContainer:
+    """
+    Owns the services requests share and the process's shutdown sequence.
+
+    Extraction requests register with `track` while they run. `drain` stops new
+    ones (they get 503 while `draining`), waits up to a grace period for the
+    tracked ones to finish, then cancels the rest with reason "shutdown" so
+    their clients retry on another instance. Every write a request makes
+    (upload file, Mongo record) happens before its response, so once the
+    tracked requests are gone there is nothing left to flush and `shutdown`
+    can close the Mongo client.
+    """
+
+    def __init__(
+        self,
+        repository: IDocumentRepository,
+        file_storage: IFileStorageService,
+        ocr_service: IOCRService,
+        mongo_client: Optional[MongoClient] = None
+    ):
+        self.mongo_client = mongo_client
+        self.repository = repository
+        self.file_storage = file_storage
+        self.ocr_service = ocr_service
+        self.near_duplicates = NearDuplicateIndex() if settings.near_duplicate_mode != "off" else None
+        self.document_service = DocumentService(
+            repository=repository,
+            file_storage=file_storage,
+            ocr_service=ocr_service,
+            near_duplicates=self.near_duplicates
+        )
+        self.limiter = AdaptiveConcurrencyLimiter() if settings.concurrency_limit_enabled else None
+        self.draining = False
+        self._inflight: Set[CancellationToken] = set()
+        self._retention_task: Optional[asyncio.Task] = None
+        self._drain_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def create(cls) -> "ServiceContainer":
+        """Build the production services (MongoDB, local uploads, Qwen OCR)."""
+        mongo_client = MongoClient(settings.mongo_uri)
+        pipeline = (
+            RemoteInferencePipeline(settings.model_server_socket)
+            if settings.model_server_socket else None
+        )
+        return cls(
+            repository=MongoDocumentRepository(mongo_client),
+            file_storage=LocalFileStorageService(),
+            ocr_service=QwenOCRService(pipeline=pipeline),
+            mongo_client=mongo_client
+        )
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    @contextmanager
+    def track(self, token: CancellationToken) -> Iterator[None]:
+        """Count an extraction request as in flight for the duration of the block."""
+        self._inflight.add(token)
+        metrics.set_gauge("inflight_extractions", len(self._inflight))
+        try:
+            yield
+        finally:
+            self._inflight.discard(token)
+            metrics.set_gauge("inflight_extractions", len(self._inflight))
+
+    async def start(self) -> None:
+        """Warm the near-duplicate index and start background work owned by the container."""
+        if self.near_duplicates is not None:
+            await self.near_duplicates.load(self.repository)
+        if settings.retention_enabled:
+            retention = RetentionService(self.repository, self.file_storage)
+            self._retention_task = asyncio.create_task(retention.run())
+
+    def install_signal_handler(self) -> None:
+        """
+        Drain on SIGTERM before handing the signal to the server.
+
+        The server's own handler runs once the drain is over, so the process
+        keeps answering (503 for new extractions, not-ready for the load
+        balancer) until in-flight work is done. Signal handlers can only be
+        set from the main thread; elsewhere (test clients) this is a no-op
+        and the drain in `shutdown` still applies.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def hand_over(frame) -> None:
+            if callable(previous):
+                previous(signal.SIGTERM, frame)
+            else:
+                signal.signal(signal.SIGTERM, previous)
+                signal.raise_signal(signal.SIGTERM)
+
+        def on_sigterm(signum, frame) -> None:
+            if self._drain_task is not None:
+                # Second SIGTERM: stop waiting
+                hand_over(frame)
+                return
+
+            def begin() -> None:
+                self._drain_task = loop.create_task(self.drain())
+                self._drain_task.add_done_callback(lambda _: hand_over(frame))
+
+            loop.call_soon_threadsafe(begin)
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+
+    async def drain(self, grace_seconds: Optional[float] = None) -> None:
+        """Refuse new extractions, let in-flight ones finish, then cancel stragglers."""
+        grace_seconds = settings.shutdown_grace_seconds if grace_seconds is None else grace_seconds
+        if not self.draining:
+            self.draining = True
+            logger.info(f"Draining: {self.inflight} extractions in flight, {grace_seconds:.0f}s grace")
+
+        if await self._wait_idle(grace_seconds):
+            return
+
+        stragglers = list(self._inflight)
+        logger.warning(f"Grace period over: cancelling {len(stragglers)} extractions for retry elsewhere")
+        for token in stragglers:
+            token.cancel(SHUTDOWN_REASON)
+        metrics.inc("shutdown_cancelled_total", len(stragglers))
+        # Cancelled work stops at the next decode step; give it a moment to answer
+        if not await self._wait_idle(settings.shutdown_cancel_wait_seconds):
+            logger.error(f"{self.inflight} extractions still running after cancellation")
+
+    async def shutdown(self) -> None:
+        """Drain (if the signal handler has not already) and release resources."""
+        if self._drain_task is not None:
+            await asyncio.shield(self._drain_task)
+        else:
+            await self.drain()
+
+        if self._retention_task is not None:
+            self._retention_task.cancel()
+            try:
+                await self._retention_task
+            except asyncio.CancelledError:
+                pass
+
+        if self.mongo_client is not None:
+            await asyncio.to_thread(self.mongo_client.close)
+        logger.info("Services closed")
+
+    async def _wait_idle(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while self._inflight:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
@@ -1,44 +1,149 @@
 """Dependency injection setup."""
 
+import asyncio
+import time
 from functools import lru_cache
-from pymongo import MongoClient
+from typing import AsyncIterator, List, Optional
+from fastapi import Header, HTTPException, Query, Request
+from app.api.container import ServiceContainer
+from app.core.cancellation import CancellationToken
 from app.core.config import settings
-from app.repositories import MongoDocumentRepository, IDocumentRepository
-from app.services import (
-    LocalFileStorageService, 
-    IFileStorageService,
-    QwenOCRService,
-    IOCRService,
-    DocumentService
-)
+from app.core.metrics import metrics
+from app.core.profiling import ProfileStore, is_admin_token
+from app.models import Priority, ProcessingOptions
+from app.repositories import IDocumentRepository
+from app.services import IFileStorageService, IOCRService, DocumentService
+
+
+def get_container(request: Request) -> ServiceContainer:
+    """Get the application's service container (built in the lifespan)."""
+    return request.app.state.container
+
+
+def get_document_repository(request: Request) -> IDocumentRepository:
+    """Get the shared document repository."""
+    return get_container(request).repository
+
+
+def get_file_storage_service(request: Request) -> IFileStorageService:
+    """Get the shared file storage service."""
+    return get_container(request).file_storage
+
+
+def get_ocr_service(request: Request) -> IOCRService:
+    """Get the shared OCR service."""
+    return get_container(request).ocr_service
+
+
+def get_document_service(request: Request) -> DocumentService:
+    """Get the shared document service."""
+    return get_container(request).document_service
 
 
 @lru_cache()
-def get_mongo_client() -> MongoClient:
-    """Get MongoDB client instance."""
-    return MongoClient(settings.mongo_uri)
+def get_profile_store() -> ProfileStore:
+    """Get the on-disk profile store."""
+    return ProfileStore()
 
 
-def get_document_repository() -> IDocumentRepository:
-    """Get document repository instance."""
-    client = get_mongo_client()
-    return MongoDocumentRepository(client)
+def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """Reject requests that do not carry the configured admin token."""
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
 
 
-def get_file_storage_service() -> IFileStorageService:
-    """Get file storage service instance."""
-    return LocalFileStorageService()
+async def _watch_for_cancellation(request: Request, token: CancellationToken) -> None:
+    """Cancel `token` when the client disconnects or the server-side timeout passes."""
+    timeout_at = (
+        time.monotonic() + settings.request_timeout_seconds
+        if settings.request_timeout_seconds else None
+    )
+    while not token.cancelled:
+        if await request.is_disconnected():
+            token.cancel("client_disconnected")
+            return
+        if timeout_at is not None and time.monotonic() >= timeout_at:
+            token.cancel("timeout")
+            return
+        await asyncio.sleep(settings.disconnect_poll_interval)
 
 
-def get_ocr_service() -> IOCRService:
-    """Get OCR service instance."""
-    return QwenOCRService()
+def _parse_pages(pages: str) -> List[int]:
+    """Parse a page selection such as "1,3-4" into sorted 1-based page numbers."""
+    selected = set()
+    try:
+        for part in pages.split(","):
+            first, _, last = part.strip().partition("-")
+            start, end = int(first), int(last or first)
+            if start < 1 or end < start:
+                raise ValueError(part)
+            selected.update(range(start, end + 1))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid page selection: {pages!r}")
+    return sorted(selected)
 
 
-def get_document_service() -> DocumentService:
-    """Get document service instance."""
-    return DocumentService(
-        repository=get_document_repository(),
-        file_storage=get_file_storage_service(),
-        ocr_service=get_ocr_service()
+async def get_processing_options(
+    request: Request,
+    skip_quality_gate: bool = Query(default=False, description="Run extraction even if the image fails the quality gate"),
+    skip_duplicate_check: bool = Query(default=False, description="Extract even if a recent upload looks the same"),
+    document_mode: Optional[bool] = Query(default=None, description="Extract all pages in one generation and return one merged result"),
+    pages: Optional[str] = Query(default=None, description="Pages to extract, e.g. 1,3-4 (default: all)"),
+    x_priority: Optional[Priority] = Header(default=None, description="Override the endpoint's scheduling class"),
+    x_deadline_ms: Optional[int] = Header(default=None, description="Give up if inference has not started within this many ms")
+) -> AsyncIterator[ProcessingOptions]:
+    """
+    Build per-request processing options from the query string and headers.
+    
+    The options carry a cancellation token that is tripped if the client
+    disconnects, the request outlives `request_timeout_seconds` or a shutdown
+    drain runs out of grace. While the server drains, new requests get 503;
+    requests over the adaptive concurrency limit get 429.
+    """
+    container = get_container(request)
+    if container.draining:
+        metrics.inc("shutdown_rejected_total")
+        raise HTTPException(
+            status_code=503,
+            detail="Server is shutting down",
+            headers={"Retry-After": "1", "Connection": "close"}
+        )
+    
+    selected_pages = _parse_pages(pages) if pages else None
+    
+    permit = None
+    if container.limiter is not None:
+        permit = container.limiter.try_acquire(request.url.path)
+        if permit is None:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many documents in progress",
+                headers={"Retry-After": str(container.limiter.retry_after())}
+            )
+    
+    deadline = time.monotonic() + x_deadline_ms / 1000.0 if x_deadline_ms is not None else None
+    options = ProcessingOptions(
+        bypass_quality_gate=skip_quality_gate,
+        bypass_duplicate_check=skip_duplicate_check,
+        priority=x_priority,
+        deadline=deadline,
+        document_mode=document_mode,
+        pages=selected_pages,
+        cancellation=CancellationToken()
     )
+    watcher = asyncio.create_task(_watch_for_cancellation(request, options.cancellation))
+    try:
+        with container.track(options.cancellation):
+            yield options
+    except HTTPException as e:
+        if permit is not None:
+            # Timeouts say we are overloaded; client errors say nothing about load
+            if e.status_code == 504:
+                permit.done(overloaded=True)
+            else:
+                permit.ignore()
+        raise
+    finally:
+        watcher.cancel()
+        if permit is not None:
+            permit.done()
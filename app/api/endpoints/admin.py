@@ -0,0 +1,27 @@
+"""Admin endpoints."""
+
+import os
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from app.api.dependencies import get_profile_store, require_admin
+from app.core.profiling import ProfileStore
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+async def list_profiles(store: ProfileStore = Depends(get_profile_store)):
+    """List captured request profiles, newest first."""
+    return store.list_profiles()
+
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(
+    profile_id: str,
+    store: ProfileStore = Depends(get_profile_store)
+):
+    """Download a profile archive (cProfile stats plus torch traces)."""
+    path = store.path_for(profile_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/zip", filename=os.path.basename(path))
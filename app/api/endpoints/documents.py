@@ -1,11 +1,13 @@
 """Document processing API endpoints."""
 
-from typing import List
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException
-from app.api.dependencies import get_document_service
-from app.core.exceptions import DocumentProcessingError
+from typing import List, Optional
+from fastapi import APIRouter, Depends, File, Header, UploadFile, HTTPException, Response
+from app.api.container import SHUTDOWN_REASON
+from app.api.dependencies import get_document_service, get_processing_options
+from app.core.exceptions import DeadlineExceededError, DocumentProcessingError, RequestCancelledError
 from app.core.logging import get_logger
-from app.models import DocumentResponse, DocumentListItem, DocumentType
+from app.core.metrics import metrics
+from app.models import DocumentResponse, DocumentListItem, DocumentType, ProcessingOptions
 from app.services import DocumentService
 
 logger = get_logger(__name__)
@@ -15,11 +17,22 @@ router = APIRouter(prefix="/api", tags=["documents"])
 async def process_document_endpoint(
     file: UploadFile,
     document_type: DocumentType,
-    service: DocumentService = Depends(get_document_service)
+    service: DocumentService = Depends(get_document_service),
+    options: Optional[ProcessingOptions] = None
 ) -> DocumentResponse:
     """Generic document processing endpoint."""
     try:
-        return await service.process_document(file, document_type)
+        return await service.process_document(file, document_type, options)
+    except DeadlineExceededError as e:
+        logger.warning(f"Deadline exceeded: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except RequestCancelledError as e:
+        logger.info(f"Processing cancelled: {e.reason}")
+        if e.reason == SHUTDOWN_REASON:
+            # Drained out by a deploy: the work is lost here but safe to retry elsewhere
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1", "Connection": "close"})
+        # 499: client closed request (nobody is listening); 504 for our own timeout
+        raise HTTPException(status_code=504 if e.reason == "timeout" else 499, detail=str(e))
     except DocumentProcessingError as e:
         logger.error(f"Document processing error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -31,55 +44,61 @@ async def process_document_endpoint(
 @router.post("/ic", response_model=DocumentResponse)
 async def extract_ic(
     file: UploadFile = File(...),
-    service: DocumentService = Depends(get_document_service)
+    service: DocumentService = Depends(get_document_service),
+    options: ProcessingOptions = Depends(get_processing_options)
 ):
     """Extract fields from Malaysian IC."""
-    return await process_document_endpoint(file, DocumentType.IC, service)
+    return await process_document_endpoint(file, DocumentType.IC, service, options)
 
 
 @router.post("/passport", response_model=DocumentResponse)
 async def extract_passport(
     file: UploadFile = File(...),
-    service: DocumentService = Depends(get_document_service)
+    service: DocumentService = Depends(get_document_service),
+    options: ProcessingOptions = Depends(get_processing_options)
 ):
     """Extract fields from international passport."""
-    return await process_document_endpoint(file, DocumentType.PASSPORT, service)
+    return await process_document_endpoint(file, DocumentType.PASSPORT, service, options)
 
 
 @router.post("/cash-deposit", response_model=DocumentResponse)
 async def extract_cash_deposit(
     file: UploadFile = File(...),
-    service: DocumentService = Depends(get_document_service)
+    service: DocumentService = Depends(get_document_service),
+    options: ProcessingOptions = Depends(get_processing_options)
 ):
     """Extract fields from cash deposit receipt."""
-    return await process_document_endpoint(file, DocumentType.CASH_DEPOSIT, service)
+    return await process_document_endpoint(file, DocumentType.CASH_DEPOSIT, service, options)
 
 
 @router.post("/bank-transfer", response_model=DocumentResponse)
 async def extract_bank_transfer(
     file: UploadFile = File(...),
-    service: DocumentService = Depends(get_document_service)
+    service: DocumentService = Depends(get_document_service),
+    options: ProcessingOptions = Depends(get_processing_options)
 ):
     """Extract fields from bank transfer receipt."""
-    return await process_document_endpoint(file, DocumentType.BANK_TRANSFER, service)
+    return await process_document_endpoint(file, DocumentType.BANK_TRANSFER, service, options)
 
 
 @router.post("/ssm-form-d", response_model=DocumentResponse)
 async def extract_ssm_form_d(
     file: UploadFile = File(...),
-    service: DocumentService = Depends(get_document_service)
+    service: DocumentService = Depends(get_document_service),
+    options: ProcessingOptions = Depends(get_processing_options)
 ):
     """Extract fields from SSM Form D."""
-    return await process_document_endpoint(file, DocumentType.SSM_FORM_D, service)
+    return await process_document_endpoint(file, DocumentType.SSM_FORM_D, service, options)
 
 
 @router.post("/utility-bill", response_model=DocumentResponse)
 async def extract_utility_bill(
     file: UploadFile = File(...),
-    service: DocumentService = Depends(get_document_service)
+    service: DocumentService = Depends(get_document_service),
+    options: ProcessingOptions = Depends(get_processing_options)
 ):
     """Extract fields from Malaysia utility bills."""
-    return await process_document_endpoint(file, DocumentType.UTILITY_BILL, service)
+    return await process_document_endpoint(file, DocumentType.UTILITY_BILL, service, options)
 
 
 @router.get("/documents", response_model=List[DocumentListItem])
@@ -108,18 +127,18 @@ async def list_documents(
 @router.get("/documents/{document_id}")
 async def get_document(
     document_id: str,
+    if_none_match: Optional[str] = Header(default=None),
     service: DocumentService = Depends(get_document_service)
 ):
-    """Get a specific document by ID."""
+    """Get a specific document by ID (304 if `If-None-Match` has its ETag)."""
     try:
-        document = await service.get_document_by_id(document_id)
-        return {
-            "document_id": str(document.id),
-            "filename": document.filename,
-            "upload_time": document.upload_time,
-            "document_type": document.document_type,
-            "results": document.results
-        }
+        document = await service.get_document_payload(document_id)
+        # Clients may keep the body but must revalidate it on every poll
+        headers = {"ETag": document.etag, "Cache-Control": "no-cache"}
+        if document.matches(if_none_match):
+            metrics.inc("document_not_modified_total")
+            return Response(status_code=304, headers=headers)
+        return Response(content=document.body, media_type="application/json", headers=headers)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -1,6 +1,9 @@
 """Health check endpoints."""
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from app.core.metrics import metrics
+from app.services.inference_pipeline import inference_pipeline
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -12,8 +15,19 @@ async def health_check():
 
 
 @router.get("/ready")
-async def readiness_check():
+async def readiness_check(request: Request):
     """Readiness check endpoint."""
     # Add any necessary readiness checks here
     # e.g., database connectivity, external service availability
+    container = getattr(request.app.state, "container", None)
+    if container is not None and container.draining:
+        # Take this instance out of the load balancer while it drains
+        return JSONResponse(status_code=503, content={"status": "draining", "service": "Document OCR API"})
     return {"status": "ready", "service": "Document OCR API"}
+
+
+@router.get("/metrics")
+async def metrics_snapshot():
+    """Counters, gauges and latency summaries for this process."""
+    inference_pipeline.report_utilisation()
+    return metrics.snapshot()
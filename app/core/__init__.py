@@ -12,6 +12,8 @@ __all__ = [
     "UnsupportedFileTypeError",
     "FileProcessingError",
     "OCRProcessingError",
+    "DeadlineExceededError",
+    "RequestCancelledError",
     "DatabaseError",
     "FileStorageError"
 ]
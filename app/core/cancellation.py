@@ -0,0 +1,26 @@
+"""Cooperative cancellation for in-flight document processing."""
+
+import threading
+from typing import Optional
+
+
+class CancellationToken:
+    """
+    Thread-safe cancellation flag shared between a request and its inference work.
+    
+    The event is checked between pages and by the generation stopping criterion
+    on the inference thread, so cancelled work stops at the next decode step.
+    """
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.reason: Optional[str] = None
+    
+    def cancel(self, reason: str) -> None:
+        if not self.event.is_set():
+            self.reason = reason
+            self.event.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
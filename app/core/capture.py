@@ -0,0 +1,151 @@
+"""Sampled capture of extraction traffic, for replay with scripts/replay_traffic.py."""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+
+logger = get_logger(__name__)
+
+# Request headers that change how a request is processed, so replay resends them
+REPLAYED_HEADERS = ("x-priority", "x-deadline-ms")
+# Sent by scripts/replay_traffic.py; replayed requests are not captured again
+REPLAY_HEADER = "X-Traffic-Replay"
+
+_current_capture: ContextVar[Optional["CapturedRequest"]] = ContextVar(
+    "captured_request", default=None
+)
+
+
+def current_capture() -> Optional["CapturedRequest"]:
+    """The capture entry of the request being handled, if it was sampled."""
+    return _current_capture.get()
+
+
+class CapturedRequest:
+    """One sampled request: filled in by the middleware and the document service."""
+
+    def __init__(self, method: str, path: str, query: str, headers: Dict[str, str]):
+        self.entry: Dict[str, Any] = {
+            "time": time.time(),
+            "method": method,
+            "path": path,
+            "query": query,
+            "headers": {name: value for name, value in headers.items() if name in REPLAYED_HEADERS},
+        }
+        self.contents: Optional[bytes] = None
+
+    def record_upload(self, contents: bytes, filename: str, content_type: Optional[str],
+                      document_type: str, upload_path: str) -> None:
+        self.contents = contents
+        self.entry.update({
+            "filename": filename,
+            "content_type": content_type,
+            "document_type": document_type,
+            "size": len(contents),
+            "sha256": hashlib.sha256(contents).hexdigest(),
+            "upload_path": upload_path,
+        })
+
+    def record_result(self, status: str, document_id: str, results: Any) -> None:
+        self.entry["result"] = {"status": status, "document_id": document_id, "results": results}
+
+
+class TrafficCapture:
+    """
+    Appends sampled extraction requests to a JSONL file.
+
+    Each line records the request (route, query string, scheduling headers),
+    the upload (name, type, size, SHA-256, stored path), the document type,
+    the status code and latency, and the extracted result. The upload itself
+    is copied once per distinct SHA-256 into `blobs/` next to the capture
+    file, so replays do not depend on the upload directory or retention.
+    Capturing stops before the file and its blobs together would pass
+    `max_bytes` (counting what an earlier run left there).
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        sample_rate: Optional[float] = None,
+        max_bytes: Optional[int] = None
+    ):
+        self.path = path or settings.traffic_capture_path
+        self.sample_rate = settings.traffic_capture_sample_rate if sample_rate is None else sample_rate
+        self.max_bytes = settings.traffic_capture_max_bytes if max_bytes is None else max_bytes
+        self.blob_dir = os.path.join(os.path.dirname(self.path), "blobs")
+        self._lock = threading.Lock()
+        self._full = False
+        # Bytes on disk (capture file + blobs), measured at the first write
+        self._bytes: Optional[int] = None
+
+    def should_capture(self, method: str, path: str, headers) -> bool:
+        """Sample extraction requests (POST /api/...) that are not replays."""
+        if self._full or method != "POST" or not path.startswith("/api/") or REPLAY_HEADER in headers:
+            return False
+        return random.random() < self.sample_rate
+
+    @contextmanager
+    def activate(self, captured: CapturedRequest) -> Iterator[CapturedRequest]:
+        token = _current_capture.set(captured)
+        try:
+            yield captured
+        finally:
+            _current_capture.reset(token)
+
+    def write(self, captured: CapturedRequest, status_code: int, latency: float) -> None:
+        """Append the entry and its blob (blocking; run it off the event loop)."""
+        entry = dict(captured.entry, status_code=status_code, latency_ms=round(latency * 1000, 3))
+        entry["time"] = datetime.fromtimestamp(entry["time"]).isoformat()
+        with self._lock:
+            if self._full:
+                return
+            os.makedirs(self.blob_dir, exist_ok=True)
+            if self._bytes is None:
+                self._bytes = self._disk_usage()
+            blob, blob_bytes = None, 0
+            if captured.contents is not None:
+                blob = self._blob_path(entry["sha256"], entry.get("filename") or "")
+                entry["blob"] = os.path.relpath(blob, os.path.dirname(self.path))
+                if not os.path.exists(blob):
+                    blob_bytes = len(captured.contents)
+            line = (json.dumps(entry, default=str) + "\n").encode("utf-8")
+            if self._bytes + blob_bytes + len(line) > self.max_bytes:
+                self._full = True
+                logger.warning(
+                    f"Traffic capture {self.path} would pass {self.max_bytes} bytes "
+                    f"with its blobs ({self._bytes} used); capture stopped"
+                )
+                return
+            if blob_bytes:
+                self._write_blob(captured.contents, blob)
+            with open(self.path, "ab") as f:
+                f.write(line)
+            self._bytes += blob_bytes + len(line)
+        metrics.inc("traffic_captured_total", route=entry["path"])
+
+    def _disk_usage(self) -> int:
+        """Bytes already in the capture file and blob directory."""
+        total = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        for entry in os.scandir(self.blob_dir):
+            if entry.is_file():
+                total += entry.stat().st_size
+        return total
+
+    def _blob_path(self, sha256: str, filename: str) -> str:
+        return os.path.join(self.blob_dir, sha256 + os.path.splitext(filename)[1].lower())
+
+    def _write_blob(self, contents: bytes, path: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(contents)
+        os.replace(tmp_path, path)
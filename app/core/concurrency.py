@@ -0,0 +1,123 @@
+"""Adaptive concurrency limiting for expensive endpoints."""
+
+import math
+import time
+from typing import Dict, Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class Permit:
+    """One admitted request. Report how it went with `done` or `ignore`."""
+
+    def __init__(self, limiter: "AdaptiveConcurrencyLimiter", key: str, quiet: bool):
+        self._limiter = limiter
+        self.key = key
+        self.quiet = quiet
+        self.start = time.monotonic()
+        self._released = False
+
+    def done(self, overloaded: bool = False) -> None:
+        """Release, feeding the latency (or an overload signal) to the limit."""
+        if not self._released:
+            self._released = True
+            self._limiter._release(self, time.monotonic() - self.start, overloaded)
+
+    def ignore(self) -> None:
+        """Release without a sample (e.g. the request was rejected as invalid)."""
+        if not self._released:
+            self._released = True
+            self._limiter._release(self, None, False)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit driven by request latency.
+
+    Each key (route) keeps two latencies: a no-load baseline, learnt only from
+    requests admitted while at most `QUIET_INFLIGHT` others were running (so
+    queueing does not leak into it), and a smoothed recent latency. When the
+    recent latency exceeds `tolerance` times the baseline, or a request times
+    out, requests are queueing: the limit is multiplied by `backoff`, at most
+    once per recent latency (one round trip) so one slow burst does not
+    collapse it. Otherwise every request completed while at least half the
+    limit was in use adds 1/limit, about one slot per limit's worth of requests.
+
+    `try_acquire` never waits: over the limit it returns None and the caller
+    sheds the request, so excess load turns into fast client retries rather
+    than latency for everyone.
+    """
+
+    # Requests admitted with at most this many others in flight measure no-load latency
+    QUIET_INFLIGHT = 1
+    # Weight of a new sample in the smoothed latencies
+    SMOOTHING = 0.2
+
+    def __init__(
+        self,
+        initial: Optional[int] = None,
+        min_limit: Optional[int] = None,
+        max_limit: Optional[int] = None,
+        tolerance: Optional[float] = None,
+        backoff: Optional[float] = None
+    ):
+        self.min_limit = min_limit if min_limit is not None else settings.concurrency_limit_min
+        self.max_limit = max_limit if max_limit is not None else settings.concurrency_limit_max
+        self.tolerance = tolerance if tolerance is not None else settings.concurrency_limit_tolerance
+        self.backoff = backoff if backoff is not None else settings.concurrency_limit_backoff
+        initial = initial if initial is not None else settings.concurrency_limit_initial
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.inflight = 0
+        self._baselines: Dict[str, float] = {}
+        self._recent: Dict[str, float] = {}
+        self._latency = 0.0
+        self._last_decrease = 0.0
+        self._report()
+
+    def try_acquire(self, key: str) -> Optional[Permit]:
+        """Admit a request for `key`, or return None if at the limit."""
+        if self.inflight >= int(self.limit):
+            metrics.inc("concurrency_rejected_total", route=key)
+            return None
+        permit = Permit(self, key, quiet=self.inflight <= self.QUIET_INFLIGHT)
+        self.inflight += 1
+        self._report()
+        return permit
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait: about one recent request's latency."""
+        return max(1, math.ceil(self._latency))
+
+    def _release(self, permit: Permit, latency: Optional[float], overloaded: bool) -> None:
+        used = self.inflight / self.limit
+        self.inflight -= 1
+        if latency is not None:
+            self._update(permit, latency, overloaded, used)
+        self._report()
+
+    def _update(self, permit: Permit, latency: float, overloaded: bool, used: float) -> None:
+        key = permit.key
+        self._latency = self._smooth(self._latency, latency)
+        recent = self._recent[key] = self._smooth(self._recent.get(key, 0.0), latency)
+        if permit.quiet and not overloaded:
+            self._baselines[key] = self._smooth(self._baselines.get(key, 0.0), latency)
+        baseline = self._baselines.get(key)
+        if baseline is None:
+            # Nothing to compare with yet; only a timeout says anything
+            baseline = math.inf
+
+        now = time.monotonic()
+        if overloaded or recent > self.tolerance * baseline:
+            if now - self._last_decrease >= recent:
+                self._last_decrease = now
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                metrics.inc("concurrency_limit_decreases_total")
+        elif used >= 0.5:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def _smooth(self, current: float, sample: float) -> float:
+        return sample if not current else (1 - self.SMOOTHING) * current + self.SMOOTHING * sample
+
+    def _report(self) -> None:
+        metrics.set_gauge("concurrency_limit", int(self.limit))
+        metrics.set_gauge("concurrency_inflight", self.inflight)
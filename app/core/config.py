@@ -1,7 +1,7 @@
 """Application configuration."""
 
 import os
-from typing import Set
+from typing import Dict, List, Optional, Set
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
 
@@ -26,7 +26,191 @@ class Settings(BaseSettings):
     
     # Logging
     log_level: str = "INFO"
+    # "text" or "json" (one object per line with request id, document type
+    # and stage timings). Records are written to stdout by a background
+    # thread; when `log_queue_size` records are waiting, new ones are dropped
+    log_format: str = "text"
+    log_queue_size: int = 10000
+    # Fraction of INFO/DEBUG records kept per logger (and its children),
+    # e.g. {"app.services": 0.1}; warnings and errors are always kept
+    log_sample_rates: Dict[str, float] = {}
     
+    # Model
+    model_name: str = "Qwen/Qwen2-VL-2B-Instruct"
+    # Local checkpoint written by scripts/prepare_model.py; loaded instead of
+    # `model_name` when present (no hub lookups, no dtype conversion)
+    prepared_model_dir: Optional[str] = None
+    
+    # Inference device: "auto" (CUDA when available, else CPU), "cuda" or "cpu".
+    # On CPU, the physical cores are split between the `cpu_model_workers`
+    # processes on the node that load a model (API workers without a model
+    # server, or model servers). Each claims a slot through a lock file in
+    # `cpu_slot_dir` and runs cores/workers intra-op threads (`cpu_threads`
+    # overrides), optionally pinned to its own cores (`cpu_affinity`), so
+    # workers do not oversubscribe the machine
+    inference_device: str = "auto"
+    cpu_model_workers: int = 1
+    cpu_threads: Optional[int] = None
+    cpu_interop_threads: int = 1
+    cpu_affinity: bool = False
+    cpu_slot_dir: str = "/tmp/qwen-cpu-slots"
+    cpu_dtype: str = "float32"  # or "bfloat16" (pays off with AVX512-BF16/AMX)
+    
+    # Vision-encoder cache: vision-tower outputs of recently seen images (keyed
+    # by pixels, size and pixel budget), kept on the model's device, so another
+    # prompt or a re-run on the same image only pays for prefill and decoding.
+    # Least recently used entries go past the size limit; 0 disables
+    vision_cache_max_mb: int = 256
+    
+    # Shared model server (`python -m model_server`): when set, API workers
+    # send pages to the model over this unix socket instead of loading it
+    model_server_socket: Optional[str] = None
+    
+    # Assisted (speculative) decoding: "off", "prompt_lookup" (draft tokens are
+    # copied from the prompt, i.e. the schema keys) or "draft" (a smaller
+    # Qwen2-VL checkpoint proposes tokens for the main model to verify)
+    assisted_decoding: str = "off"
+    draft_model_name: Optional[str] = None
+    assisted_draft_tokens: int = 8
+    assisted_draft_schedule: str = "heuristic"  # or "constant"
+    
+    # Static KV cache with a compiled decode step. The cache is preallocated at
+    # the smallest bucket that fits prompt + max_new_tokens, so decoding
+    # compiles once per bucket (at startup) rather than once per input shape
+    static_cache_enabled: bool = False
+    static_cache_buckets: List[int] = [768, 1280, 1792, 2304]
+    static_cache_compile_mode: str = "reduce-overhead"
+
+    # Pre-inference quality gate: pages whose blur/glare intensity (0-100)
+    # exceeds the threshold for their document type are not sent to the model
+    quality_gate_enabled: bool = False
+    quality_gate_thresholds: Dict[str, Dict[str, int]] = {
+        "ic": {"blur": 90, "glare": 20},
+        "passport": {"blur": 90, "glare": 20},
+        "cash_deposit": {"blur": 95, "glare": 30},
+        "bank_transfer": {"blur": 95, "glare": 30},
+        "ssm_form_d": {"blur": 95, "glare": 30},
+        "utility_bill": {"blur": 95, "glare": 30},
+    }
+    
+    # Multi-page documents: skip blank pages and pages repeating an earlier one
+    page_filter_enabled: bool = True
+    blank_page_max_std: float = 6.0
+    blank_page_min_ink: float = 0.002
+    duplicate_page_max_distance: int = 6
+    
+    # Document mode: the kept pages of a multi-page document go to the model
+    # as several images in one message and come back as one merged result.
+    # Each page is capped at `document_mode_max_pixels` (about 1 vision token
+    # per 28x28 pixels), and documents with more kept pages than
+    # `document_mode_max_pages` fall back to per-page extraction, so prefill
+    # stays bounded. Requests can opt in or out with ?document_mode=
+    document_mode_types: List[str] = []
+    document_mode_max_pages: int = 4
+    document_mode_max_pixels: int = 401408
+    
+    # Passport MRZ fast path: the MRZ band, then (once its check digits
+    # validate) the rest of the page, both at reduced resolution. About 580
+    # vision tokens for a 1250x880 data page, vs. 1290 for the full-page prompt
+    passport_mrz_fast_path: bool = True
+    passport_mrz_max_dim: int = 800
+    passport_mrz_max_new_tokens: int = 128
+    passport_visual_max_dim: int = 800
+    passport_visual_max_new_tokens: int = 128
+    
+    # Inference scheduling: default priority class per document type
+    # (overridable per request with the X-Priority header)
+    document_priorities: Dict[str, str] = {
+        "ic": "interactive",
+        "passport": "interactive",
+        "cash_deposit": "standard",
+        "bank_transfer": "standard",
+        "ssm_form_d": "bulk",
+        "utility_bill": "bulk",
+    }
+    
+    # Generation pipeline: CPU workers for input preparation, decoding and
+    # parsing, and how many generations may hold prepared inputs at once
+    pipeline_cpu_workers: int = 2
+    pipeline_max_prepared: int = 2
+    
+    # Retention: days to keep each document type's record and upload (types
+    # not listed are kept forever). A background reaper deletes expired records
+    # with their files in batches; Mongo's TTL index removes anything the reaper
+    # missed `retention_ttl_grace_seconds` later. Reconciliation deletes upload
+    # files no record points at and reports records whose file is gone.
+    retention_enabled: bool = False
+    retention_days: Dict[str, int] = {
+        "ic": 30,
+        "passport": 30,
+        "cash_deposit": 90,
+        "bank_transfer": 90,
+        "ssm_form_d": 365,
+        "utility_bill": 90,
+    }
+    retention_sweep_interval_seconds: float = 3600.0
+    retention_batch_size: int = 500
+    retention_ttl_grace_seconds: int = 86400
+    reconcile_interval_seconds: float = 86400.0
+    # Unreferenced uploads younger than this may belong to a request still in flight
+    orphan_min_age_seconds: float = 3600.0
+    
+    # Near-duplicate uploads (the same image rescaled, recompressed or
+    # re-exported): "off", "flag" (answer status "duplicate" with the earlier
+    # document's ID) or "reuse" (answer with the earlier extraction). Neither
+    # calls the model. Single-image uploads are matched by a 256-bit pHash
+    # within `max_distance` bits of the same type's successful extractions
+    # from the last `window_hours`. Reuse hands out another upload's fields,
+    # so it only matches within `reuse_max_distance` bits: different ID cards
+    # of the same layout can be 10-18 bits apart. Clients can opt out with
+    # ?skip_duplicate_check=true
+    near_duplicate_mode: str = "off"
+    near_duplicate_max_distance: int = 20
+    near_duplicate_reuse_max_distance: int = 6
+    near_duplicate_window_hours: float = 24.0
+    near_duplicate_max_entries: int = 10000
+    
+    # Read-through cache of GET /api/documents/{id} responses (0 disables).
+    # Deletes invalidate locally; the TTL bounds staleness across workers
+    document_cache_max_entries: int = 1024
+    document_cache_ttl_seconds: float = 300.0
+    
+    # Server-side limit on document processing; generation is cancelled after it
+    request_timeout_seconds: Optional[float] = 120.0
+    disconnect_poll_interval: float = 0.5
+    
+    # Adaptive concurrency limit on the extraction endpoints (AIMD on latency):
+    # requests over the limit are shed at once with 429 and Retry-After. The
+    # limit backs off when latency exceeds `tolerance` x the no-load latency
+    concurrency_limit_enabled: bool = True
+    concurrency_limit_initial: int = 8
+    concurrency_limit_min: int = 1
+    concurrency_limit_max: int = 64
+    concurrency_limit_tolerance: float = 2.0
+    concurrency_limit_backoff: float = 0.9
+    
+    # Graceful shutdown: on SIGTERM new extractions get 503, in-flight ones get
+    # this long to finish before being cancelled (and told to retry elsewhere)
+    shutdown_grace_seconds: float = 30.0
+    shutdown_cancel_wait_seconds: float = 5.0
+    
+    # Traffic capture: record a sample of extraction requests (upload, route,
+    # timing, result) to JSONL for scripts/replay_traffic.py. Uploads are
+    # copied to blobs/ next to the file; capture stops before the file and
+    # blobs together pass the size limit. Retention does not touch captures
+    traffic_capture_enabled: bool = False
+    traffic_capture_path: str = "captures/traffic.jsonl"
+    traffic_capture_sample_rate: float = 0.05
+    traffic_capture_max_bytes: int = 100 * 1024 * 1024
+    
+    # Admin
+    admin_token: Optional[str] = None
+
+    # Profiling
+    profiling_enabled: bool = False
+    profile_dir: str = "profiles"
+    profile_max_entries: int = 20
+
     @field_validator("upload_dir")
     @classmethod
     def create_upload_dir(cls, v):
@@ -34,9 +218,53 @@ class Settings(BaseSettings):
         os.makedirs(v, exist_ok=True)
         return v
     
+    @field_validator("assisted_decoding")
+    @classmethod
+    def check_assisted_decoding(cls, v):
+        """Reject unknown assisted decoding modes."""
+        if v not in ("off", "prompt_lookup", "draft"):
+            raise ValueError("assisted_decoding must be one of: off, prompt_lookup, draft")
+        return v
+    
+    @field_validator("inference_device")
+    @classmethod
+    def check_inference_device(cls, v):
+        """Reject unknown inference devices."""
+        if v not in ("auto", "cuda", "cpu"):
+            raise ValueError("inference_device must be one of: auto, cuda, cpu")
+        return v
+    
+    @field_validator("log_format")
+    @classmethod
+    def check_log_format(cls, v):
+        """Reject unknown log formats."""
+        if v not in ("text", "json"):
+            raise ValueError("log_format must be one of: text, json")
+        return v
+    
+    @field_validator("near_duplicate_mode")
+    @classmethod
+    def check_near_duplicate_mode(cls, v):
+        """Reject unknown near-duplicate modes."""
+        if v not in ("off", "flag", "reuse"):
+            raise ValueError("near_duplicate_mode must be one of: off, flag, reuse")
+        return v
+    
+    @field_validator("document_priorities")
+    @classmethod
+    def check_document_priorities(cls, v):
+        """Reject unknown priority classes (see app.models.Priority)."""
+        for document_type, priority in v.items():
+            if priority not in ("interactive", "standard", "bulk"):
+                raise ValueError(
+                    f"document_priorities[{document_type!r}] must be one of: interactive, standard, bulk"
+                )
+        return v
+    
     model_config = {
         "env_file": ".env",
         "case_sensitive": False,
+        "protected_namespaces": ("settings_",),
     }
 
 
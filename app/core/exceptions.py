@@ -27,6 +27,19 @@ class OCRProcessingError(DocumentProcessingError):
     pass
 
 
+class DeadlineExceededError(DocumentProcessingError):
+    """Raised when a request's deadline passes before inference starts."""
+    pass
+
+
+class RequestCancelledError(DocumentProcessingError):
+    """Raised when processing stops because the client left or the server timed out."""
+    
+    def __init__(self, reason: str):
+        super().__init__(f"Request cancelled: {reason}", {"reason": reason})
+        self.reason = reason
+
+
 class DatabaseError(DocumentProcessingError):
     """Raised when database operations fail."""
     pass
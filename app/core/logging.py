@@ -1,28 +1,175 @@
 """Logging configuration."""
 
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
-from typing import Dict, Any
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
 from app.core.config import settings
+from app.core.metrics import metrics
+
+# Fields of the request being handled (request id, document type, stage
+# timings), added to every record it logs
+_log_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("log_context", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[Dict[str, Any]]:
+    """Attach `fields` to every record logged inside the block (and its tasks and threads)."""
+    context = dict(fields, stages={})
+    token = _log_context.set(context)
+    try:
+        yield context
+    finally:
+        _log_context.reset(token)
+
+
+def bind_log_context(**fields: Any) -> None:
+    """Add fields to the current request's log context, if there is one."""
+    context = _log_context.get()
+    if context is not None:
+        context.update(fields)
+
+
+def record_stages(stage_seconds: Dict[str, float]) -> None:
+    """Add stage timings (seconds) to the current request's log context."""
+    context = _log_context.get()
+    if context is None:
+        return
+    stages = context["stages"]
+    for stage, seconds in stage_seconds.items():
+        stages[stage] = round(stages.get(stage, 0.0) + seconds, 4)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the request's log context onto the record, in the logging thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        if context is not None:
+            # Copied: the listener formats the record while the request goes on
+            record.context = {
+                key: dict(value) if isinstance(value, dict) else value
+                for key, value in context.items() if value or value == 0
+            }
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of INFO and DEBUG records from noisy loggers.
+
+    `rates` maps a logger name to the fraction of its records to keep; a name
+    also covers its children, the longest match wins. Warnings and errors are
+    always kept.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rate = self._resolved.get(record.name)
+        if rate is None:
+            rate = self._resolved[record.name] = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+    def _rate(self, name: str) -> float:
+        while True:
+            if name in self.rates:
+                return self.rates[name]
+            if "." not in name:
+                return 1.0
+            name = name.rsplit(".", 1)[0]
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request context and extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", {}))
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread without blocking the caller.
+
+    The record is prepared here (message rendered, traceback turned into
+    text) but formatted by the listener. When the queue is full the record
+    is dropped and counted rather than waiting on a slow stdout.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("log_records_dropped_total")
 
 
 def setup_logging() -> None:
     """Configure application logging."""
-    
+    global _listener
+    if _listener is not None:
+        return
+
     # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    # Create console handler
+    if settings.log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    # Create console handler, written to by a background thread
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    
+    queue_handler = _QueueHandler(queue.Queue(settings.log_queue_size))
+    queue_handler.addFilter(ContextFilter())
+    if settings.log_sample_rates:
+        queue_handler.addFilter(SamplingFilter(settings.log_sample_rates))
+    _listener = logging.handlers.QueueListener(queue_handler.queue, console_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
     # Configure root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(getattr(logging, settings.log_level.upper()))
-    root_logger.addHandler(console_handler)
-    
+    root_logger.addHandler(queue_handler)
+
     # Configure specific loggers
     loggers = {
         "uvicorn": logging.INFO,
@@ -30,10 +177,22 @@ def setup_logging() -> None:
         "uvicorn.access": logging.INFO,
         "pymongo": logging.WARNING,
     }
-    
+
     for logger_name, level in loggers.items():
         logger = logging.getLogger(logger_name)
         logger.setLevel(level)
+        # uvicorn writes to stdout itself; send its records through the queue too
+        if logger_name.startswith("uvicorn"):
+            logger.handlers.clear()
+            logger.propagate = True
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
 def get_logger(name: str) -> logging.Logger:
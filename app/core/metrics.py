@@ -0,0 +1,99 @@
+"""In-process metrics registry."""
+
+import threading
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(name: str, labels: dict) -> Tuple[str, LabelKey]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _render(name: str, labels: LabelKey) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+class _Summary:
+    """Count, sum, max and a sliding window of recent samples for percentiles."""
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def pick(q: float) -> float:
+            return ordered[int(q * (len(ordered) - 1))] if ordered else 0.0
+
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.mean,
+            "max": self.max,
+            "p50": pick(0.50),
+            "p95": pick(0.95),
+            "p99": pick(0.99),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and summaries keyed by name and labels."""
+
+    def __init__(self, window: int = 1024):
+        self._window = window
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}
+        self._summaries: Dict[Tuple[str, LabelKey], _Summary] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = _Summary(self._window)
+            summary.observe(value)
+
+    def mean(self, name: str, **labels) -> float:
+        """Mean of all observations for a summary, or 0.0 if none yet."""
+        with self._lock:
+            summary = self._summaries.get(_key(name, labels))
+            return summary.mean if summary else 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": {_render(n, l): v for (n, l), v in sorted(self._counters.items())},
+                "gauges": {_render(n, l): v for (n, l), v in sorted(self._gauges.items())},
+                "summaries": {_render(n, l): s.snapshot() for (n, l), s in sorted(self._summaries.items())},
+            }
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
@@ -0,0 +1,228 @@
+"""On-demand per-request profiling."""
+
+import cProfile
+import io
+import os
+import pstats
+import secrets
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Iterator, List, Optional
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+
+logger = get_logger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY_PARAM = "profile"
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+# Set instead of X-Profile-Id when the request ran without the profiler
+PROFILE_SKIPPED_HEADER = "X-Profile-Skipped"
+
+# One profiled request at a time: cProfile hooks the event-loop thread, so a
+# second session would replace the first one's profiler (and Python 3.12+
+# refuses to enable it at all)
+_session_lock = threading.Lock()
+
+_current_session: ContextVar[Optional["ProfileSession"]] = ContextVar(
+    "profile_session", default=None
+)
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """Check a token against the configured admin token."""
+    if not settings.admin_token or not token:
+        return False
+    return secrets.compare_digest(token, settings.admin_token)
+
+
+def profiling_requested(headers, query_params) -> bool:
+    """Return True when the request opts in to profiling with a valid admin token."""
+    flag = headers.get(PROFILE_HEADER) or query_params.get(PROFILE_QUERY_PARAM)
+    if flag not in ("1", "true", "yes"):
+        return False
+    return is_admin_token(headers.get(ADMIN_TOKEN_HEADER))
+
+
+class ProfileSession:
+    """Collects cProfile and torch profiler output for a single request.
+
+    cProfile hooks the thread it runs in, so while the event-loop profiler is
+    active it also records any other coroutine scheduled on the loop. Work
+    offloaded to other threads is captured through `section`.
+    """
+
+    def __init__(self, profile_id: str):
+        self.profile_id = profile_id
+        self._thread_id = threading.get_ident()
+        self._profiler = cProfile.Profile()
+        self._thread_profilers: List[cProfile.Profile] = []
+        self._workdir = tempfile.mkdtemp(prefix=f"profile_{profile_id}_")
+        self._torch_traces: List[str] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        self._profiler.enable()
+
+    def stop(self) -> None:
+        self._profiler.disable()
+
+    @contextmanager
+    def section(self, name: str):
+        """Profile a block, adding the torch profiler when torch is loaded."""
+        thread_profiler = None
+        if threading.get_ident() != self._thread_id:
+            thread_profiler = cProfile.Profile()
+            thread_profiler.enable()
+
+        torch_profiler = None
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            torch_profiler = torch.profiler.profile(activities=activities, record_shapes=True)
+            torch_profiler.__enter__()
+
+        try:
+            yield
+        finally:
+            if torch_profiler is not None:
+                torch_profiler.__exit__(None, None, None)
+                with self._lock:
+                    trace_name = f"torch_{name}_{len(self._torch_traces) + 1}.json"
+                    trace_path = os.path.join(self._workdir, trace_name)
+                    self._torch_traces.append(trace_path)
+                torch_profiler.export_chrome_trace(trace_path)
+            if thread_profiler is not None:
+                thread_profiler.disable()
+                with self._lock:
+                    self._thread_profilers.append(thread_profiler)
+
+    def write_archive(self, path: str) -> None:
+        """Write all collected profiles into a single zip archive."""
+        stats = pstats.Stats(self._profiler)
+        for profiler in self._thread_profilers:
+            stats.add(profiler)
+
+        stats_path = os.path.join(self._workdir, "cprofile.prof")
+        stats.dump_stats(stats_path)
+
+        summary = io.StringIO()
+        pstats.Stats(stats_path, stream=summary).sort_stats("cumulative").print_stats(50)
+
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.write(stats_path, "cprofile.prof")
+            archive.writestr("cprofile.txt", summary.getvalue())
+            for trace_path in self._torch_traces:
+                archive.write(trace_path, os.path.basename(trace_path))
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self._workdir, ignore_errors=True)
+
+
+class ProfileStore:
+    """Bounded on-disk ring of profile archives."""
+
+    def __init__(self, directory: str = None, max_entries: int = None):
+        self.directory = directory if directory is not None else settings.profile_dir
+        self.max_entries = max_entries if max_entries is not None else settings.profile_max_entries
+        os.makedirs(self.directory, exist_ok=True)
+
+    def new_session(self) -> ProfileSession:
+        profile_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(4)}"
+        return ProfileSession(profile_id)
+
+    def save(self, session: ProfileSession) -> str:
+        """Persist a finished session and evict the oldest archives."""
+        path = self.path_for(session.profile_id)
+        try:
+            session.write_archive(path)
+        finally:
+            session.cleanup()
+        self._evict()
+        logger.info(f"Profile saved: {path}")
+        return path
+
+    def list_profiles(self) -> List[dict]:
+        entries = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not name.endswith(".zip"):
+                continue
+            path = os.path.join(self.directory, name)
+            entries.append({
+                "profile_id": name[:-len(".zip")],
+                "size": os.path.getsize(path),
+                "created": datetime.fromtimestamp(os.path.getmtime(path)),
+            })
+        return entries
+
+    def path_for(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{os.path.basename(profile_id)}.zip")
+
+    def _evict(self) -> None:
+        archives = sorted(n for n in os.listdir(self.directory) if n.endswith(".zip"))
+        for name in archives[:max(0, len(archives) - self.max_entries)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError as e:
+                logger.warning(f"Failed to evict profile {name}: {e}")
+
+
+@contextmanager
+def activate(session: ProfileSession) -> Iterator[bool]:
+    """
+    Bind a session to the current context for the duration of a request.
+
+    Yields False, and profiles nothing, when another request is being
+    profiled or another profiling tool (a debugger, coverage) is active.
+    """
+    if not _session_lock.acquire(blocking=False):
+        yield False
+        return
+    try:
+        try:
+            session.start()
+        except ValueError as e:
+            logger.warning(f"Profiler not started: {e}")
+            yield False
+            return
+        token = _current_session.set(session)
+        try:
+            yield True
+        finally:
+            session.stop()
+            _current_session.reset(token)
+    finally:
+        _session_lock.release()
+
+
+@contextmanager
+def profile_section(name: str):
+    """Profile a block if the current request is being profiled; no-op otherwise."""
+    session = _current_session.get()
+    if session is None:
+        yield
+        return
+    with session.section(name):
+        yield
+
+
+@contextmanager
+def startup_phase(name: str):
+    """Log how long a startup phase took and keep it in `startup_phase_seconds{phase}`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.set_gauge("startup_phase_seconds", elapsed, phase=name)
+        logger.info(f"Startup phase {name}: {elapsed:.2f}s")
@@ -1,26 +1,48 @@
 """Main FastAPI application."""
 
+import asyncio
 import time
+import uuid
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.core.logging import setup_logging, get_logger
-from app.api.endpoints import documents, health
+from app.core.logging import setup_logging, get_logger, log_context
+from app.core import profiling
+from app.core.profiling import startup_phase
+from app.core.capture import CapturedRequest, TrafficCapture
+from app.api.container import ServiceContainer
+from app.api.dependencies import get_profile_store
+from app.api.endpoints import admin, documents, health
+from app.services.inference_pipeline import load_inference_backend
 
 # Setup logging
 setup_logging()
 logger = get_logger(__name__)
 
+# Accepted from the client (or a proxy) and echoed back; generated when absent
+REQUEST_ID_HEADER = "X-Request-ID"
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events."""
     # Startup
     logger.info("Starting Document OCR API")
+    with startup_phase("startup"):
+        # Load the model before taking traffic rather than on the first request,
+        # unless a shared model server owns it
+        if not settings.model_server_socket:
+            await asyncio.to_thread(load_inference_backend)
+        with startup_phase("services"):
+            container = ServiceContainer.create()
+            app.state.container = container
+            await container.start()
+        container.install_signal_handler()
     yield
-    # Shutdown
+    # Shutdown: finish (or hand back) in-flight extractions, then close clients
     logger.info("Shutting down Document OCR API")
+    await container.shutdown()
 
 
 # Create FastAPI application
@@ -43,21 +65,89 @@ app.add_middleware(
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Log all requests."""
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    logger.info(
-        f"Request: {request.method} {request.url} - "
-        f"Status: {response.status_code} - "
-        f"Time: {process_time:.4f}s"
-    )
+    """Log all requests, tagging everything they log with a request id."""
+    request_id = (request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex)[:128]
+    start_time = time.perf_counter()
+    status_code = 500
+    with log_context(request_id=request_id):
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        finally:
+            process_time = time.perf_counter() - start_time
+            logger.info(
+                f"Request: {request.method} {request.url} - "
+                f"Status: {status_code} - "
+                f"Time: {process_time:.4f}s",
+                extra={"fields": {
+                    "method": request.method,
+                    "path": request.url.path,
+                    "status": status_code,
+                    "duration_ms": round(process_time * 1000, 1),
+                }}
+            )
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+
+async def profile_requests(request: Request, call_next):
+    """Run admin-flagged requests under the profiler."""
+    if not profiling.profiling_requested(request.headers, request.query_params):
+        return await call_next(request)
+
+    store = get_profile_store()
+    session = store.new_session()
+    active = False
+    try:
+        with profiling.activate(session) as active:
+            response = await call_next(request)
+    finally:
+        if active:
+            await asyncio.to_thread(store.save, session)
+        else:
+            session.cleanup()
+    if not active:
+        # Another request holds the profiler: serve this one unprofiled
+        response.headers[profiling.PROFILE_SKIPPED_HEADER] = "busy"
+        return response
+    response.headers["X-Profile-Id"] = session.profile_id
     return response
 
 
+async def capture_traffic(request: Request, call_next):
+    """Record a sample of extraction requests for replay."""
+    if not traffic_capture.should_capture(request.method, request.url.path, request.headers):
+        return await call_next(request)
+
+    captured = CapturedRequest(request.method, request.url.path, request.url.query, request.headers)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        with traffic_capture.activate(captured):
+            response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        latency = time.perf_counter() - start
+        try:
+            await asyncio.to_thread(traffic_capture.write, captured, status_code, latency)
+        except OSError as e:
+            logger.error(f"Traffic capture failed: {e}")
+
+
+# Only pay for the profiling check when it is switched on
+if settings.profiling_enabled:
+    app.middleware("http")(profile_requests)
+
+if settings.traffic_capture_enabled:
+    traffic_capture = TrafficCapture()
+    app.middleware("http")(capture_traffic)
+
+
 # Include routers
 app.include_router(documents.router)
 app.include_router(health.router)
+app.include_router(admin.router)
 
 
 @app.get("/")
@@ -3,22 +3,25 @@
 from .document import (
     DocumentRecord,
     ProcessingResult,
+    ProcessingOptions,
     DocumentResponse,
     DocumentListItem,
     DocumentListResponse,
     UploadRequest,
     PyObjectId
 )
-from .enums import DocumentType, FileExtension
+from .enums import DocumentType, FileExtension, Priority
 
 __all__ = [
     "DocumentRecord",
     "ProcessingResult", 
+    "ProcessingOptions",
     "DocumentResponse",
     "DocumentListItem",
     "DocumentListResponse",
     "UploadRequest",
     "PyObjectId",
     "DocumentType",
-    "FileExtension"
+    "FileExtension",
+    "Priority"
 ]
@@ -2,6 +2,8 @@ from datetime import datetime
 from typing import Optional, Dict, Any, List
 from pydantic import BaseModel, Field
 from bson import ObjectId
+from app.core.cancellation import CancellationToken
+from app.models.enums import Priority
 
 
 class PyObjectId(ObjectId):
@@ -39,6 +41,12 @@ class DocumentRecord(BaseModel):
     document_type: Optional[str] = None
     results: List[Dict[str, Any]]
     upload_time: datetime = Field(default_factory=datetime.now)
+    # Set from the document type's retention; Mongo's TTL index keys on it
+    expire_at: Optional[datetime] = None
+    # pHash (hex) of a single-image upload whose extraction later uploads may reuse
+    phash: Optional[str] = None
+    # Set when the result was answered from an earlier near-duplicate upload
+    duplicate_of: Optional[str] = None
     
     model_config = {
         "populate_by_name": True,
@@ -53,6 +61,29 @@ class ProcessingResult(BaseModel):
     page: Optional[int] = None
     blur_intensity: Optional[float] = None
     glare_intensity: Optional[float] = None
+    skipped: Optional[str] = None
+    repairs: Optional[List[str]] = None
+    # Document mode: the pages this merged result was extracted from
+    pages: Optional[List[int]] = None
+
+
+class ProcessingOptions(BaseModel):
+    """Per-request processing options."""
+    
+    bypass_quality_gate: bool = False
+    bypass_duplicate_check: bool = False
+    priority: Optional[Priority] = None
+    # Absolute time.monotonic() after which the work is no longer wanted
+    deadline: Optional[float] = None
+    # Extract all pages in one generation (None: the document type's default)
+    document_mode: Optional[bool] = None
+    # 1-based pages to extract (None: all of them)
+    pages: Optional[List[int]] = None
+    cancellation: Optional[CancellationToken] = Field(default=None, exclude=True)
+    
+    model_config = {
+        "arbitrary_types_allowed": True,
+    }
 
 
 class DocumentResponse(BaseModel):
@@ -61,6 +92,8 @@ class DocumentResponse(BaseModel):
     status: str
     document_id: str
     results: List[Dict[str, Any]]
+    # Earlier upload this one is a near duplicate of
+    duplicate_of: Optional[str] = None
 
 
 class DocumentListItem(BaseModel):
@@ -14,6 +14,14 @@ class DocumentType(str, Enum):
     UTILITY_BILL = "utility_bill"
 
 
+class Priority(str, Enum):
+    """Scheduling classes for model inference, most urgent first."""
+    
+    INTERACTIVE = "interactive"
+    STANDARD = "standard"
+    BULK = "bulk"
+
+
 class FileExtension(str, Enum):
     """Supported file extensions."""
     
@@ -2,8 +2,10 @@
 
 from .base import IDocumentRepository
 from .mongo_repository import MongoDocumentRepository
+from .memory_repository import InMemoryDocumentRepository
 
 __all__ = [
     "IDocumentRepository",
-    "MongoDocumentRepository"
+    "MongoDocumentRepository",
+    "InMemoryDocumentRepository"
 ]
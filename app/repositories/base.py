@@ -1,7 +1,8 @@
 """Document repository interface."""
 
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from app.models import DocumentRecord
 
 
@@ -27,3 +28,36 @@ class IDocumentRepository(ABC):
     async def delete_by_id(self, document_id: str) -> bool:
         """Delete a document by its ID."""
         pass
+    
+    @abstractmethod
+    async def find_expired(self, now: datetime, limit: int = 500) -> List[DocumentRecord]:
+        """Find documents whose `expire_at` has passed, oldest first."""
+        pass
+    
+    @abstractmethod
+    async def update_expiry(self, document_type: str, retention_days: Optional[int]) -> int:
+        """
+        Set `expire_at` to `upload_time` plus `retention_days` on the type's
+        records (clear it when None) and return how many records changed.
+        """
+        pass
+    
+    @abstractmethod
+    async def delete_many(self, document_ids: List[str]) -> int:
+        """Delete documents by ID and return how many were removed."""
+        pass
+    
+    @abstractmethod
+    async def find_file_paths(self) -> Dict[str, str]:
+        """Map every document ID to its stored `file_path`."""
+        pass
+    
+    @abstractmethod
+    async def ensure_retention_index(self, grace_seconds: int) -> None:
+        """Create (or update) the TTL index that backstops the retention reaper."""
+        pass
+    
+    @abstractmethod
+    async def find_recent_phashes(self, since: datetime) -> List[Tuple[str, str, str, datetime]]:
+        """(id, document_type, phash, upload_time) of hashed documents uploaded since `since`, oldest first."""
+        pass
@@ -0,0 +1,82 @@
+"""In-memory document repository implementation."""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from app.models import DocumentRecord
+from app.repositories.base import IDocumentRepository
+
+
+class InMemoryDocumentRepository(IDocumentRepository):
+    """Process-local repository for benchmarks, scripts and local runs without MongoDB."""
+    
+    def __init__(self):
+        self._documents: Dict[str, dict] = {}
+    
+    async def save(self, record: DocumentRecord) -> str:
+        """Save a document record and return its ID."""
+        doc_dict = record.model_dump(by_alias=True, exclude_unset=True)
+        if doc_dict.get("_id") is None:
+            doc_dict["_id"] = ObjectId()
+        document_id = str(doc_dict["_id"])
+        self._documents[document_id] = doc_dict
+        return document_id
+    
+    async def find_by_id(self, document_id: str) -> Optional[DocumentRecord]:
+        """Find a document by its ID."""
+        doc = self._documents.get(document_id)
+        if doc:
+            return DocumentRecord.model_validate(doc)
+        return None
+    
+    async def find_all(self, limit: int = 100, skip: int = 0) -> List[DocumentRecord]:
+        """Find all documents with pagination."""
+        docs = sorted(self._documents.values(), key=lambda d: d["upload_time"], reverse=True)
+        return [DocumentRecord.model_validate(doc) for doc in docs[skip:skip + limit]]
+    
+    async def delete_by_id(self, document_id: str) -> bool:
+        """Delete a document by its ID."""
+        return self._documents.pop(document_id, None) is not None
+    
+    async def find_expired(self, now: datetime, limit: int = 500) -> List[DocumentRecord]:
+        """Find documents whose `expire_at` has passed, oldest first."""
+        expired = sorted(
+            (d for d in self._documents.values() if d.get("expire_at") and d["expire_at"] <= now),
+            key=lambda d: d["expire_at"]
+        )
+        return [DocumentRecord.model_validate(doc) for doc in expired[:limit]]
+    
+    async def update_expiry(self, document_type: str, retention_days: Optional[int]) -> int:
+        """
+        Set `expire_at` to `upload_time` plus `retention_days` on the type's
+        records (clear it when None) and return how many records changed.
+        """
+        updated = 0
+        for doc in self._documents.values():
+            if doc.get("document_type") != document_type:
+                continue
+            expire_at = doc["upload_time"] + timedelta(days=retention_days) if retention_days else None
+            if doc.get("expire_at") != expire_at:
+                doc["expire_at"] = expire_at
+                updated += 1
+        return updated
+    
+    async def delete_many(self, document_ids: List[str]) -> int:
+        """Delete documents by ID and return how many were removed."""
+        return sum(self._documents.pop(document_id, None) is not None for document_id in document_ids)
+    
+    async def find_file_paths(self) -> Dict[str, str]:
+        """Map every document ID to its stored `file_path`."""
+        return {document_id: doc["file_path"] for document_id, doc in self._documents.items()}
+    
+    async def ensure_retention_index(self, grace_seconds: int) -> None:
+        """Nothing expires on its own in memory; the reaper does all the work."""
+        pass
+    
+    async def find_recent_phashes(self, since: datetime) -> List[Tuple[str, str, str, datetime]]:
+        """(id, document_type, phash, upload_time) of hashed documents uploaded since `since`, oldest first."""
+        recent = sorted(
+            (d for d in self._documents.values() if d.get("phash") and d["upload_time"] >= since),
+            key=lambda d: d["upload_time"]
+        )
+        return [(str(d["_id"]), d.get("document_type"), d["phash"], d["upload_time"]) for d in recent]
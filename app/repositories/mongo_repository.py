@@ -1,7 +1,9 @@
 """MongoDB document repository implementation."""
 
-from typing import List, Optional
-from pymongo import MongoClient
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import OperationFailure
 from bson import ObjectId
 from app.core.config import settings
 from app.core.exceptions import DatabaseError
@@ -11,6 +13,10 @@ from app.repositories.base import IDocumentRepository
 
 logger = get_logger(__name__)
 
+RETENTION_INDEX = "expire_at_ttl"
+# MongoDB error code for an existing index with different options
+INDEX_OPTIONS_CONFLICT = 85
+
 
 class MongoDocumentRepository(IDocumentRepository):
     """MongoDB implementation of document repository."""
@@ -72,3 +78,105 @@ class MongoDocumentRepository(IDocumentRepository):
         except Exception as e:
             logger.error(f"Failed to delete document {document_id}: {e}")
             raise DatabaseError(f"Failed to delete document: {e}")
+    
+    async def find_expired(self, now: datetime, limit: int = 500) -> List[DocumentRecord]:
+        """Find documents whose `expire_at` has passed, oldest first."""
+        try:
+            cursor = (
+                self._collection.find({"expire_at": {"$lte": now}})
+                .sort("expire_at", ASCENDING)
+                .limit(limit)
+            )
+            return [DocumentRecord.model_validate(doc) for doc in cursor]
+        except Exception as e:
+            logger.error(f"Failed to find expired documents: {e}")
+            raise DatabaseError(f"Failed to find expired documents: {e}")
+    
+    async def update_expiry(self, document_type: str, retention_days: Optional[int]) -> int:
+        """
+        Set `expire_at` to `upload_time` plus `retention_days` on the type's
+        records (clear it when None) and return how many records changed.
+        """
+        try:
+            if not retention_days:
+                result = self._collection.update_many(
+                    {"document_type": document_type, "expire_at": {"$ne": None}},
+                    {"$unset": {"expire_at": ""}}
+                )
+                return result.modified_count
+            # Computed server-side from each record's own upload_time; only
+            # records whose expiry differs are written
+            expire_at = {"$add": ["$upload_time", retention_days * 86400 * 1000]}
+            result = self._collection.update_many(
+                {
+                    "document_type": document_type,
+                    "upload_time": {"$type": "date"},
+                    "$expr": {"$ne": ["$expire_at", expire_at]},
+                },
+                [{"$set": {"expire_at": expire_at}}]
+            )
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Failed to update document expiry: {e}")
+            raise DatabaseError(f"Failed to update document expiry: {e}")
+    
+    async def delete_many(self, document_ids: List[str]) -> int:
+        """Delete documents by ID and return how many were removed."""
+        try:
+            object_ids = [ObjectId(i) for i in document_ids if ObjectId.is_valid(i)]
+            if not object_ids:
+                return 0
+            result = self._collection.delete_many({"_id": {"$in": object_ids}})
+            return result.deleted_count
+        except Exception as e:
+            logger.error(f"Failed to delete documents: {e}")
+            raise DatabaseError(f"Failed to delete documents: {e}")
+    
+    async def find_file_paths(self) -> Dict[str, str]:
+        """Map every document ID to its stored `file_path`."""
+        try:
+            cursor = self._collection.find({}, {"file_path": 1})
+            return {str(doc["_id"]): doc.get("file_path") for doc in cursor}
+        except Exception as e:
+            logger.error(f"Failed to list file paths: {e}")
+            raise DatabaseError(f"Failed to list file paths: {e}")
+    
+    async def find_recent_phashes(self, since: datetime) -> List[Tuple[str, str, str, datetime]]:
+        """(id, document_type, phash, upload_time) of hashed documents uploaded since `since`, oldest first."""
+        try:
+            cursor = (
+                self._collection.find(
+                    {"phash": {"$type": "string"}, "upload_time": {"$gte": since}},
+                    {"document_type": 1, "phash": 1, "upload_time": 1}
+                )
+                .sort("upload_time", ASCENDING)
+            )
+            return [
+                (str(doc["_id"]), doc.get("document_type"), doc["phash"], doc["upload_time"])
+                for doc in cursor
+            ]
+        except Exception as e:
+            logger.error(f"Failed to load document hashes: {e}")
+            raise DatabaseError(f"Failed to load document hashes: {e}")
+    
+    async def ensure_retention_index(self, grace_seconds: int) -> None:
+        """
+        TTL index on `expire_at`. The reaper deletes expired records (and their
+        files) first; Mongo removes whatever it missed `grace_seconds` later.
+        """
+        try:
+            self._collection.create_index(
+                [("expire_at", ASCENDING)],
+                name=RETENTION_INDEX,
+                expireAfterSeconds=grace_seconds
+            )
+        except OperationFailure as e:
+            if e.code != INDEX_OPTIONS_CONFLICT:
+                logger.error(f"Failed to create retention index: {e}")
+                raise DatabaseError(f"Failed to create retention index: {e}")
+            # Same index with another grace period: update it in place
+            self._db.command(
+                "collMod", settings.collection_name,
+                index={"name": RETENTION_INDEX, "expireAfterSeconds": grace_seconds}
+            )
+        logger.info(f"Retention TTL index ready (grace {grace_seconds}s)")
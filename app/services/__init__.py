@@ -5,11 +5,23 @@ from .local_file_storage import LocalFileStorageService
 from .ocr_service import IOCRService
 from .qwen_ocr_service import QwenOCRService
 from .document_service import DocumentService
+from .single_flight import SingleFlight
+from .document_cache import CachedDocument, DocumentCache, document_cache
+from .near_duplicate_index import NearDuplicateIndex
+from .retention_service import RetentionService
+from .remote_pipeline import RemoteInferencePipeline
 
 __all__ = [
     "IFileStorageService",
     "LocalFileStorageService",
     "IOCRService", 
     "QwenOCRService",
-    "DocumentService"
+    "DocumentService",
+    "SingleFlight",
+    "CachedDocument",
+    "DocumentCache",
+    "document_cache",
+    "NearDuplicateIndex",
+    "RetentionService",
+    "RemoteInferencePipeline"
 ]
@@ -0,0 +1,99 @@
+"""In-process read-through cache of serialized document payloads."""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class CachedDocument:
+    """A document's JSON body, ready to send, and its strong ETag."""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True if an `If-None-Match` header value names this body's ETag."""
+        if not if_none_match:
+            return False
+        # If-None-Match uses the weak comparison, so a W/ prefix still matches
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or self.etag in tags
+
+
+class DocumentCache:
+    """
+    LRU of `CachedDocument`s keyed by document ID.
+
+    Stored documents never change, so entries only go away on delete (or
+    eviction). Entries also expire after `ttl_seconds`, which bounds how long
+    another worker process can serve a document this one deleted.
+
+    A lookup that misses reads `generation` before going to the database and
+    passes it back to `put`; if any invalidation happened in between, the
+    result is not cached, so a slow read cannot resurrect a deleted document.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_entries = settings.document_cache_max_entries if max_entries is None else max_entries
+        self.ttl_seconds = settings.document_cache_ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries: "OrderedDict[str, tuple[CachedDocument, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, document_id: str) -> Optional[CachedDocument]:
+        """Return the cached document, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(document_id)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[document_id]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(document_id)
+        metrics.inc("document_cache_hits_total" if entry is not None else "document_cache_misses_total")
+        return entry[0] if entry is not None else None
+
+    def put(self, document_id: str, payload: Dict[str, Any], generation: int) -> CachedDocument:
+        """
+        Serialize `payload` and cache it, unless the cache was invalidated
+        after `generation` was read.
+        """
+        document = CachedDocument(JSONResponse(content=jsonable_encoder(payload)).body)
+        if self.max_entries <= 0:
+            return document
+        with self._lock:
+            if generation == self.generation:
+                self._entries[document_id] = (document, time.monotonic() + self.ttl_seconds)
+                self._entries.move_to_end(document_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            metrics.set_gauge("document_cache_entries", len(self._entries))
+        return document
+
+    def invalidate(self, document_id: str) -> None:
+        """Drop a document (e.g. after it was deleted)."""
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(document_id, None)
+            metrics.set_gauge("document_cache_entries", len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            metrics.set_gauge("document_cache_entries", 0)
+
+
+# Shared across requests (and the retention reaper, which invalidates on delete)
+document_cache = DocumentCache()
@@ -1,17 +1,44 @@
 """Main document processing service."""
 
-from datetime import datetime
-from typing import List
+import asyncio
+import copy
+import hashlib
+import io
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 from fastapi import UploadFile
-from app.core.exceptions import UnsupportedFileTypeError
-from app.core.logging import get_logger
-from app.models import DocumentRecord, DocumentResponse, DocumentType, ProcessingResult
+from PIL import Image
+from app.core.capture import current_capture
+from app.core.config import settings
+from app.core.exceptions import DeadlineExceededError, RequestCancelledError, UnsupportedFileTypeError
+from app.core.logging import bind_log_context, get_logger
+from app.core.metrics import metrics
+from app.models import DocumentRecord, DocumentResponse, DocumentType, ProcessingOptions, ProcessingResult
 from app.repositories import IDocumentRepository
+from app.services.document_cache import CachedDocument, DocumentCache, document_cache
 from app.services.file_storage import IFileStorageService
+from app.services.near_duplicate_index import NearDuplicateIndex, format_phash
 from app.services.ocr_service import IOCRService
+from app.services.single_flight import SingleFlight
+from utils.image_hash import compute_phash
 
 logger = get_logger(__name__)
 
+# Shared across requests so concurrent duplicate uploads run inference once
+ocr_single_flight = SingleFlight()
+
+
+def _upload_phash(contents: bytes) -> Optional[int]:
+    try:
+        img = Image.open(io.BytesIO(contents))
+        # JPEGs can be decoded straight at a fraction of their size; the hash needs 64x64
+        img.draft("RGB", (256, 256))
+        return compute_phash(img)
+    except OSError:
+        # Not a decodable image: the OCR path reports it
+        return None
+
 
 class DocumentService:
     """Main service for document processing operations."""
@@ -20,18 +47,26 @@ class DocumentService:
         self,
         repository: IDocumentRepository,
         file_storage: IFileStorageService,
-        ocr_service: IOCRService
+        ocr_service: IOCRService,
+        single_flight: Optional[SingleFlight] = None,
+        cache: Optional[DocumentCache] = None,
+        near_duplicates: Optional[NearDuplicateIndex] = None
     ):
         self._repository = repository
         self._file_storage = file_storage
         self._ocr_service = ocr_service
+        self._single_flight = single_flight if single_flight is not None else ocr_single_flight
+        self._cache = cache if cache is not None else document_cache
+        self._near_duplicates = near_duplicates
     
     async def process_document(
         self, 
         file: UploadFile, 
-        document_type: DocumentType
+        document_type: DocumentType,
+        options: Optional[ProcessingOptions] = None
     ) -> DocumentResponse:
         """Process an uploaded document."""
+        bind_log_context(document_type=document_type.value)
         logger.info(f"Processing document: {file.filename} as {document_type.value}")
         
         # Validate file type
@@ -41,44 +76,178 @@ class DocumentService:
         # Read file contents
         contents = await file.read()
         
+        # A near duplicate of a recent upload is answered without the model
+        phash = await self._perceptual_hash(contents)
+        duplicate = None
+        if phash is not None and not (options and options.bypass_duplicate_check):
+            duplicate = await self._find_near_duplicate(document_type, phash)
+        
         # Save file
         saved_name, saved_path = await self._file_storage.save_file(contents, file.filename)
+        captured = current_capture()
+        if captured is not None:
+            captured.record_upload(contents, file.filename, file.content_type, document_type.value, saved_path)
         
-        # Process with OCR
-        processing_results = await self._ocr_service.process_file_contents(contents, document_type)
+        if duplicate is not None:
+            prior, distance = duplicate
+            status, results_dict = self._duplicate_answer(prior, distance, document_type)
+        else:
+            # Process with OCR; a failed or cancelled run leaves no orphaned upload behind
+            try:
+                processing_results = await self._process_contents(contents, document_type, options)
+            except Exception:
+                await self._file_storage.delete_file(saved_path)
+                raise
+            
+            # Convert processing results to dict format for storage
+            results_dict = [
+                {
+                    "data": result.data,
+                    "page": result.page,
+                    "pages": result.pages,
+                    "blurIntensity": result.blur_intensity,
+                    "glareIntensity": result.glare_intensity,
+                    "skipped": result.skipped,
+                    "parseRepairs": result.repairs
+                }
+                for result in processing_results
+            ]
+            
+            # No page was extracted and at least one failed the quality gate:
+            # ask the client for a new capture
+            retake = (
+                all(result.skipped for result in processing_results)
+                and any(result.skipped == "quality_gate" for result in processing_results)
+            )
+            status = "retake" if retake else "success"
         
-        # Convert processing results to dict format for storage
-        results_dict = [
-            {
-                "data": result.data,
-                "page": result.page,
-                "blurIntensity": result.blur_intensity,
-                "glareIntensity": result.glare_intensity
-            }
-            for result in processing_results
-        ]
+        # Only clean extractions are offered to later near-duplicate uploads
+        indexed = (
+            phash is not None and duplicate is None and status == "success"
+            and not any("error" in result["data"] for result in results_dict)
+        )
         
         # Create document record
+        upload_time = datetime.now()
+        retention_days = settings.retention_days.get(document_type.value)
         record = DocumentRecord(
             filename=saved_name,
             file_path=saved_path,
             content_type=file.content_type,
             document_type=document_type.value,
             results=results_dict,
-            upload_time=datetime.now()
+            upload_time=upload_time,
+            expire_at=upload_time + timedelta(days=retention_days) if retention_days else None,
+            phash=format_phash(phash) if indexed else None,
+            duplicate_of=str(duplicate[0].id) if duplicate is not None else None
         )
         
         # Save to database
         document_id = await self._repository.save(record)
+        if indexed:
+            self._near_duplicates.add(document_type.value, phash, document_id)
         
+        bind_log_context(document_id=document_id)
         logger.info(f"Document processed successfully: {document_id}")
         
+        if captured is not None:
+            captured.record_result(status, document_id, results_dict)
+        
         return DocumentResponse(
-            status="success",
+            status=status,
             document_id=document_id,
-            results=results_dict
+            results=results_dict,
+            duplicate_of=record.duplicate_of
         )
     
+    async def _perceptual_hash(self, contents: bytes) -> Optional[int]:
+        """pHash of a single-image upload, when near-duplicate detection is on."""
+        if self._near_duplicates is None or contents[:4] == b"%PDF":
+            return None
+        return await asyncio.to_thread(_upload_phash, contents)
+    
+    async def _find_near_duplicate(
+        self,
+        document_type: DocumentType,
+        phash: int
+    ) -> Optional[Tuple[DocumentRecord, int]]:
+        """The closest recent upload of the same type within the distance threshold."""
+        while True:
+            match = self._near_duplicates.find(document_type.value, phash)
+            if match is None:
+                return None
+            document_id, distance = match
+            prior = await self._repository.find_by_id(document_id)
+            if prior is not None:
+                return prior, distance
+            # Deleted (or reaped by retention) since it was indexed
+            self._near_duplicates.discard(document_id)
+    
+    def _duplicate_answer(
+        self,
+        prior: DocumentRecord,
+        distance: int,
+        document_type: DocumentType
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """Status and results for a near-duplicate upload, per `near_duplicate_mode`."""
+        mode = settings.near_duplicate_mode
+        metrics.inc("near_duplicates_total", mode=mode, document_type=document_type.value)
+        metrics.inc(
+            "near_duplicate_gpu_seconds_saved",
+            metrics.mean("ocr_inference_seconds", document_type=document_type.value),
+            document_type=document_type.value
+        )
+        logger.info(f"{document_type.value} upload is a near duplicate of {prior.id} ({distance} bits); {mode}")
+        if mode == "reuse":
+            return "success", copy.deepcopy(prior.results)
+        return "duplicate", []
+    
+    async def _process_contents(
+        self,
+        contents: bytes,
+        document_type: DocumentType,
+        options: Optional[ProcessingOptions]
+    ) -> List[ProcessingResult]:
+        """Run OCR, sharing the work with any identical upload already in flight."""
+        options = options or ProcessingOptions()
+        # Requests only share work scheduled at their own priority class
+        # (None: the document type's default)
+        key = (
+            hashlib.sha256(contents).hexdigest(),
+            document_type.value,
+            options.priority,
+            options.bypass_quality_gate,
+            options.document_mode,
+            tuple(options.pages) if options.pages is not None else None,
+        )
+        
+        async def run():
+            start = time.perf_counter()
+            results = await self._ocr_service.process_file_contents(contents, document_type, options)
+            return results, time.perf_counter() - start
+        
+        # Followers give up on their own deadline and cancellation, not the leader's
+        wait = dict(deadline=options.deadline, cancellation=options.cancellation)
+        try:
+            (results, ocr_seconds), shared = await self._single_flight.do(key, run, **wait)
+        except (DeadlineExceededError, RequestCancelledError):
+            token = options.cancellation
+            if token is not None and token.cancelled:
+                raise
+            if options.deadline is not None and time.monotonic() >= options.deadline:
+                raise
+            # The request we were sharing with was cancelled or ran out of
+            # time, not this one: run it ourselves
+            (results, ocr_seconds), shared = await self._single_flight.do(key, run, **wait)
+        if not shared:
+            return results
+        
+        metrics.inc("ocr_coalesced_total", document_type=document_type.value)
+        metrics.inc("ocr_coalesced_seconds_saved", ocr_seconds, document_type=document_type.value)
+        logger.info(f"Coalesced duplicate {document_type.value} upload with in-flight request")
+        # Each caller post-processes and stores its own copy
+        return [result.model_copy(deep=True) for result in results]
+    
     async def get_documents(self, limit: int = 100, skip: int = 0) -> List[DocumentRecord]:
         """Get list of documents."""
         return await self._repository.find_all(limit=limit, skip=skip)
@@ -90,6 +259,23 @@ class DocumentService:
             raise ValueError(f"Document not found: {document_id}")
         return document
     
+    async def get_document_payload(self, document_id: str) -> CachedDocument:
+        """Get a document's serialized API payload, from the cache when possible."""
+        cached = self._cache.get(document_id)
+        if cached is not None:
+            return cached
+        
+        generation = self._cache.generation
+        document = await self.get_document_by_id(document_id)
+        payload = {
+            "document_id": str(document.id),
+            "filename": document.filename,
+            "upload_time": document.upload_time,
+            "document_type": document.document_type,
+            "results": document.results
+        }
+        return self._cache.put(document_id, payload, generation)
+    
     async def delete_document(self, document_id: str) -> bool:
         """Delete a document and its associated file."""
         # Get document to find file path
@@ -101,4 +287,8 @@ class DocumentService:
         await self._file_storage.delete_file(document.file_path)
         
         # Delete from database
-        return await self._repository.delete_by_id(document_id)
+        deleted = await self._repository.delete_by_id(document_id)
+        self._cache.invalidate(document_id)
+        if self._near_duplicates is not None:
+            self._near_duplicates.discard(document_id)
+        return deleted
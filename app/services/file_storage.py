@@ -1,7 +1,7 @@
 """File storage service interface."""
 
 from abc import ABC, abstractmethod
-from typing import Tuple
+from typing import List, Tuple
 
 
 class IFileStorageService(ABC):
@@ -26,6 +26,11 @@ class IFileStorageService(ABC):
         """Delete a file and return success status."""
         pass
     
+    @abstractmethod
+    async def list_files(self) -> List[Tuple[str, float, int]]:
+        """List stored files as (file_path, modified_timestamp, size_bytes)."""
+        pass
+    
     @abstractmethod
     def is_valid_file_type(self, filename: str) -> bool:
         """Check if file type is supported."""
@@ -0,0 +1,220 @@
+"""Staged generation: CPU preparation and decoding overlapped with the model."""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+from PIL import Image
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.profiling import profile_section
+from app.models import Priority
+from app.services.inference_scheduler import PRIORITY_RANK, InferenceScheduler, inference_scheduler
+
+PREPARE = "prepare"
+MODEL = "model"
+DECODE = "decode"
+POSTPROCESS = "postprocess"
+
+
+def load_inference_backend() -> None:
+    """Import `qwen_infer` and load the model (blocking; run it off the event loop)."""
+    _inference().load_model()
+
+
+def _inference():
+    # `qwen_infer` pulls in torch and transformers, so it is imported on first
+    # use rather than with the app: API-only processes never pay for it
+    import qwen_infer
+    return qwen_infer
+
+
+class _StageStats:
+    """Busy intervals of one stage over a sliding window, for utilisation."""
+
+    def __init__(self, capacity: int, window: float):
+        self.capacity = capacity
+        self.window = window
+        self._intervals: Deque[Tuple[float, float]] = deque()
+        self._lock = threading.Lock()
+
+    def record(self, start: float, end: float) -> None:
+        with self._lock:
+            self._intervals.append((start, end))
+
+    def utilisation(self, now: float) -> float:
+        """Fraction of the stage's capacity that was busy during the last `window` seconds."""
+        horizon = now - self.window
+        with self._lock:
+            while self._intervals and self._intervals[0][1] <= horizon:
+                self._intervals.popleft()
+            busy = sum(end - max(start, horizon) for start, end in self._intervals)
+        return min(1.0, busy / (self.window * self.capacity))
+
+
+class _PrioritySlots:
+    """Counting semaphore that hands free slots to the most urgent waiter first."""
+
+    def __init__(self, size: int):
+        self._free = size
+        self._sequence = itertools.count()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+
+    async def acquire(self, priority: Priority) -> None:
+        if self._free > 0 and not self._waiters:
+            self._free -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITY_RANK[priority], next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Handed a slot just as we were cancelled: pass it on
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._free += 1
+
+
+class InferencePipeline:
+    """
+    Three stages per generation: prepare on a CPU pool, generate on the model
+    thread (through the priority scheduler), decode back on the CPU pool.
+
+    While the model works on one request the pool prepares the next ones, so
+    their tensors are waiting when the model frees up. At most `max_prepared`
+    generations are between the start of preparation and the end of the model
+    stage, which bounds the memory held by ready-but-waiting tensors. Slots go
+    to waiting generations in priority order, like the scheduler's queue.
+    """
+
+    def __init__(
+        self,
+        scheduler: Optional[InferenceScheduler] = None,
+        cpu_workers: Optional[int] = None,
+        max_prepared: Optional[int] = None,
+        window: float = 60.0
+    ):
+        self._scheduler = scheduler if scheduler is not None else inference_scheduler
+        self._cpu_workers = cpu_workers or settings.pipeline_cpu_workers
+        self._max_prepared = max_prepared or settings.pipeline_max_prepared
+        self._cpu_executor = ThreadPoolExecutor(
+            max_workers=self._cpu_workers, thread_name_prefix="inference-cpu"
+        )
+        self._stats = {
+            PREPARE: _StageStats(self._cpu_workers, window),
+            MODEL: _StageStats(1, window),
+            DECODE: _StageStats(self._cpu_workers, window),
+            POSTPROCESS: _StageStats(self._cpu_workers, window),
+        }
+        self._slots: Optional[_PrioritySlots] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def generate(
+        self,
+        img: Union[Image.Image, List[Image.Image]],
+        prompt: str,
+        max_new_tokens: int = 256,
+        max_dim: int = 1200,
+        priority: Priority = Priority.STANDARD,
+        deadline: Optional[float] = None,
+        stop_event: Optional[threading.Event] = None,
+        stage_seconds: Optional[Dict[str, float]] = None,
+        max_pixels: Optional[int] = None
+    ) -> str:
+        """
+        Generate text for one image + prompt through the three stages.
+
+        Args:
+            img: One image, or a list of pages sent together in one message
+            max_pixels: If given, caps each image's area as well as its side
+            stage_seconds: If given, the busy time of each stage is added to it
+
+        Raises:
+            DeadlineExceededError: If the deadline passes before the model stage starts
+            RequestCancelledError: If `stop_event` is set before the model stage starts
+        """
+        slots = self._ensure_slots()
+        wait_start = time.perf_counter()
+        await slots.acquire(priority)
+        try:
+            metrics.observe("pipeline_slot_wait_seconds", time.perf_counter() - wait_start, priority=priority.value)
+            inference = _inference()
+            inputs = await self.run_cpu(
+                PREPARE, inference.prepare_inputs, img, prompt, max_dim, max_pixels, stage_seconds=stage_seconds
+            )
+            generated = await self._scheduler.submit(
+                self._run_stage, MODEL, inference.generate_ids, (inputs, max_new_tokens, stop_event), stage_seconds,
+                priority=priority,
+                deadline=deadline,
+                stop_event=stop_event
+            )
+        finally:
+            slots.release()
+        return await self.run_cpu(DECODE, inference.decode_ids, generated, stage_seconds=stage_seconds)
+
+    async def run_cpu(
+        self,
+        stage: str,
+        fn: Callable[..., Any],
+        *args,
+        stage_seconds: Optional[Dict[str, float]] = None
+    ) -> Any:
+        """Run `fn(*args)` on the CPU pool, accounted to `stage`."""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._cpu_executor, context.run, self._run_stage, stage, fn, args, stage_seconds
+        )
+
+    def utilisation(self) -> Dict[str, float]:
+        """Busy fraction of each stage over the sliding window."""
+        now = time.monotonic()
+        return {stage: stats.utilisation(now) for stage, stats in self._stats.items()}
+
+    def report_utilisation(self) -> None:
+        """Refresh the utilisation gauges (idle stages decay to zero)."""
+        for stage, value in self.utilisation().items():
+            metrics.set_gauge("pipeline_stage_utilisation", value, stage=stage)
+
+    def _run_stage(
+        self,
+        stage: str,
+        fn: Callable[..., Any],
+        args: tuple,
+        stage_seconds: Optional[Dict[str, float]]
+    ) -> Any:
+        start = time.monotonic()
+        try:
+            with profile_section(stage):
+                return fn(*args)
+        finally:
+            end = time.monotonic()
+            self._stats[stage].record(start, end)
+            metrics.observe("pipeline_stage_seconds", end - start, stage=stage)
+            metrics.set_gauge("pipeline_stage_utilisation", self._stats[stage].utilisation(end), stage=stage)
+            if stage_seconds is not None:
+                stage_seconds[stage] = stage_seconds.get(stage, 0.0) + (end - start)
+
+    def _ensure_slots(self) -> _PrioritySlots:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._slots is None:
+            self._loop = loop
+            self._slots = _PrioritySlots(self._max_prepared)
+        return self._slots
+
+
+# Shared pipeline: all OCR services feed the same model
+inference_pipeline = InferencePipeline()
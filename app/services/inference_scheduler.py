@@ -0,0 +1,132 @@
+"""Priority- and deadline-aware scheduling of model inference."""
+
+import asyncio
+import contextvars
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from app.core.exceptions import DeadlineExceededError, RequestCancelledError
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.models import Priority
+
+logger = get_logger(__name__)
+
+PRIORITY_RANK = {
+    Priority.INTERACTIVE: 0,
+    Priority.STANDARD: 1,
+    Priority.BULK: 2,
+}
+
+
+class _Job:
+    __slots__ = ("fn", "args", "priority", "deadline", "stop_event", "future", "context", "enqueued_at")
+
+    def __init__(self, fn, args, priority, deadline, stop_event, future):
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.deadline = deadline
+        self.stop_event = stop_event
+        self.future = future
+        self.context = contextvars.copy_context()
+        self.enqueued_at = time.monotonic()
+
+
+class InferenceScheduler:
+    """
+    Priority queue in front of the single inference thread.
+
+    Jobs run one at a time, most urgent class first and FIFO within a class.
+    A job whose deadline has passed by the time it reaches the front of the
+    queue is dropped without touching the model, as is a job whose
+    `stop_event` was set while it waited.
+    """
+
+    def __init__(self, executor: Optional[ThreadPoolExecutor] = None):
+        # The model is not safe for concurrent use: one worker thread
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self._sequence = itertools.count()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def submit(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        priority: Priority = Priority.STANDARD,
+        deadline: Optional[float] = None,
+        stop_event: Optional[threading.Event] = None
+    ) -> Any:
+        """
+        Queue `fn(*args)` for the inference thread and wait for its result.
+
+        Args:
+            fn: Blocking callable to run on the inference thread
+            priority: Scheduling class
+            deadline: Absolute `time.monotonic()` after which the job is dropped
+            stop_event: Cancellation flag; a set flag drops the job if still queued
+
+        Raises:
+            DeadlineExceededError: If the deadline passes before the job starts
+            RequestCancelledError: If `stop_event` is set before the job starts
+        """
+        if deadline is not None and time.monotonic() >= deadline:
+            self._record_drop(priority)
+            raise DeadlineExceededError("Request deadline exceeded before inference")
+
+        self._ensure_worker()
+        future = self._loop.create_future()
+        job = _Job(fn, args, priority, deadline, stop_event, future)
+        self._queue.put_nowait((PRIORITY_RANK[priority], next(self._sequence), job))
+        metrics.set_gauge("inference_queue_depth", self._queue.qsize())
+        return await future
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.PriorityQueue()
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+            metrics.set_gauge("inference_queue_depth", self._queue.qsize())
+            if job.future.done():
+                # The waiter went away while queued
+                continue
+
+            now = time.monotonic()
+            metrics.observe("inference_queue_wait_seconds", now - job.enqueued_at, priority=job.priority.value)
+            if job.deadline is not None and now >= job.deadline:
+                self._record_drop(job.priority)
+                job.future.set_exception(DeadlineExceededError("Request deadline exceeded while queued"))
+                continue
+            if job.stop_event is not None and job.stop_event.is_set():
+                metrics.inc("inference_cancelled_in_queue_total", priority=job.priority.value)
+                job.future.set_exception(RequestCancelledError("cancelled while queued"))
+                continue
+
+            try:
+                result = await self._loop.run_in_executor(self._executor, job.context.run, job.fn, *job.args)
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+
+    def _record_drop(self, priority: Priority) -> None:
+        metrics.inc("inference_deadline_dropped_total", priority=priority.value)
+        logger.info(f"Dropped expired {priority.value} inference job")
+
+
+# Shared scheduler: all OCR services feed the same model
+inference_scheduler = InferenceScheduler()
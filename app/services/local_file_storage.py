@@ -1,8 +1,10 @@
 """Local file storage service implementation."""
 
+import asyncio
 import os
+import secrets
 from datetime import datetime
-from typing import Tuple
+from typing import List, Tuple
 from app.core.config import settings
 from app.core.exceptions import FileStorageError, UnsupportedFileTypeError
 from app.core.logging import get_logger
@@ -21,9 +23,10 @@ class LocalFileStorageService(IFileStorageService):
     async def save_file(self, contents: bytes, filename: str) -> Tuple[str, str]:
         """Save file contents and return (saved_filename, saved_path)."""
         try:
-            # Generate timestamped filename
+            # Generate timestamped filename; the random part keeps identical
+            # uploads in the same second from sharing (and deleting) one file
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            saved_name = f"{timestamp}_{filename}"
+            saved_name = f"{timestamp}_{secrets.token_hex(4)}_{filename}"
             saved_path = os.path.join(self.upload_dir, saved_name)
             
             # Write file
@@ -49,6 +52,20 @@ class LocalFileStorageService(IFileStorageService):
             logger.error(f"Failed to delete file {file_path}: {e}")
             raise FileStorageError(f"Failed to delete file: {e}")
     
+    async def list_files(self) -> List[Tuple[str, float, int]]:
+        """List stored files as (file_path, modified_timestamp, size_bytes)."""
+        # Large upload directories take a while to scan; keep it off the event loop
+        return await asyncio.to_thread(self._scan_upload_dir)
+    
+    def _scan_upload_dir(self) -> List[Tuple[str, float, int]]:
+        files = []
+        with os.scandir(self.upload_dir) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    files.append((entry.path, stat.st_mtime, stat.st_size))
+        return files
+    
     def is_valid_file_type(self, filename: str) -> bool:
         """Check if file type is supported."""
         ext = os.path.splitext(filename.lower())[1]
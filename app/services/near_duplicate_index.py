@@ -0,0 +1,107 @@
+"""Perceptual-hash index of recent uploads, for spotting near-duplicate documents."""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.repositories import IDocumentRepository
+from utils.image_hash import MultiIndexHash
+
+logger = get_logger(__name__)
+
+# compute_phash's default 16 x 16 frequency block
+PHASH_BITS = 256
+
+
+def format_phash(phash: int) -> str:
+    """Hex form stored on `DocumentRecord.phash` (Mongo integers are 64-bit)."""
+    return f"{phash:0{PHASH_BITS // 4}x}"
+
+
+class _TypeIndex:
+    """Hash index and insertion order of one document type's uploads."""
+
+    def __init__(self, max_distance: int):
+        self.hashes: MultiIndexHash[str] = MultiIndexHash(PHASH_BITS, max_distance)
+        # document_id -> time.time() it was indexed, oldest first
+        self.indexed_at: "OrderedDict[str, float]" = OrderedDict()
+
+
+class NearDuplicateIndex:
+    """
+    pHashes of recent successful extractions, one multi-index hash per document type.
+
+    Holds at most `max_entries` documents per type, dropping the oldest, and
+    ignores entries older than `window_hours`. `find` returns the closest
+    document within `max_distance` bits (by default the tighter
+    `near_duplicate_reuse_max_distance` in reuse mode). The index lives in the process; it
+    is warmed from the repository at startup (`load`), so uploads another
+    worker indexed since then are not seen until the next restart.
+    """
+
+    def __init__(
+        self,
+        max_distance: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        window_hours: Optional[float] = None
+    ):
+        if max_distance is None:
+            max_distance = (
+                settings.near_duplicate_reuse_max_distance if settings.near_duplicate_mode == "reuse"
+                else settings.near_duplicate_max_distance
+            )
+        self.max_distance = max_distance
+        self.max_entries = settings.near_duplicate_max_entries if max_entries is None else max_entries
+        self.window_hours = settings.near_duplicate_window_hours if window_hours is None else window_hours
+        self._types: Dict[str, _TypeIndex] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(index.indexed_at) for index in self._types.values())
+
+    def add(self, document_type: str, phash: int, document_id: str, indexed_at: Optional[float] = None) -> None:
+        with self._lock:
+            index = self._types.get(document_type)
+            if index is None:
+                index = self._types[document_type] = _TypeIndex(self.max_distance)
+            index.hashes.add(phash, document_id)
+            index.indexed_at.pop(document_id, None)
+            index.indexed_at[document_id] = indexed_at if indexed_at is not None else time.time()
+            while len(index.indexed_at) > self.max_entries:
+                oldest, _ = index.indexed_at.popitem(last=False)
+                index.hashes.remove(oldest)
+            metrics.set_gauge("near_duplicate_index_entries", len(index.indexed_at), document_type=document_type)
+
+    def find(self, document_type: str, phash: int) -> Optional[Tuple[str, int]]:
+        """The nearest recent document within `max_distance`, as (document_id, distance)."""
+        horizon = time.time() - self.window_hours * 3600
+        with self._lock:
+            index = self._types.get(document_type)
+            if index is None:
+                return None
+            for distance, document_id in index.hashes.search(phash):
+                if index.indexed_at[document_id] >= horizon:
+                    return document_id, distance
+        return None
+
+    def discard(self, document_id: str) -> None:
+        """Forget a document (deleted, or its record is gone)."""
+        with self._lock:
+            for document_type, index in self._types.items():
+                if index.indexed_at.pop(document_id, None) is not None:
+                    index.hashes.remove(document_id)
+                    metrics.set_gauge("near_duplicate_index_entries", len(index.indexed_at), document_type=document_type)
+
+    async def load(self, repository: IDocumentRepository) -> int:
+        """Index the repository's hashed documents from the last `window_hours`."""
+        since = datetime.now() - timedelta(hours=self.window_hours)
+        loaded = 0
+        for document_id, document_type, phash, upload_time in await repository.find_recent_phashes(since):
+            self.add(document_type, int(phash, 16), document_id, upload_time.timestamp())
+            loaded += 1
+        logger.info(f"Near-duplicate index loaded {loaded} document hashes")
+        return loaded
@@ -1,9 +1,9 @@
 """OCR processing service interface."""
 
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Optional
 from PIL import Image
-from app.models import ProcessingResult, DocumentType
+from app.models import ProcessingResult, ProcessingOptions, DocumentType
 
 
 class IOCRService(ABC):
@@ -13,7 +13,8 @@ class IOCRService(ABC):
     async def process_images(
         self, 
         images: List[Image.Image], 
-        document_type: DocumentType
+        document_type: DocumentType,
+        options: Optional[ProcessingOptions] = None
     ) -> List[ProcessingResult]:
         """Process images and extract information."""
         pass
@@ -22,7 +23,8 @@ class IOCRService(ABC):
     async def process_file_contents(
         self, 
         contents: bytes, 
-        document_type: DocumentType
+        document_type: DocumentType,
+        options: Optional[ProcessingOptions] = None
     ) -> List[ProcessingResult]:
         """Process file contents (image or PDF) and extract information."""
         pass
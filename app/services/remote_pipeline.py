@@ -0,0 +1,181 @@
+"""Generation through a shared model-server process (see `model_server.py`)."""
+
+import asyncio
+import json
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
+from PIL import Image
+from app.core.exceptions import DeadlineExceededError, OCRProcessingError, RequestCancelledError
+from app.core.metrics import metrics
+from app.models import Priority
+from app.services.inference_pipeline import MODEL, PREPARE, InferencePipeline
+from utils.image_utils import resize_to_max_dim, resize_to_max_pixels
+
+_HEADER = struct.Struct("!I")
+# How often a waiting request checks its stop event
+_CANCEL_POLL_SECONDS = 0.05
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """Read one length-prefixed JSON message; None at end of stream."""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+        (length,) = _HEADER.unpack(header)
+        return json.loads(await reader.readexactly(length))
+    except asyncio.IncompleteReadError:
+        return None
+
+
+async def write_message(writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+    payload = json.dumps(message).encode("utf-8")
+    writer.write(_HEADER.pack(len(payload)) + payload)
+    await writer.drain()
+
+
+def image_to_shared_memory(img: Image.Image) -> Dict[str, Any]:
+    """
+    Copy an image's RGB pixels into a new shared-memory block.
+
+    Returns the control message fields describing it. The caller owns the
+    block and must `release_shared_memory` it once the server has answered.
+    """
+    pixels = np.asarray(img.convert("RGB"))
+    shm = SharedMemory(create=True, size=max(1, pixels.nbytes))
+    np.ndarray(pixels.shape, dtype=np.uint8, buffer=shm.buf)[...] = pixels
+    name = shm.name
+    shm.close()
+    return {"shm": name, "shape": list(pixels.shape)}
+
+
+def image_from_shared_memory(name: str, shape) -> Image.Image:
+    """Build a PIL image from a block written by `image_to_shared_memory`."""
+    shm = SharedMemory(name=name)
+    # Attaching registers the block with this process's resource tracker,
+    # which would unlink it (and warn) at exit; the writer owns it
+    resource_tracker.unregister(shm._name, "shared_memory")
+    try:
+        # PIL copies RGB data, so the block can be released as soon as this returns
+        img = Image.fromarray(np.ndarray(tuple(shape), dtype=np.uint8, buffer=shm.buf))
+    finally:
+        shm.close()
+    return img
+
+
+def release_shared_memory(name: str) -> None:
+    try:
+        shm = SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _fit(img: Image.Image, max_dim: int, max_pixels: Optional[int]) -> Image.Image:
+    img = resize_to_max_dim(img, max_dim)
+    return resize_to_max_pixels(img, max_pixels) if max_pixels else img
+
+
+class RemoteInferencePipeline(InferencePipeline):
+    """
+    `InferencePipeline` whose model stage runs in the shared model server.
+
+    The resize to `max_dim` happens here, on this worker's CPU pool; the
+    pixels (one block per page) go to the server through shared memory and only a small JSON
+    control message crosses the unix socket. The server runs its own
+    pipeline (processor, priority scheduler, model, decode) and answers with
+    the text. Post-processing (`run_cpu`) stays local.
+
+    Setting `stop_event` sends a cancel message; closing the connection (the
+    request task was cancelled) does the same.
+    """
+
+    def __init__(self, socket_path: str, cpu_workers: Optional[int] = None):
+        super().__init__(cpu_workers=cpu_workers)
+        self._socket_path = socket_path
+
+    async def generate(
+        self,
+        img: Union[Image.Image, List[Image.Image]],
+        prompt: str,
+        max_new_tokens: int = 256,
+        max_dim: int = 1200,
+        priority: Priority = Priority.STANDARD,
+        deadline: Optional[float] = None,
+        stop_event: Optional[threading.Event] = None,
+        stage_seconds: Optional[Dict[str, float]] = None,
+        max_pixels: Optional[int] = None
+    ) -> str:
+        """Generate text for one image (or several pages) + prompt on the model server."""
+        pages = img if isinstance(img, list) else [img]
+        images = await self.run_cpu(
+            PREPARE, lambda: [image_to_shared_memory(_fit(page, max_dim, max_pixels)) for page in pages],
+            stage_seconds=stage_seconds
+        )
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_unix_connection(self._socket_path)
+        except OSError as e:
+            for image in images:
+                release_shared_memory(image["shm"])
+            raise OCRProcessingError(f"Model server unavailable: {e}")
+
+        try:
+            await write_message(writer, {
+                "op": "generate",
+                "images": images,
+                "prompt": str(prompt),
+                "max_new_tokens": max_new_tokens,
+                "max_dim": max_dim,
+                "max_pixels": max_pixels,
+                "priority": priority.value,
+                # Monotonic clocks are not shared between processes: send what is left
+                "deadline_in": deadline - time.monotonic() if deadline is not None else None,
+            })
+            response = await self._await_response(reader, writer, stop_event)
+        finally:
+            writer.close()
+            for image in images:
+                release_shared_memory(image["shm"])
+            metrics.observe("model_server_roundtrip_seconds", time.perf_counter() - start)
+
+        if response is None:
+            raise OCRProcessingError("Model server closed the connection")
+        if stage_seconds is not None:
+            for stage, seconds in response.get("stage_seconds", {}).items():
+                stage_seconds[stage] = stage_seconds.get(stage, 0.0) + seconds
+        error = response.get("error")
+        if error == "DeadlineExceededError":
+            raise DeadlineExceededError(response["message"])
+        if error == "RequestCancelledError":
+            raise RequestCancelledError(response.get("reason", "cancelled"))
+        if error:
+            raise OCRProcessingError(f"Model server error: {response['message']}")
+        return response["text"]
+
+    async def _await_response(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        stop_event: Optional[threading.Event]
+    ) -> Optional[Dict[str, Any]]:
+        read = asyncio.ensure_future(read_message(reader))
+        try:
+            cancel_sent = False
+            while True:
+                done, _ = await asyncio.wait({read}, timeout=_CANCEL_POLL_SECONDS)
+                if done:
+                    return read.result()
+                if stop_event is not None and stop_event.is_set() and not cancel_sent:
+                    await write_message(writer, {"op": "cancel"})
+                    cancel_sent = True
+        finally:
+            read.cancel()
+
+    def utilisation(self) -> Dict[str, float]:
+        # The model stage runs in the server; report it there
+        return {stage: value for stage, value in super().utilisation().items() if stage != MODEL}
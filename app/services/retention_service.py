@@ -0,0 +1,168 @@
+"""Document retention: expiry reaper and upload/record reconciliation."""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.models import DocumentType
+from app.repositories import IDocumentRepository
+from app.services.document_cache import DocumentCache, document_cache
+from app.services.file_storage import IFileStorageService
+
+logger = get_logger(__name__)
+
+
+class ReconcileReport(BaseModel):
+    """Outcome of one reconciliation pass."""
+    files_scanned: int = 0
+    bytes_scanned: int = 0
+    orphan_files_deleted: List[str] = Field(default_factory=list)
+    dangling_records: List[str] = Field(default_factory=list)
+
+
+class RetentionService:
+    """
+    Keeps the uploads directory and the documents collection bounded.
+
+    Records get an `expire_at` from their document type's retention when they
+    are saved; at startup `update_expiry` recomputes it for existing records,
+    so records saved before retention was enabled and changed `retention_days`
+    are covered too. The reaper deletes expired records and their files in batches;
+    Mongo's TTL index only catches records the reaper has not reached after a
+    grace period (it cannot delete files, so those become orphans). The
+    reconciliation pass deletes upload files no record points at and reports
+    records whose file is missing.
+    """
+
+    def __init__(
+        self,
+        repository: IDocumentRepository,
+        file_storage: IFileStorageService,
+        cache: Optional[DocumentCache] = None
+    ):
+        self._repository = repository
+        self._file_storage = file_storage
+        self._cache = cache if cache is not None else document_cache
+        self._last_reconcile: Optional[float] = None
+
+    async def update_expiry(self) -> int:
+        """Recompute every record's `expire_at` from `upload_time` and the current `retention_days`."""
+        updated = 0
+        for document_type in DocumentType:
+            count = await self._repository.update_expiry(
+                document_type.value, settings.retention_days.get(document_type.value)
+            )
+            if count:
+                metrics.inc("retention_expiry_updated_total", count, document_type=document_type.value)
+            updated += count
+        if updated:
+            logger.info(f"Updated the expiry of {updated} documents to the current retention")
+        return updated
+
+    async def reap_expired(self, now: Optional[datetime] = None, batch_size: Optional[int] = None) -> int:
+        """Delete every expired record and its file, `batch_size` records at a time."""
+        now = now or datetime.now()
+        batch_size = batch_size or settings.retention_batch_size
+        reaped = 0
+        while True:
+            start = time.perf_counter()
+            expired = await self._repository.find_expired(now, limit=batch_size)
+            if not expired:
+                break
+
+            for record in expired:
+                try:
+                    await self._file_storage.delete_file(record.file_path)
+                except Exception as e:
+                    # The record goes anyway; reconciliation retries the file as an orphan
+                    logger.warning(f"Could not delete expired file {record.file_path}: {e}")
+                metrics.inc("retention_reaped_total", document_type=record.document_type)
+            document_ids = [str(record.id) for record in expired]
+            deleted = await self._repository.delete_many(document_ids)
+            for document_id in document_ids:
+                self._cache.invalidate(document_id)
+            reaped += deleted
+            metrics.observe("retention_reap_batch_seconds", time.perf_counter() - start)
+
+            # A short batch is the last one; an empty delete means no progress
+            if len(expired) < batch_size or not deleted:
+                break
+            # Let request handlers in between batches
+            await asyncio.sleep(0)
+
+        if reaped:
+            logger.info(f"Reaped {reaped} expired documents")
+        return reaped
+
+    async def reconcile(self, min_orphan_age: Optional[float] = None) -> ReconcileReport:
+        """
+        Delete upload files that no record references and find records whose
+        file is gone. Files younger than `min_orphan_age` seconds are left
+        alone: their record may not be saved yet.
+        """
+        min_orphan_age = settings.orphan_min_age_seconds if min_orphan_age is None else min_orphan_age
+        report = ReconcileReport()
+
+        # List files before reading references, so a file whose record is saved
+        # in between is seen as referenced rather than orphaned
+        start = time.perf_counter()
+        files = await self._file_storage.list_files()
+        metrics.observe("retention_scan_seconds", time.perf_counter() - start)
+        referenced = await self._repository.find_file_paths()
+
+        referenced_paths = {os.path.normpath(path) for path in referenced.values() if path}
+        stored_paths = set()
+        cutoff = time.time() - min_orphan_age
+        for path, modified, size in files:
+            normalized = os.path.normpath(path)
+            stored_paths.add(normalized)
+            report.files_scanned += 1
+            report.bytes_scanned += size
+            if normalized not in referenced_paths and modified < cutoff:
+                if await self._file_storage.delete_file(path):
+                    report.orphan_files_deleted.append(path)
+
+        report.dangling_records = [
+            document_id for document_id, path in referenced.items()
+            if not path or os.path.normpath(path) not in stored_paths
+        ]
+
+        metrics.inc("retention_orphan_files_deleted_total", len(report.orphan_files_deleted))
+        metrics.set_gauge("retention_dangling_records", len(report.dangling_records))
+        metrics.set_gauge("upload_dir_files", report.files_scanned - len(report.orphan_files_deleted))
+        metrics.set_gauge("upload_dir_bytes", report.bytes_scanned)
+        if report.orphan_files_deleted:
+            logger.info(f"Deleted {len(report.orphan_files_deleted)} orphan upload files")
+        if report.dangling_records:
+            logger.warning(
+                f"{len(report.dangling_records)} documents reference missing files, "
+                f"e.g. {report.dangling_records[:5]}"
+            )
+        return report
+
+    async def run(self) -> None:
+        """Reap on every sweep interval and reconcile when due, until cancelled."""
+        try:
+            await self._repository.ensure_retention_index(settings.retention_ttl_grace_seconds)
+        except Exception as e:
+            logger.error(f"Retention TTL index not created, relying on the reaper alone: {e}")
+        try:
+            await self.update_expiry()
+        except Exception as e:
+            logger.error(f"Expiry of existing documents not updated: {e}")
+
+        while True:
+            try:
+                await self.reap_expired()
+                now = time.monotonic()
+                if self._last_reconcile is None or now - self._last_reconcile >= settings.reconcile_interval_seconds:
+                    await self.reconcile()
+                    self._last_reconcile = now
+            except Exception as e:
+                logger.error(f"Retention sweep failed: {e}")
+            await asyncio.sleep(settings.retention_sweep_interval_seconds)
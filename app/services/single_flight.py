@@ -0,0 +1,100 @@
+"""In-flight request coalescing."""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from app.core.cancellation import CancellationToken
+from app.core.exceptions import DeadlineExceededError, RequestCancelledError
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one execution.
+    
+    The first caller for a key runs the work; callers that arrive while it is
+    still running await the same future instead of starting their own. If
+    the first caller is cancelled, its followers get RequestCancelledError
+    (not a CancelledError of their own) and may run the work themselves.
+    A follower stops waiting as soon as its own deadline passes or its own
+    token is cancelled (checked every `poll_interval` seconds).
+    """
+    
+    def __init__(self, poll_interval: float = 0.1):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.poll_interval = poll_interval
+    
+    def __len__(self) -> int:
+        return len(self._inflight)
+    
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        deadline: Optional[float] = None,
+        cancellation: Optional[CancellationToken] = None
+    ) -> Tuple[Any, bool]:
+        """
+        Run `fn` once per in-flight `key`.
+        
+        Args:
+            key: Identity of the work
+            fn: The work, run by the first caller
+            deadline: time.monotonic() after which a follower stops waiting
+            cancellation: Token that makes a follower stop waiting
+        
+        Returns:
+            Tuple of (result, shared) where `shared` is True for callers that
+            reused another caller's execution
+        
+        Raises:
+            DeadlineExceededError: If a follower's deadline passes first
+            RequestCancelledError: If a follower's token is cancelled first
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            return await self._follow(future, deadline, cancellation), True
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Followers were not cancelled: cancelling the future would raise
+            # CancelledError in each of them
+            future.set_exception(RequestCancelledError("leader cancelled"))
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so a key without followers does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._inflight[key]
+    
+    async def _follow(
+        self,
+        future: asyncio.Future,
+        deadline: Optional[float],
+        cancellation: Optional[CancellationToken]
+    ) -> Any:
+        """Wait for the shared result on the follower's own deadline and cancellation."""
+        if deadline is None and cancellation is None:
+            # Shield so one follower giving up does not cancel the shared work
+            return await asyncio.shield(future)
+        while True:
+            if cancellation is not None and cancellation.cancelled:
+                raise RequestCancelledError(cancellation.reason)
+            timeout = self.poll_interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceededError("Request deadline exceeded waiting for a coalesced request")
+                timeout = min(timeout, remaining)
+            # asyncio.wait leaves the shared future running when it times out
+            done, _ = await asyncio.wait({future}, timeout=timeout)
+            if done:
+                return future.result()
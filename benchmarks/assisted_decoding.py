@@ -0,0 +1,170 @@
+"""Acceptance rate and decode speedup of assisted decoding per document type.
+
+Each document type's prompt is run through `qwen_infer.generate_text` with
+assisted decoding off, with prompt lookup, and (given --draft) with a draft
+model. For every mode the benchmark reports:
+
+- acceptance: drafted tokens the model accepted / drafted tokens proposed
+- tok/fwd:    generated tokens per forward pass of the main model
+- speedup:    plain greedy time / assisted time
+
+Assisted greedy decoding must produce exactly the plain greedy output; any
+difference is reported and fails the run.
+
+By default everything runs on CPU with tiny randomly-initialised models
+(`--draft self` drafts with the main model itself, so every draft should be
+accepted). Pass --model/--draft checkpoints for real numbers.
+
+Usage:
+    python -m benchmarks.assisted_decoding [--draft self|tiny|<checkpoint>]
+    python -m benchmarks.assisted_decoding --model Qwen/Qwen2-VL-2B-Instruct --draft <checkpoint>
+"""
+
+import argparse
+import copy
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+import qwen_infer
+from app.core.config import settings
+from app.models import DocumentType
+from benchmarks import tiny_qwen2vl
+from benchmarks.fixtures import make_document_image
+from prompts import PROMPTS
+
+
+class _Counters:
+    def __init__(self):
+        self.forwards = 0
+        self.proposed = 0
+        self.generated = 0
+
+    def reset(self):
+        self.__init__()
+
+
+@contextmanager
+def counting(model, counters: _Counters):
+    """Count main-model forwards, drafted tokens and generated tokens."""
+    hook = model.register_forward_hook(lambda *_: setattr(counters, "forwards", counters.forwards + 1))
+
+    original_generate = model.generate
+
+    def generate(*args, **kwargs):
+        output = original_generate(*args, **kwargs)
+        counters.generated += output.shape[1] - kwargs["input_ids"].shape[1]
+        return output
+
+    original_get_candidates = qwen_infer._GuardedCandidates.get_candidates
+
+    def get_candidates(self, input_ids):
+        candidate_ids, candidate_logits = original_get_candidates(self, input_ids)
+        counters.proposed += candidate_ids.shape[1] - input_ids.shape[1]
+        return candidate_ids, candidate_logits
+
+    model.generate = generate
+    qwen_infer._GuardedCandidates.get_candidates = get_candidates
+    try:
+        yield
+    finally:
+        hook.remove()
+        del model.generate
+        qwen_infer._GuardedCandidates.get_candidates = original_get_candidates
+
+
+def load_models(args):
+    if args.model == "tiny":
+        processor = tiny_qwen2vl.build_processor()
+        model = tiny_qwen2vl.build_model(processor, seed=0)
+    else:
+        from transformers import AutoProcessor, Qwen2VLForConditionalGeneration
+        processor = AutoProcessor.from_pretrained(args.model)
+        model = Qwen2VLForConditionalGeneration.from_pretrained(args.model, device_map="auto")
+
+    if args.draft is None:
+        draft = None
+    elif args.draft == "self":
+        # A separate copy, so its forwards are not counted as the main model's
+        draft = copy.deepcopy(model)
+    elif args.draft == "tiny":
+        draft = tiny_qwen2vl.build_model(processor, seed=1, num_layers=1)
+    else:
+        from transformers import Qwen2VLForConditionalGeneration
+        draft = Qwen2VLForConditionalGeneration.from_pretrained(args.draft, device_map="auto")
+
+    if draft is not None and args.draft in ("self", "tiny"):
+        # Random weights are never confident; don't let that cut every draft short
+        draft.generation_config.assistant_confidence_threshold = 0.0
+    return model, processor, draft
+
+
+def run_mode(mode, image, prompt, args, counters):
+    settings.assisted_decoding = mode
+    counters.reset()
+    samples = []
+    outputs = set()
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        outputs.add(qwen_infer.generate_text(image, prompt, max_new_tokens=args.max_new_tokens))
+        samples.append(time.perf_counter() - start)
+
+    # Every main-model forward contributes one token of its own; the rest are accepted drafts
+    accepted = counters.generated - counters.forwards
+    return {
+        "seconds": statistics.median(samples),
+        "acceptance": accepted / counters.proposed if counters.proposed else 0.0,
+        "tokens_per_forward": counters.generated / max(1, counters.forwards),
+        "outputs": outputs,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="tiny", help="'tiny' or a Qwen2-VL checkpoint")
+    parser.add_argument("--draft", default=None, help="'self', 'tiny' or a Qwen2-VL checkpoint")
+    parser.add_argument("--draft-tokens", type=int, default=settings.assisted_draft_tokens)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    settings.assisted_draft_tokens = args.draft_tokens
+    settings.assisted_draft_schedule = "constant"
+    model, processor, draft = load_models(args)
+    qwen_infer.use_model(model, processor, draft)
+
+    modes = ["prompt_lookup"] + (["draft"] if draft is not None else [])
+    image = make_document_image(width=448, height=308)
+    counters = _Counters()
+    mismatches = []
+
+    print(f"{'document':<14} {'mode':<14} {'acceptance':>10} {'tok/fwd':>8} {'time':>9} {'speedup':>8}")
+    with counting(model, counters):
+        for document_type in DocumentType:
+            prompt = PROMPTS[document_type.value]
+            # Warm up allocator and kernels once per prompt shape
+            settings.assisted_decoding = "off"
+            qwen_infer.generate_text(image, prompt, max_new_tokens=args.max_new_tokens)
+
+            plain = run_mode("off", image, prompt, args, counters)
+            print(f"{document_type.value:<14} {'off':<14} {'-':>10} "
+                  f"{plain['tokens_per_forward']:>8.2f} {plain['seconds'] * 1000:>7.0f}ms {'1.00x':>8}")
+            for mode in modes:
+                result = run_mode(mode, image, prompt, args, counters)
+                print(f"{'':<14} {mode:<14} {result['acceptance']:>10.1%} "
+                      f"{result['tokens_per_forward']:>8.2f} {result['seconds'] * 1000:>7.0f}ms "
+                      f"{plain['seconds'] / result['seconds']:>7.2f}x")
+                if result["outputs"] != plain["outputs"]:
+                    mismatches.append(f"{document_type.value}/{mode}: output differs from greedy decoding")
+
+    settings.assisted_decoding = "off"
+    if mismatches:
+        print("\nOUTPUT MISMATCHES:")
+        for line in mismatches:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
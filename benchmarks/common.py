@@ -0,0 +1,130 @@
+"""Shared timing, reporting and baseline helpers for the benchmarks."""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Callable, Dict, List
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Metrics where a larger value is an improvement; everything else is a latency.
+HIGHER_IS_BETTER = {"throughput"}
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Summarise latency samples (seconds)."""
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "mean": statistics.fmean(ordered),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+    }
+
+
+def time_callable(fn: Callable[[], object], repeat: int, warmup: int = 1) -> Dict[str, float]:
+    """Time `fn` `repeat` times after `warmup` untimed calls."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def add_baseline_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Write the results into the baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative regression before failing (default 0.25)")
+
+
+def load_baseline(path: str) -> Dict[str, Dict[str, float]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: Dict[str, Dict[str, float]]) -> None:
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float
+) -> List[str]:
+    """Return a description of every metric that regressed beyond `tolerance`."""
+    regressions = []
+    for name, metrics in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        for metric, value in metrics.items():
+            expected = reference.get(metric)
+            if not expected:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                regressed = value < expected * (1.0 - tolerance)
+            else:
+                regressed = value > expected * (1.0 + tolerance)
+            if regressed:
+                regressions.append(f"{name} {metric}: {value:.6g} vs baseline {expected:.6g}")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict[str, float]]) -> None:
+    width = max((len(name) for name in results), default=0)
+    for name, metrics in results.items():
+        formatted = "  ".join(
+            f"{metric}={value:.1f}/s" if metric in HIGHER_IS_BETTER else f"{metric}={value * 1000:.3f}ms"
+            for metric, value in metrics.items()
+        )
+        print(f"{name.ljust(width)}  {formatted}")
+
+
+def finish(results: Dict[str, Dict[str, float]], args: argparse.Namespace) -> int:
+    """Print results, then update or check the baseline. Returns the exit code."""
+    print_results(results)
+
+    if args.update_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print(f"No baseline at {args.baseline}; run with --update-baseline on the reference machine to record one")
+        return 1
+
+    # A case missing from the baseline would otherwise never be checked
+    missing = [name for name in results if name not in baseline]
+    if missing:
+        print("\nNOT IN BASELINE (record them with --update-baseline):")
+        for name in missing:
+            print(f"  {name}")
+
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print("\nPERFORMANCE REGRESSIONS:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    if missing:
+        return 1
+    print("\nNo regressions against baseline")
+    return 0
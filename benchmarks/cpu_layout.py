@@ -0,0 +1,180 @@
+"""Throughput of CPU inference across worker-count x thread-count layouts.
+
+For each layout `WxT`, W model processes are started, each with T intra-op
+threads. With --affinity (the default) each process is pinned to its own
+slice of physical cores, as CPU_MODEL_WORKERS / CPU_AFFINITY do in the
+service. Every process loads the model, warms up, waits for the others,
+then runs --requests generations back to back. The benchmark reports
+pages per second over the whole node and the per-page latency distribution.
+
+By default the layouts split the node's physical cores evenly (1xN, 2xN/2,
+... Nx1), plus each multi-worker layout oversubscribed (every worker with
+N unpinned threads, which is what several workers do with torch's
+defaults). Pick the fastest layout for the node size, then set
+CPU_MODEL_WORKERS=W (and CPU_THREADS=T if it differs from cores / W).
+
+Runs a tiny randomly-initialised model by default; pass --model for a real
+checkpoint (on a large node, --requests 4 is plenty).
+
+Usage:
+    python -m benchmarks.cpu_layout [--layouts 1x8 2x4 4x2] [--requests 8]
+    python -m benchmarks.cpu_layout --model Qwen/Qwen2-VL-2B-Instruct --requests 4 --no-affinity
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+from benchmarks.common import percentiles
+from utils.cpu_partition import available_cpus, partition, physical_cores
+
+
+def worker(args) -> int:
+    """One model process: load, warm up, report ready, wait for "go", generate."""
+    import qwen_infer
+    from benchmarks import tiny_qwen2vl
+    from benchmarks.fixtures import make_document_image
+    from prompts import PROMPTS
+
+    cpus = [int(cpu) for cpu in args.cpus.split(",")] if args.cpus else None
+    qwen_infer.configure_cpu_threads(args.threads, args.interop_threads, cpus)
+    if args.model == "tiny":
+        processor = tiny_qwen2vl.build_processor()
+        model = tiny_qwen2vl.build_model(processor, hidden_size=args.hidden_size, num_layers=args.num_layers)
+    else:
+        from transformers import AutoProcessor, Qwen2VLForConditionalGeneration
+        processor = AutoProcessor.from_pretrained(args.model)
+        model = Qwen2VLForConditionalGeneration.from_pretrained(args.model, device_map="cpu")
+    qwen_infer.use_model(model, processor)
+
+    page = make_document_image(*args.page_size)
+    prompt = PROMPTS[args.document_type]
+
+    def generate():
+        inputs = qwen_infer.prepare_inputs(page.copy(), prompt, args.max_dim)
+        qwen_infer.decode_ids(qwen_infer.generate_ids(inputs, args.max_new_tokens))
+
+    generate()
+    print("ready", flush=True)
+    sys.stdin.readline()
+
+    latencies = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        generate()
+        latencies.append(time.perf_counter() - start)
+    print(json.dumps({"latencies": latencies, "finished": time.time()}), flush=True)
+    return 0
+
+
+def default_layouts(cores: int) -> List[Tuple[int, int, bool]]:
+    """(workers, threads, oversubscribed): even splits, plus oversubscribed multi-worker ones."""
+    layouts = []
+    workers = 1
+    while workers <= cores:
+        layouts.append((workers, cores // workers, False))
+        workers *= 2
+    if layouts[-1][0] != cores:
+        layouts.append((cores, 1, False))
+    layouts += [(workers, cores, True) for workers, _, _ in layouts if workers > 1]
+    return layouts
+
+
+def parse_layout(value: str) -> Tuple[int, int, bool]:
+    try:
+        workers, threads = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("layouts look like WORKERSxTHREADS, e.g. 2x4")
+    return workers, threads, False
+
+
+def read_message(process: subprocess.Popen) -> str:
+    """The worker's next protocol line, skipping whatever else it printed ("" at EOF)."""
+    for line in process.stdout:
+        if line.startswith(("ready", "{")):
+            return line.strip()
+    return ""
+
+
+def run_layout(workers: int, threads: int, pin: bool, cores: List[List[int]], args) -> Dict[str, float]:
+    """Start the worker processes of one layout and measure it."""
+    processes = []
+    for slot in range(workers):
+        command = [
+            sys.executable, "-m", "benchmarks.cpu_layout", "--worker",
+            "--threads", str(threads), "--interop-threads", str(args.interop_threads),
+            "--requests", str(args.requests), "--model", args.model,
+            "--hidden-size", str(args.hidden_size), "--num-layers", str(args.num_layers),
+            "--document-type", args.document_type, "--max-dim", str(args.max_dim),
+            "--max-new-tokens", str(args.max_new_tokens),
+            "--page-size", *(str(side) for side in args.page_size),
+        ]
+        if pin:
+            command += ["--cpus", ",".join(str(cpu) for core in partition(cores, workers, slot) for cpu in core)]
+        processes.append(subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True))
+
+    try:
+        for process in processes:
+            if read_message(process) != "ready":
+                raise RuntimeError(f"A {workers}x{threads} worker failed to start")
+        start = time.time()
+        for process in processes:
+            process.stdin.write("go\n")
+            process.stdin.flush()
+        reports = [json.loads(read_message(process)) for process in processes]
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+    wall = max(report["finished"] for report in reports) - start
+    latencies = [latency for report in reports for latency in report["latencies"]]
+    return {"throughput": len(latencies) / wall, "wall": wall, **percentiles(latencies)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--layouts", type=parse_layout, nargs="+", help="WORKERSxTHREADS, e.g. 1x8 2x4 4x2")
+    parser.add_argument("--affinity", action=argparse.BooleanOptionalAction, default=True,
+                        help="Pin each worker to its own cores (even-split layouts)")
+    parser.add_argument("--requests", type=int, default=8, help="Generations per worker")
+    parser.add_argument("--model", default="tiny", help="'tiny' or a Qwen2-VL checkpoint")
+    parser.add_argument("--hidden-size", type=int, default=512, help="Tiny model width")
+    parser.add_argument("--num-layers", type=int, default=4, help="Tiny model depth")
+    parser.add_argument("--document-type", default="ic")
+    parser.add_argument("--page-size", type=int, nargs=2, default=[1200, 800], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--max-dim", type=int, default=1200)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--interop-threads", type=int, default=1)
+    # Internal: run as one of a layout's model processes
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--threads", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--cpus", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return worker(args)
+
+    cores = physical_cores(available_cpus())
+    layouts = args.layouts or default_layouts(len(cores))
+    print(f"{len(cores)} physical cores, {sum(len(core) for core in cores)} CPUs; "
+          f"{args.requests} generations per worker, {args.max_new_tokens} new tokens max\n")
+    print(f"{'layout':<14} {'pinned':>6} {'pages/s':>8} {'mean':>9} {'p50':>9} {'p95':>9}")
+    best: Optional[Tuple[float, str]] = None
+    for workers, threads, oversubscribed in layouts:
+        pin = args.affinity and not oversubscribed and workers * threads <= len(cores)
+        result = run_layout(workers, threads, pin, cores, args)
+        label = f"{workers}x{threads}" + (" (over)" if oversubscribed else "")
+        print(f"{label:<14} {'yes' if pin else 'no':>6} {result['throughput']:>8.2f} "
+              + " ".join(f"{result[q] * 1000:>7.0f}ms" for q in ("mean", "p50", "p95")))
+        if best is None or result["throughput"] > best[0]:
+            best = (result["throughput"], label)
+    print(f"\nBest: {best[1]} at {best[0]:.2f} pages/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""End-to-end HTTP load benchmark against the FastAPI app with a stub model.
+
+Drives the real routes, `DocumentService`, file storage and OCR post-processing
+in-process, with the model replaced by `benchmarks.stub_model` and MongoDB by
+`InMemoryDocumentRepository`.
+
+With --model-server the stub model runs in a separate `model_server` process
+and pages reach it through shared memory, as with MODEL_SERVER_SOCKET.
+
+Usage:
+    python -m benchmarks.e2e [--concurrency 1 4 16] [--requests 64] [--model-latency-ms 50] [--model-server]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from benchmarks import stub_model
+from benchmarks.common import add_baseline_arguments, finish, percentiles
+from benchmarks.fixtures import encode_image, make_document_image, make_pdf
+
+WORKLOAD = [
+    ("/api/ic", "ic.jpg", "image/jpeg"),
+    ("/api/passport", "passport.jpg", "image/jpeg"),
+    ("/api/bank-transfer", "transfer.png", "image/png"),
+    ("/api/ssm-form-d", "form_d.pdf", "application/pdf"),
+]
+
+
+def build_app(upload_dir: str, model_server_socket: Optional[str] = None):
+    """Import the app with the stub model and wire in-memory dependencies."""
+    from app.api.container import ServiceContainer
+    from app.main import app
+    from app.repositories import InMemoryDocumentRepository
+    from app.services import LocalFileStorageService, QwenOCRService, RemoteInferencePipeline
+
+    pipeline = RemoteInferencePipeline(model_server_socket) if model_server_socket else None
+    # The lifespan does not run under ASGITransport; install the container directly
+    app.state.container = ServiceContainer(
+        repository=InMemoryDocumentRepository(),
+        file_storage=LocalFileStorageService(upload_dir),
+        ocr_service=QwenOCRService(pipeline=pipeline)
+    )
+    return app
+
+
+def start_model_server(socket_path: str, latency_ms: float) -> subprocess.Popen:
+    """Start a stub `model_server` process and wait for its socket."""
+    process = subprocess.Popen([
+        sys.executable, "-m", "model_server", "--stub",
+        "--socket", socket_path, "--model-latency-ms", str(latency_ms)
+    ])
+    deadline = time.monotonic() + 60
+    while not os.path.exists(socket_path):
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            raise RuntimeError("Model server did not start")
+        time.sleep(0.1)
+    return process
+
+
+def build_payloads(include_pdf: bool) -> List[Tuple[str, str, bytes, str]]:
+    payloads = []
+    for path, filename, content_type in WORKLOAD:
+        if filename.endswith(".pdf"):
+            if not include_pdf:
+                continue
+            contents = make_pdf(2)
+        else:
+            fmt = "PNG" if filename.endswith(".png") else "JPEG"
+            contents = encode_image(make_document_image(1200, 800), fmt)
+        payloads.append((path, filename, contents, content_type))
+    return payloads
+
+
+async def run_level(app, payloads, concurrency: int, total: int) -> Tuple[Dict[str, float], int, int, float]:
+    """
+    Closed-loop load at `concurrency`. Requests shed with 429 are retried after
+    a short pause; latency includes the retries and throughput counts
+    successful requests only (goodput).
+    """
+    import httpx
+
+    latencies: List[float] = []
+    errors = 0
+    shed = 0
+    counter = iter(range(total))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            nonlocal errors, shed
+            for i in counter:
+                path, filename, contents, content_type = payloads[i % len(payloads)]
+                start = time.perf_counter()
+                while True:
+                    response = await client.post(path, files={"file": (filename, contents, content_type)})
+                    if response.status_code != 429:
+                        break
+                    # Shed: back off briefly and retry, like a well-behaved client
+                    shed += 1
+                    await asyncio.sleep(0.02)
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - wall_start
+
+    summary = percentiles(latencies or [0.0])
+    summary["throughput"] = len(latencies) / wall
+    return summary, errors, shed, wall
+
+
+def stage_busy_seconds() -> Dict[str, float]:
+    from app.core.metrics import metrics
+    summaries = metrics.snapshot()["summaries"]
+    prefix = "pipeline_stage_seconds{stage="
+    return {name[len(prefix):-1]: s["sum"] for name, s in summaries.items() if name.startswith(prefix)}
+
+
+def report_utilisation(before: Dict[str, float], after: Dict[str, float], wall: float) -> None:
+    """Print each pipeline stage's busy share of the wall time (CPU stages share the pool)."""
+    from app.core.config import settings
+    parts = []
+    for stage, busy in sorted(after.items()):
+        capacity = 1 if stage == "model" else settings.pipeline_cpu_workers
+        parts.append(f"{stage}={(busy - before.get(stage, 0.0)) / (wall * capacity):.0%}")
+    print("  stage utilisation: " + "  ".join(parts))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=64, help="Requests per concurrency level")
+    parser.add_argument("--model-latency-ms", type=float, default=50.0, help="Simulated generate() time")
+    parser.add_argument("--no-pdf", action="store_true", help="Skip PDF uploads (no poppler available)")
+    parser.add_argument("--model-server", action="store_true", help="Run the stub model in a model_server process")
+    add_baseline_arguments(parser)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    stub_model.install(latency_s=args.model_latency_ms / 1000.0)
+
+    with tempfile.TemporaryDirectory(prefix="bench_uploads_") as upload_dir:
+        server = None
+        socket_path = None
+        if args.model_server:
+            socket_path = os.path.join(upload_dir, "model.sock")
+            server = start_model_server(socket_path, args.model_latency_ms)
+        app = build_app(upload_dir, socket_path)
+        payloads = build_payloads(include_pdf=not args.no_pdf)
+
+        results: Dict[str, Dict[str, float]] = {}
+        failed = False
+        suffix = "/model-server" if args.model_server else ""
+        try:
+            for concurrency in args.concurrency:
+                before = stage_busy_seconds()
+                summary, errors, shed, wall = asyncio.run(run_level(app, payloads, concurrency, args.requests))
+                print(f"c{concurrency}: {shed} responses shed with 429")
+                report_utilisation(before, stage_busy_seconds(), wall)
+                results[f"e2e/mixed/c{concurrency}{suffix}"] = summary
+                if errors:
+                    print(f"c{concurrency}: {errors}/{args.requests} requests failed", file=sys.stderr)
+                    failed = True
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    exit_code = finish(results, args)
+    return 1 if failed else exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""Generated document fixtures for the benchmarks."""
+
+import io
+import random
+from typing import List
+from PIL import Image, ImageDraw, ImageFilter
+
+
+def make_document_image(width: int = 1200, height: int = 800, seed: int = 0, blur: float = 0.0) -> Image.Image:
+    """Draw a card/receipt-like image: light background, text-like bars and a photo block."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", (width, height), (235, 235, 228))
+    draw = ImageDraw.Draw(img)
+
+    # Photo block
+    draw.rectangle(
+        [int(width * 0.05), int(height * 0.2), int(width * 0.3), int(height * 0.8)],
+        fill=(120, 110, 100)
+    )
+
+    # Text lines made of short dark bars
+    line_height = max(8, height // 30)
+    for y in range(int(height * 0.1), int(height * 0.9), line_height * 2):
+        x = int(width * 0.35)
+        while x < width * 0.95:
+            word = rng.randint(line_height, line_height * 5)
+            draw.rectangle([x, y, x + word, y + line_height], fill=(rng.randint(10, 60),) * 3)
+            x += word + line_height
+
+    # A glare spot
+    draw.ellipse([width * 0.6, height * 0.1, width * 0.7, height * 0.25], fill=(255, 255, 255))
+
+    if blur:
+        img = img.filter(ImageFilter.GaussianBlur(blur))
+    return img
+
+
+def encode_image(img: Image.Image, fmt: str = "JPEG") -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def make_pdf(pages: int, width: int = 850, height: int = 1100) -> bytes:
+    """Render `pages` generated document pages into a single PDF."""
+    images: List[Image.Image] = [make_document_image(width, height, seed=i) for i in range(pages)]
+    buf = io.BytesIO()
+    images[0].save(buf, format="PDF", save_all=True, append_images=images[1:])
+    return buf.getvalue()
@@ -0,0 +1,93 @@
+"""Corpus-driven check of lenient JSON recovery against the old strict parser.
+
+Each line of the corpus holds a raw model output, its defect class, the
+document type (for schema keys) and the fields recovery must produce (or
+null when the output is expected to stay unparseable). Every output the
+strict parser rejected but recovery parsed is a re-inference avoided.
+
+Usage:
+    python -m benchmarks.json_recovery [--corpus benchmarks/json_corpus.jsonl]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from benchmarks.common import time_callable
+from prompts import EXPECTED_KEYS
+from utils.json_utils import recover_json
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "json_corpus.jsonl")
+
+
+def strict_parse(raw: str) -> dict:
+    """The original fence-strip + json.loads parser, for comparison."""
+    cleaned = re.sub(r"```json|```", "", raw).strip()
+    if cleaned.startswith('"') and cleaned.endswith('"'):
+        try:
+            return json.loads(bytes(cleaned[1:-1], "utf-8").decode("unicode_escape"))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            pass
+    try:
+        value = json.loads(cleaned)
+        return value if isinstance(value, dict) else {"error": "parse_failed"}
+    except json.JSONDecodeError:
+        return {"error": "parse_failed"}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    args = parser.parse_args(argv)
+
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    by_defect = defaultdict(Counter)
+    repairs_seen = Counter()
+    mismatches = []
+
+    for case in corpus:
+        defect = case["defect"]
+        strict_ok = "error" not in strict_parse(case["raw"])
+        data, repairs = recover_json(case["raw"], EXPECTED_KEYS.get(case["document_type"]))
+        lenient_ok = "error" not in data
+        repairs_seen.update(repairs)
+
+        by_defect[defect]["cases"] += 1
+        by_defect[defect]["strict"] += strict_ok
+        by_defect[defect]["lenient"] += lenient_ok
+        by_defect[defect]["avoided"] += lenient_ok and not strict_ok
+
+        expected = case["expected"]
+        if expected is None:
+            if lenient_ok:
+                mismatches.append(f"{defect}: expected parse failure, got {data}")
+        elif not lenient_ok or any(data.get(k) != v for k, v in expected.items()):
+            mismatches.append(f"{defect}: expected {expected}, got {data}")
+
+    print(f"{'defect':<18} {'cases':>5} {'strict':>6} {'lenient':>7} {'avoided':>7}")
+    totals = Counter()
+    for defect, counts in by_defect.items():
+        totals.update(counts)
+        print(f"{defect:<18} {counts['cases']:>5} {counts['strict']:>6} {counts['lenient']:>7} {counts['avoided']:>7}")
+    print(f"{'TOTAL':<18} {totals['cases']:>5} {totals['strict']:>6} {totals['lenient']:>7} {totals['avoided']:>7}")
+    print(f"\nRe-inferences avoided: {totals['avoided']}/{totals['cases'] - totals['strict']} strict failures")
+    print("Repairs applied:", ", ".join(f"{k}={v}" for k, v in repairs_seen.most_common()))
+
+    raws = [case["raw"] for case in corpus]
+    timing = time_callable(lambda: [recover_json(raw) for raw in raws], repeat=50)
+    print(f"Recovery cost: {timing['p50'] / len(raws) * 1e6:.1f}us per output (p50)")
+
+    if mismatches:
+        print("\nRECOVERY MISMATCHES:")
+        for line in mismatches:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Micro-benchmarks for the per-request utilities.
+
+Usage:
+    python -m benchmarks.micro [--filter blur] [--repeat 20] [--update-baseline]
+"""
+
+import argparse
+import asyncio
+import json
+import shutil
+import sys
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+from benchmarks.common import add_baseline_arguments, finish, time_callable
+from benchmarks.fixtures import make_document_image, make_pdf
+
+IMAGE_SIZES = [(640, 400), (1200, 800), (2400, 1600)]
+PDF_PAGE_COUNTS = [1, 4, 10]
+
+SAMPLE_OUTPUTS = {
+    "clean": json.dumps({"name": "TAN AH KOW", "idNumber": "900101-14-5678", "address": "1 JALAN STUB"}),
+    "fenced": "```json\n" + json.dumps({"companyName": "STUB", "registrationNumber": "201934234321"}) + "\n```",
+    "quoted": json.dumps(json.dumps({"customerName": "TAN AH KOW", "customerAddress": "1 JALAN STUB"})),
+    "broken": '{"date": "01/01/2024", "total": "100.00", "name": "TAN AH',
+}
+
+
+def image_quality_cases() -> List[Tuple[str, Callable[[], object]]]:
+    from utils.image_quality import compute_blur_intensity, compute_glare_intensity
+
+    cases = []
+    for width, height in IMAGE_SIZES:
+        img = make_document_image(width, height)
+        cases.append((f"micro/image_quality.blur/{width}x{height}", lambda img=img: compute_blur_intensity(img)))
+        cases.append((f"micro/image_quality.glare/{width}x{height}", lambda img=img: compute_glare_intensity(img)))
+    return cases
+
+
+def page_filter_cases() -> List[Tuple[str, Callable[[], object]]]:
+    from utils.image_hash import compute_dhash
+    from utils.page_filter import classify_page
+
+    cases = []
+    for width, height in IMAGE_SIZES:
+        img = make_document_image(width, height)
+        seen = [compute_dhash(make_document_image(width, height, seed=i)) for i in range(1, 10)]
+        cases.append((f"micro/page_filter.classify/{width}x{height}", lambda img=img, seen=seen: classify_page(img, seen)))
+    return cases
+
+
+def near_duplicate_cases() -> List[Tuple[str, Callable[[], object]]]:
+    import random
+    from app.services.document_service import _upload_phash
+    from app.services.near_duplicate_index import NearDuplicateIndex
+    from benchmarks.fixtures import encode_image
+    from utils.image_hash import compute_phash
+
+    cases = []
+    for width, height in IMAGE_SIZES:
+        jpeg = encode_image(make_document_image(width, height))
+        cases.append((f"micro/near_duplicate.phash/{width}x{height}", lambda jpeg=jpeg: _upload_phash(jpeg)))
+
+    # Lookup cost in a full per-type index: unrelated hashes, plus generated
+    # documents that share the query's layout
+    rng = random.Random(0)
+    index = NearDuplicateIndex(max_distance=20, max_entries=10000, window_hours=24)
+    for i in range(10000 - 50):
+        index.add("ic", rng.getrandbits(256), str(i))
+    for seed in range(1, 51):
+        index.add("ic", compute_phash(make_document_image(seed=seed)), f"layout-{seed}")
+    query = compute_phash(make_document_image())
+    cases.append(("micro/near_duplicate.lookup/10k", lambda: index.find("ic", query)))
+    return cases
+
+
+def logging_cases() -> List[Tuple[str, Callable[[], object]]]:
+    import io
+    import logging
+    import logging.handlers
+    import queue
+    import time
+    from app.core.logging import ContextFilter, JsonFormatter, _QueueHandler, log_context
+
+    class SlowStream(io.StringIO):
+        """stdout behind a log driver under pressure: 2ms per write."""
+
+        def write(self, text):
+            time.sleep(0.002)
+            return len(text)
+
+    def make_logger(name, handler):
+        logger = logging.getLogger(f"benchmarks.micro.{name}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        return logger
+
+    direct = logging.StreamHandler(SlowStream())
+    direct.setFormatter(JsonFormatter())
+    sink = logging.StreamHandler(SlowStream())
+    sink.setFormatter(JsonFormatter())
+    queued = _QueueHandler(queue.Queue())
+    queued.addFilter(ContextFilter())
+    logging.handlers.QueueListener(queued.queue, sink).start()
+
+    cases = []
+    for name, handler in (("direct", direct), ("queued", queued)):
+        logger = make_logger(name, handler)
+
+        def log_line(logger=logger):
+            with log_context(request_id="0" * 32, document_type="ic"):
+                logger.info("Document processed successfully: 65f0c0ffee", extra={"fields": {"status": 200}})
+
+        cases.append((f"micro/logging.{name}/slow_stdout", log_line))
+    return cases
+
+
+def pdf_cases() -> List[Tuple[str, Callable[[], object]]]:
+    if shutil.which("pdftoppm") is None:
+        print("Skipping pdf_utils benchmarks: poppler (pdftoppm) is not installed", file=sys.stderr)
+        return []
+    from utils.pdf_utils import convert_pdf_to_images
+
+    cases = []
+    for pages in PDF_PAGE_COUNTS:
+        pdf = make_pdf(pages)
+        cases.append((f"micro/pdf_utils.convert/{pages}p", lambda pdf=pdf: convert_pdf_to_images(pdf)))
+    return cases
+
+
+def json_cases() -> List[Tuple[str, Callable[[], object]]]:
+    from utils.json_utils import parse_json_from_string
+
+    return [
+        (f"micro/json.parse/{kind}", lambda raw=raw: parse_json_from_string(raw))
+        for kind, raw in SAMPLE_OUTPUTS.items()
+    ]
+
+
+def repository_cases() -> List[Tuple[str, Callable[[], object]]]:
+    from app.models import DocumentRecord
+    from app.repositories import InMemoryDocumentRepository
+
+    results = [
+        {"data": json.loads(SAMPLE_OUTPUTS["clean"]), "page": page, "blurIntensity": 10, "glareIntensity": 2}
+        for page in range(1, 11)
+    ]
+    record = DocumentRecord(
+        filename="bench.pdf",
+        file_path="uploads/bench.pdf",
+        content_type="application/pdf",
+        document_type="ssm_form_d",
+        results=results,
+        upload_time=datetime.now()
+    )
+    dumped = record.model_dump(by_alias=True, exclude_unset=True)
+
+    repository = InMemoryDocumentRepository()
+    loop = asyncio.new_event_loop()
+    document_id = loop.run_until_complete(repository.save(record))
+
+    return [
+        ("micro/repository.model_dump/10p", lambda: record.model_dump(by_alias=True, exclude_unset=True)),
+        ("micro/repository.model_validate/10p", lambda: DocumentRecord.model_validate(dumped)),
+        ("micro/repository.memory_save/10p", lambda: loop.run_until_complete(repository.save(record.model_copy()))),
+        ("micro/repository.memory_find/10p", lambda: loop.run_until_complete(repository.find_by_id(document_id))),
+    ]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="Timed iterations per case")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this string")
+    add_baseline_arguments(parser)
+    args = parser.parse_args(argv)
+
+    cases = (
+        image_quality_cases() + page_filter_cases() + near_duplicate_cases() + logging_cases()
+        + pdf_cases() + json_cases() + repository_cases()
+    )
+    results: Dict[str, Dict[str, float]] = {}
+    for name, fn in cases:
+        if args.filter in name:
+            results[name] = time_callable(fn, repeat=args.repeat)
+    return finish(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
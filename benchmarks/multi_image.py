@@ -0,0 +1,111 @@
+"""Document mode (all pages in one generation) vs. per-page extraction.
+
+A generated multi-page document is extracted twice through `qwen_infer`:
+
+- per-page:  one generation per page at the per-page `max_dim`
+- document:  one generation whose message holds every page as an image,
+             each capped at DOCUMENT_MODE_MAX_PIXELS, with the document-mode
+             preamble in front of the prompt
+
+For each page count the benchmark reports wall time and the tokens each mode
+pays for: prompt tokens (prefill, vision tokens included), vision tokens
+alone, and generated tokens. Per-page mode repeats the prompt and the JSON
+answer once per page; document mode pays for them once, but its prefill
+grows with every page, which is what the pixel budget bounds.
+
+Runs on CPU with a tiny randomly-initialised model by default, so every
+generation runs to --max-new-tokens; pass --model for a real checkpoint.
+
+Usage:
+    python -m benchmarks.multi_image [--pages 2 3 4] [--max-pixels 401408]
+    python -m benchmarks.multi_image --max-pixels 0     # same page resolution in both modes
+    python -m benchmarks.multi_image --model Qwen/Qwen2-VL-2B-Instruct --document-type utility_bill
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import qwen_infer
+from app.core.config import settings
+from benchmarks import tiny_qwen2vl
+from benchmarks.fixtures import make_document_image
+from prompts import DOCUMENT_MODE_PREAMBLE, PROMPTS
+
+
+def run(pages, prompt, args, max_pixels=None):
+    """One generation; returns (seconds, prompt tokens, vision tokens, generated tokens)."""
+    # `prepare_inputs` resizes in place: give it fresh copies every time
+    images = [page.copy() for page in pages]
+    start = time.perf_counter()
+    inputs = qwen_infer.prepare_inputs(images if len(images) > 1 else images[0], prompt, args.max_dim, max_pixels)
+    generated = qwen_infer.generate_ids(inputs, args.max_new_tokens)
+    qwen_infer.decode_ids(generated)
+    seconds = time.perf_counter() - start
+    image_token_id = qwen_infer.model.config.image_token_id
+    vision = int((inputs.input_ids == image_token_id).sum())
+    return seconds, inputs.input_ids.shape[1], vision, generated.shape[1]
+
+
+def measure(fn, repeat):
+    """Median time over `repeat` runs, with the token counts of the last one."""
+    samples = [fn() for _ in range(repeat)]
+    totals = samples[-1]
+    return (statistics.median(sample[0] for sample in samples),) + totals[1:]
+
+
+def per_page(pages, prompt, args):
+    def once():
+        results = [run([page], prompt, args) for page in pages]
+        return tuple(sum(result[i] for result in results) for i in range(4))
+    return measure(once, args.repeat)
+
+
+def document(pages, prompt, args):
+    prompt = DOCUMENT_MODE_PREAMBLE.format(pages=len(pages)) + prompt
+    return measure(lambda: run(pages, prompt, args, args.max_pixels or None), args.repeat)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="tiny", help="'tiny' or a Qwen2-VL checkpoint")
+    parser.add_argument("--document-type", default="ssm_form_d", choices=sorted(PROMPTS))
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 3, 4])
+    parser.add_argument("--page-size", type=int, nargs=2, default=[850, 1100], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--max-dim", type=int, default=1200, help="Per-page side limit (both modes)")
+    parser.add_argument("--max-pixels", type=int, default=settings.document_mode_max_pixels,
+                        help="Per-page pixel budget in document mode (0: only --max-dim)")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.model == "tiny":
+        processor = tiny_qwen2vl.build_processor()
+        model = tiny_qwen2vl.build_model(processor, hidden_size=256, num_layers=4)
+    else:
+        from transformers import AutoProcessor, Qwen2VLForConditionalGeneration
+        processor = AutoProcessor.from_pretrained(args.model)
+        model = Qwen2VLForConditionalGeneration.from_pretrained(args.model, device_map="auto")
+    qwen_infer.use_model(model, processor)
+
+    prompt = PROMPTS[args.document_type]
+    width, height = args.page_size
+    # Warm up the kernels so the first row is not penalised
+    run([make_document_image(width, height)], prompt, args)
+
+    print(f"{args.document_type}, {width}x{height} pages, max_dim {args.max_dim}, "
+          f"document-mode budget {args.max_pixels} px/page, {args.max_new_tokens} new tokens max\n")
+    print(f"{'pages':>5} {'mode':<9} {'wall':>9} {'prompt tok':>11} {'vision tok':>11} {'gen tok':>8} {'speedup':>8}")
+    for count in args.pages:
+        pages = [make_document_image(width, height, seed=seed) for seed in range(count)]
+        baseline = per_page(pages, prompt, args)
+        merged = document(pages, prompt, args)
+        for mode, (seconds, prompt_tokens, vision_tokens, generated_tokens) in (("per-page", baseline), ("document", merged)):
+            speedup = f"{baseline[0] / seconds:.2f}x" if mode == "document" else ""
+            print(f"{count:>5} {mode:<9} {seconds * 1000:>7.0f}ms {prompt_tokens:>11} {vision_tokens:>11} "
+                  f"{generated_tokens:>8} {speedup:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
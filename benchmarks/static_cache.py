@@ -0,0 +1,120 @@
+"""Per-token decode latency with the static-cache mode vs. the default dynamic cache.
+
+Documents of several sizes (and so prompt lengths) are run through
+`qwen_infer.generate_text` with STATIC_CACHE_ENABLED off and on. Per-token
+latency is the time of an N-token generation minus a 1-token generation,
+divided by N - 1, so prefill and vision encoding cancel out.
+
+The static run warms every bucket first; after that no input shape should
+trigger a compile. Graph compilations after warm-up are reported and fail the
+run, as does any output that differs from the dynamic-cache output.
+
+Runs on CPU with a tiny randomly-initialised model by default; pass --model
+for a real checkpoint.
+
+Usage:
+    python -m benchmarks.static_cache [--max-new-tokens 64] [--buckets 512 1024]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import torch._dynamo
+import qwen_infer
+from app.core.config import settings
+from benchmarks import tiny_qwen2vl
+from benchmarks.fixtures import make_document_image
+from prompts import PROMPTS
+
+# (document type, width, height): different vision token counts per page
+CASES = [
+    ("ic", 448, 308),
+    ("passport", 560, 392),
+    ("bank_transfer", 392, 700),
+    ("utility_bill", 700, 476),
+    ("ic", 448, 308),
+]
+
+
+def median_seconds(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def measure(image, prompt, args):
+    def generate(max_new_tokens):
+        return qwen_infer.generate_text(image, prompt, max_new_tokens=max_new_tokens, max_dim=10_000)
+
+    output = generate(args.max_new_tokens)
+    full = median_seconds(lambda: generate(args.max_new_tokens), args.repeat)
+    first = median_seconds(lambda: generate(1), args.repeat)
+    return output, first, (full - first) / (args.max_new_tokens - 1)
+
+
+def compiled_graphs() -> int:
+    return torch._dynamo.utils.counters["stats"]["unique_graphs"]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="tiny", help="'tiny' or a Qwen2-VL checkpoint")
+    parser.add_argument("--buckets", type=int, nargs="+", default=[512, 1024])
+    parser.add_argument("--compile-mode", default="default")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.model == "tiny":
+        processor = tiny_qwen2vl.build_processor()
+        model = tiny_qwen2vl.build_model(processor, hidden_size=256, num_layers=4)
+    else:
+        from transformers import AutoProcessor, Qwen2VLForConditionalGeneration
+        processor = AutoProcessor.from_pretrained(args.model)
+        model = Qwen2VLForConditionalGeneration.from_pretrained(args.model, device_map="auto")
+    qwen_infer.use_model(model, processor)
+
+    settings.static_cache_buckets = args.buckets
+    settings.static_cache_compile_mode = args.compile_mode
+
+    settings.static_cache_enabled = False
+    dynamic = []
+    for document_type, width, height in CASES:
+        dynamic.append(measure(make_document_image(width, height), PROMPTS[document_type], args))
+
+    settings.static_cache_enabled = True
+    start = time.perf_counter()
+    qwen_infer.warm_static_caches()
+    print(f"Warm-up of buckets {args.buckets}: {time.perf_counter() - start:.1f}s, {compiled_graphs()} graphs")
+
+    graphs_after_warmup = compiled_graphs()
+    mismatches = []
+    print(f"\n{'document':<14} {'size':>9} {'prefill':>9} {'dynamic/tok':>12} {'static/tok':>11} {'speedup':>8}")
+    for (document_type, width, height), (expected, _, dynamic_per_token) in zip(CASES, dynamic):
+        output, prefill, static_per_token = measure(make_document_image(width, height), PROMPTS[document_type], args)
+        print(f"{document_type:<14} {f'{width}x{height}':>9} {prefill * 1000:>7.0f}ms "
+              f"{dynamic_per_token * 1000:>10.2f}ms {static_per_token * 1000:>9.2f}ms "
+              f"{dynamic_per_token / static_per_token:>7.2f}x")
+        if output != expected:
+            mismatches.append(f"{document_type} {width}x{height}: output differs from dynamic cache")
+
+    recompiles = compiled_graphs() - graphs_after_warmup
+    print(f"\nCompilations after warm-up: {recompiles}")
+    if recompiles:
+        mismatches.append(f"{recompiles} compilation(s) after warm-up")
+
+    settings.static_cache_enabled = False
+    if mismatches:
+        print("\nFAILURES:")
+        for line in mismatches:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
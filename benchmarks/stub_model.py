@@ -0,0 +1,91 @@
+"""Stub stand-in for `qwen_infer` so benchmarks run without torch or a GPU.
+
+`install()` must run before the first generation: the pipeline imports
+`qwen_infer` (and with it torch and transformers) on first use.
+"""
+
+import json
+import sys
+import time
+import types
+
+CANNED_OUTPUT = {
+    "ic": {"cardType": "MyKad", "idNumber": "900101-14-5678", "name": "TAN AH KOW",
+           "address": "1 JALAN STUB, 50000 KUALA LUMPUR", "status": None, "isIslam": False,
+           "gender": "LELAKI", "expiryDate": None},
+    "passport_mrz": (
+        "P<MYSTAN<<AH<KOW<<<<<<<<<<<<<<<<<<<<<<<<<<<<\n"
+        "A123456784MYS9001011M3001019900101145678<<60"
+    ),
+    "passport_visual": {"placeOfBirth": "SELANGOR", "dateOfIssue": "01 JAN 2020",
+                        "issuedBy": "MYS", "authority": "KUALA LUMPUR"},
+    "passport": {"type": "P", "countryCode": "MYS", "passportNumber": "A12345678",
+                 "fullName": "TAN AH KOW", "lastName": "TAN", "firstName": "AH KOW",
+                 "placeOfBirth": "SELANGOR", "nationalId": None, "dateOfBirth": "01 JAN 1990",
+                 "sex": "M", "dateOfIssue": "01 JAN 2020", "dateOfExpiry": "01 JAN 2030",
+                 "issuedBy": "MYS", "authority": "KUALA LUMPUR"},
+    "cash_deposit": {"date": "01/01/2024", "time": "10:00", "accountNumber": "1234567890",
+                     "name": "TAN AH KOW", "total": "100.00", "transactionStatus": "SUCCESSFUL"},
+    "bank_transfer": {"status": "Successful", "date": "01 Jan 2024", "time": "10:00",
+                      "amount": "100.00", "referenceCode": "REF123", "toName": "TAN AH KOW",
+                      "toBank": "STUB BANK", "toAccNo": "1234567890", "transferType": "DuitNow",
+                      "remarks": None},
+    "ssm_form_d": {"companyName": "STUB ENTERPRISE", "registrationNumber": "201934234321 (RT0069300-M)",
+                   "oldRegistrationNumber": None, "registrationDate": "01/01/2019",
+                   "principalPlaceOfBusiness": "1 JALAN STUB", "branchAddress": None},
+    "utility_bill": {"customerName": "TAN AH KOW", "customerAddress": "1 JALAN STUB"},
+}
+
+
+def install(latency_s: float = 0.05) -> types.ModuleType:
+    """Register a stub `qwen_infer` module whose inference sleeps for `latency_s`.
+
+    The sleep blocks the calling thread, mirroring the synchronous `generate` call.
+    Preparation does the real resize, so the pipeline's CPU stages have work to overlap.
+    """
+    from prompts import PROMPTS
+    from utils.image_utils import resize_to_max_dim, resize_to_max_pixels
+    from utils.json_utils import parse_json_from_string
+
+    outputs_by_prompt = {str(prompt): CANNED_OUTPUT.get(key, {}) for key, prompt in PROMPTS.items()}
+
+    def prepare_inputs(pil_img, prompt_text, max_dim=1200, max_pixels=None):
+        # The resize is real CPU work, like the processor's
+        images = []
+        for img in (pil_img if isinstance(pil_img, list) else [pil_img]):
+            img = resize_to_max_dim(img, max_dim)
+            images.append(resize_to_max_pixels(img, max_pixels) if max_pixels else img)
+        return images, str(prompt_text)
+
+    def generate_ids(inputs, max_new_tokens=256, stop_event=None):
+        if stop_event is not None:
+            # Like the stopping criterion, give up part-way through decoding
+            if stop_event.wait(latency_s):
+                return ""
+        else:
+            time.sleep(latency_s)
+        # Document-mode prompts put a preamble in front of the document type's prompt
+        prompt = inputs[1]
+        output = next((out for text, out in outputs_by_prompt.items() if prompt.endswith(text)), "")
+        return output if isinstance(output, str) else json.dumps(output)
+
+    def decode_ids(generated_ids):
+        return generated_ids
+
+    def generate_text(pil_img, prompt_text, max_new_tokens=256, max_dim=1200, stop_event=None):
+        inputs = prepare_inputs(pil_img, prompt_text, max_dim)
+        return decode_ids(generate_ids(inputs, max_new_tokens, stop_event))
+
+    def extract_info_from_image(pil_img, prompt_text):
+        return parse_json_from_string(generate_text(pil_img, prompt_text))
+
+    module = types.ModuleType("qwen_infer")
+    module.load_model = lambda: None
+    module.prepare_inputs = prepare_inputs
+    module.generate_ids = generate_ids
+    module.decode_ids = decode_ids
+    module.generate_text = generate_text
+    module.extract_info_from_image = extract_info_from_image
+    module.STUB_LATENCY_S = latency_s
+    sys.modules["qwen_infer"] = module
+    return module
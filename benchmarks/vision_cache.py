@@ -0,0 +1,122 @@
+"""Second prompt on the same image, with and without the vision-encoder cache.
+
+Each page is extracted with one prompt, then with a second one (e.g. the MRZ
+pass followed by the visual-zone pass, or a client re-processing an upload).
+The second generation is timed twice:
+
+- cold: the vision cache is emptied first, so the vision tower runs again
+- warm: the first prompt's vision-tower output is reused
+
+The warm output must match the cold one token for token, and a two-page
+document-mode pass must reuse both pages; either failing fails the run.
+
+Runs on CPU with a tiny randomly-initialised model by default (its vision
+tower made deeper than the other benchmarks' so it is not negligible); pass
+--model for a real checkpoint.
+
+Usage:
+    python -m benchmarks.vision_cache [--max-new-tokens 16] [--repeat 3]
+    python -m benchmarks.vision_cache --model Qwen/Qwen2-VL-2B-Instruct
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import qwen_infer
+from app.core.metrics import metrics
+from benchmarks import tiny_qwen2vl
+from benchmarks.fixtures import make_document_image
+from prompts import PROMPTS
+
+# (width, height) of the pages
+SIZES = [(640, 400), (1200, 800), (850, 1100)]
+
+
+def generate(image, prompt, args):
+    inputs = qwen_infer.prepare_inputs(image.copy(), prompt, args.max_dim)
+    return qwen_infer.generate_ids(inputs, args.max_new_tokens)
+
+
+def timed(fn, repeat: int):
+    """Median seconds over `repeat` runs, and the last run's result."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="tiny", help="'tiny' or a Qwen2-VL checkpoint")
+    parser.add_argument("--first", default="passport", choices=sorted(PROMPTS), help="First prompt")
+    parser.add_argument("--second", default="ic", choices=sorted(PROMPTS), help="Second prompt")
+    parser.add_argument("--max-dim", type=int, default=1200)
+    parser.add_argument("--max-new-tokens", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if qwen_infer._vision_cache.max_bytes <= 0:
+        print("VISION_CACHE_MAX_MB is 0: nothing to compare")
+        return 1
+    if args.model == "tiny":
+        processor = tiny_qwen2vl.build_processor()
+        model = tiny_qwen2vl.build_model(
+            processor, hidden_size=256, num_layers=2, vision_depth=8, vision_embed_dim=256
+        )
+    else:
+        from transformers import AutoProcessor, Qwen2VLForConditionalGeneration
+        processor = AutoProcessor.from_pretrained(args.model)
+        model = Qwen2VLForConditionalGeneration.from_pretrained(args.model, device_map="auto")
+    qwen_infer.use_model(model, processor)
+    cache = qwen_infer._vision_cache
+    first, second = PROMPTS[args.first], PROMPTS[args.second]
+    # Warm up the kernels so the first row is not penalised
+    generate(make_document_image(*SIZES[0], seed=99), first, args)
+
+    failures = []
+    print(f"{args.first} then {args.second}, {args.max_new_tokens} new tokens max\n")
+    print(f"{'page':>10} {'cold':>9} {'warm':>9} {'speedup':>8}  output")
+    for width, height in SIZES:
+        page = make_document_image(width, height)
+
+        def cold():
+            cache.clear()
+            return generate(page, second, args)
+
+        cold_seconds, cold_ids = timed(cold, args.repeat)
+        cache.clear()
+        generate(page, first, args)
+        warm_seconds, warm_ids = timed(lambda: generate(page, second, args), args.repeat)
+        same = cold_ids.tolist() == warm_ids.tolist()
+        if not same:
+            failures.append(f"{width}x{height}: cached output differs")
+        print(f"{width}x{height:<5} {cold_seconds * 1000:>7.0f}ms {warm_seconds * 1000:>7.0f}ms "
+              f"{cold_seconds / warm_seconds:>7.2f}x  {'same' if same else 'DIFFERENT'}")
+
+    # Document mode: both pages were seen one at a time, at the same budget
+    cache.clear()
+    pages = [make_document_image(640, 400, seed=seed) for seed in (1, 2)]
+    for page in pages:
+        generate(page, first, args)
+    hits = metrics.snapshot()["counters"].get("vision_cache_hits_total", 0)
+    inputs = qwen_infer.prepare_inputs([page.copy() for page in pages], second, args.max_dim)
+    qwen_infer.generate_ids(inputs, args.max_new_tokens)
+    reused = metrics.snapshot()["counters"].get("vision_cache_hits_total", 0) - hits
+    print(f"\nDocument mode over 2 pages seen before: {reused:.0f} reused")
+    if reused != 2:
+        failures.append(f"document mode reused {reused:.0f} of 2 pages")
+    print(f"Cache: {cache.bytes / 1024 / 1024:.1f}MB in use of {cache.max_bytes / 1024 / 1024:.0f}MB")
+
+    if failures:
+        print("\nFAILURES:")
+        for line in failures:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
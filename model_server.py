@@ -0,0 +1,123 @@
+"""Model server: one process owns Qwen2-VL and serves every API worker.
+
+API workers started with MODEL_SERVER_SOCKET set don't load the model; they
+resize each page, put its pixels in a shared-memory block and send a small
+JSON control message over this unix socket (see
+`app.services.remote_pipeline`). Here the message is turned back into the
+image (or the pages of a document-mode request) and run through the usual
+pipeline: processor, priority scheduler, model, decode. Memory holds one model however many HTTP workers there are.
+
+Usage:
+    python -m model_server [--socket /tmp/qwen-model.sock]
+    python -m model_server --stub [--model-latency-ms 50]   # no torch, for tests
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+
+async def handle_connection(reader, writer, pipeline) -> None:
+    """Serve one generate request; a cancel message or a closed socket stops it."""
+    from app.core.logging import get_logger
+    from app.models import Priority
+    from app.services.remote_pipeline import image_from_shared_memory, read_message, write_message
+
+    logger = get_logger("model_server")
+    try:
+        request = await read_message(reader)
+        if request is None or request.get("op") != "generate":
+            return
+
+        stop_event = threading.Event()
+        stage_seconds = {}
+        deadline_in = request.get("deadline_in")
+        images = [image_from_shared_memory(image["shm"], image["shape"]) for image in request["images"]]
+        generation = asyncio.ensure_future(pipeline.generate(
+            images[0] if len(images) == 1 else images,
+            request["prompt"],
+            max_new_tokens=request["max_new_tokens"],
+            max_dim=request["max_dim"],
+            max_pixels=request.get("max_pixels"),
+            priority=Priority(request["priority"]),
+            deadline=time.monotonic() + deadline_in if deadline_in is not None else None,
+            stop_event=stop_event,
+            stage_seconds=stage_seconds
+        ))
+
+        # Anything further from the client (cancel, or EOF) stops the generation
+        control = asyncio.ensure_future(read_message(reader))
+        done, _ = await asyncio.wait({generation, control}, return_when=asyncio.FIRST_COMPLETED)
+        if control in done:
+            stop_event.set()
+        try:
+            text = await generation
+        except Exception as e:
+            response = {"error": type(e).__name__, "message": str(e), "stage_seconds": stage_seconds}
+            if hasattr(e, "reason"):
+                response["reason"] = e.reason
+        else:
+            response = {"text": text, "stage_seconds": stage_seconds}
+        control.cancel()
+
+        if not writer.is_closing():
+            await write_message(writer, response)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    except Exception as e:
+        logger.error(f"Model server request failed: {e}")
+    finally:
+        writer.close()
+
+
+async def serve(socket_path: str) -> None:
+    import qwen_infer
+    from app.core.logging import get_logger
+    from app.services.inference_pipeline import inference_pipeline
+
+    logger = get_logger("model_server")
+    await asyncio.to_thread(qwen_infer.load_model)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(
+        lambda reader, writer: handle_connection(reader, writer, inference_pipeline),
+        path=socket_path
+    )
+    logger.info(f"Model server listening on {socket_path}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=None, help="Unix socket path (default: MODEL_SERVER_SOCKET)")
+    parser.add_argument("--stub", action="store_true", help="Serve the benchmark stub model instead of Qwen2-VL")
+    parser.add_argument("--model-latency-ms", type=float, default=50.0, help="Stub generate() time")
+    args = parser.parse_args(argv)
+
+    if args.stub:
+        # Must replace `qwen_infer` before the pipeline imports it
+        from benchmarks import stub_model
+        stub_model.install(latency_s=args.model_latency_ms / 1000.0)
+
+    from app.core.config import settings
+    from app.core.logging import setup_logging
+    setup_logging()
+    socket_path = args.socket or settings.model_server_socket or "/tmp/qwen-model.sock"
+    try:
+        asyncio.run(serve(socket_path))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
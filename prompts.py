@@ -16,8 +16,22 @@ PROMPTS = {
         "dateOfBirth,sex,dateOfIssue,dateOfExpiry,issuedBy,authority."
     ),
 
+    # Two-tier passport extraction: a cheap pass over the MRZ band, then the
+    # visual zone only once the MRZ check digits validate
+    "passport_mrz": (
+        "Transcribe the 2-line passport MRZ exactly, 44 characters per line, using < for fillers."
+        "Output only the two lines."
+    ),
+
+    "passport_visual": (
+        "From the passport visual zone get placeOfBirth,dateOfIssue,issuedBy,authority."
+        "Use null if a field is unreadable."
+        "Date format: DD MMM YYYY."
+        "Return ONLY JSON with keys placeOfBirth,dateOfIssue,issuedBy,authority."
+    ),
+
     "cash_deposit": (
-        "Extract JSON with keys date,time,accountNumber,name,total,transactionStatus from cash-deposit receipt.Output only JSON.",
+        "Extract JSON with keys date,time,accountNumber,name,total,transactionStatus from cash-deposit receipt.Output only JSON."
     ),
 
     "bank_transfer": (
@@ -31,4 +45,30 @@ PROMPTS = {
     "utility_bill": (
         "Extract JSON with keys customerName,customerAddress.Output only JSON."
     ),
-}
\ No newline at end of file
+}
+
+# Document mode: put in front of the document type's prompt when all pages go in one message
+DOCUMENT_MODE_PREAMBLE = (
+    "The {pages} images are the pages of one document, in order. "
+    "Read all of them and give a single answer for the whole document. "
+)
+
+# Keys each prompt asks for; missing keys in recovered model output are filled with null
+EXPECTED_KEYS = {
+    "ic": ["cardType", "idNumber", "name", "address", "status", "isIslam", "gender", "expiryDate"],
+    "passport": [
+        "type", "countryCode", "passportNumber", "fullName", "lastName", "firstName", "placeOfBirth",
+        "nationalId", "dateOfBirth", "sex", "dateOfIssue", "dateOfExpiry", "issuedBy", "authority",
+    ],
+    "passport_visual": ["placeOfBirth", "dateOfIssue", "issuedBy", "authority"],
+    "cash_deposit": ["date", "time", "accountNumber", "name", "total", "transactionStatus"],
+    "bank_transfer": [
+        "status", "date", "time", "amount", "referenceCode", "toName", "toBank", "toAccNo",
+        "transferType", "remarks",
+    ],
+    "ssm_form_d": [
+        "companyName", "registrationNumber", "oldRegistrationNumber", "registrationDate",
+        "principalPlaceOfBusiness", "branchAddress",
+    ],
+    "utility_bill": ["customerName", "customerAddress"],
+}
@@ -1,58 +1,456 @@
-import warnings
-import re
+import hashlib
 import json
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import List, Optional, Tuple, Union
 import torch
 from PIL import Image
-from transformers import Qwen2VLForConditionalGeneration, AutoProcessor
+from transformers import (
+    Qwen2VLForConditionalGeneration, AutoProcessor, CompileConfig, StaticCache,
+    StoppingCriteria, StoppingCriteriaList
+)
+from transformers.generation.candidate_generator import CandidateGenerator
 from qwen_vl_utils import process_vision_info
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.core.profiling import startup_phase
+from utils.cpu_partition import available_cpus, claim_slot, partition, physical_cores, pin_process
+from utils.image_utils import resize_to_max_dim as _normalize_image_for_model
+from utils.image_utils import resize_to_max_pixels as _cap_image_pixels
+from utils.json_utils import parse_json_from_string as _parse_json_from_string
 warnings.filterwarnings("ignore")
 
-# 1) Load processor + full-precision model
-processor = AutoProcessor.from_pretrained("Qwen/Qwen2-VL-2B-Instruct")
-model = Qwen2VLForConditionalGeneration.from_pretrained(
-    "Qwen/Qwen2-VL-2B-Instruct",
-    device_map="auto"
-)
+logger = get_logger(__name__)
+
+# Loaded by `load_model` on first use
+processor = None
+model = None
+assistant_model = None
+_load_lock = threading.Lock()
+
+# Static-cache mode: one preallocated KV cache per length bucket
+_static_caches = {}
+
+class _VisionCache:
+    """
+    Vision-tower outputs of recently seen images, on the model's device.
+
+    Keys (`_vision_key`) cover an image's pixels, size and pixel budget, which
+    together fix the patches the processor produces. The least recently used
+    entries are evicted once the total passes `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, torch.Tensor]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[torch.Tensor]:
+        with self._lock:
+            embeds = self._entries.get(key)
+            if embeds is not None:
+                self._entries.move_to_end(key)
+            return embeds
+
+    def put(self, key: str, embeds: torch.Tensor) -> None:
+        size = embeds.numel() * embeds.element_size()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = embeds
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.numel() * evicted.element_size()
+            metrics.set_gauge("vision_cache_bytes", self.bytes)
 
-def _normalize_image_for_model(pil_img: Image.Image, max_dim: int = 1200) -> Image.Image:
-    """Resize largest side to `max_dim` preserving aspect ratio."""
-    if max(pil_img.size) > max_dim:
-        pil_img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
-    return pil_img
-
-def _parse_json_from_string(raw: str) -> dict:
-    """Strip fences, un-escape if quoted, then JSON-load."""
-    cleaned = re.sub(r"```json|```", "", raw).strip()
-
-    # If the model returned a JSON string literal, un-escape it
-    if cleaned.startswith('"') and cleaned.endswith('"'):
-        inner = cleaned[1:-1]
-        try:
-            unescaped = bytes(inner, "utf-8").decode("unicode_escape")
-            return json.loads(unescaped)
-        except json.JSONDecodeError:
-            # fall through to normal load
-            cleaned = unescaped
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            metrics.set_gauge("vision_cache_bytes", 0)
+
+_vision_cache = _VisionCache(settings.vision_cache_max_mb * 1024 * 1024)
+
+# Cache keys of the images in the generation running in this thread
+_vision_keys: ContextVar[Optional[List[str]]] = ContextVar("vision_keys", default=None)
+
+# Written next to the weights by scripts/prepare_model.py
+PREPARED_MANIFEST = "prepared.json"
+
+def _model_source(name: str) -> Tuple[str, dict]:
+    """
+    Where to load `name` from, plus extra `from_pretrained` arguments.
+
+    A local directory (e.g. one written by scripts/prepare_model.py) loads
+    without touching the network and keeps the dtype it was saved in; the
+    safetensors shards are memory-mapped and copied in tensor by tensor.
+    """
+    if os.path.isdir(name):
+        manifest = os.path.join(name, PREPARED_MANIFEST)
+        if os.path.isfile(manifest):
+            with open(manifest) as f:
+                logger.info(f"Loading prepared checkpoint {name}: {json.load(f)}")
+        return name, {"local_files_only": True, "torch_dtype": "auto", "low_cpu_mem_usage": True}
+    return name, {}
+
+def resolve_device() -> str:
+    """
+    "cuda" or "cpu", from `inference_device` ("auto" picks CUDA when available).
+    """
+    if settings.inference_device == "auto":
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    if settings.inference_device == "cuda" and not torch.cuda.is_available():
+        raise ValueError("inference_device='cuda' but CUDA is not available")
+    return settings.inference_device
+
+def _device_kwargs(device: str) -> dict:
+    """
+    `from_pretrained` placement (and, on CPU, dtype) arguments for `device`.
+    """
+    if device == "cpu":
+        return {"device_map": "cpu", "torch_dtype": getattr(torch, settings.cpu_dtype)}
+    return {"device_map": "auto"}
 
+def configure_cpu_threads(threads: int, interop_threads: int = 1, cpus: Optional[List[int]] = None) -> None:
+    """
+    Set torch's intra-op and inter-op thread counts, pinning the process to `cpus` if given.
+    Call it before the first generation: torch fixes the inter-op pool once it is used.
+    """
+    if cpus:
+        pin_process(cpus)
+    torch.set_num_threads(threads)
     try:
-        return json.loads(cleaned)
-    except json.JSONDecodeError:
-        return {"error": "parse_failed", "raw": raw}
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        logger.warning(f"torch inter-op threads already started; keeping {torch.get_num_interop_threads()}")
+    metrics.set_gauge("inference_cpu_threads", threads)
 
-def extract_info_from_image(pil_img: Image.Image, prompt_text: str) -> dict:
+def _partition_cpu() -> None:
     """
-    Given a PIL image + text prompt, run Qwen2-VL and return parsed JSON.
-    Prompt should demand *raw* JSON (no quotes, no code-blocks).
+    Take this process's share of the node's physical cores for CPU inference.
+    """
+    cores = physical_cores(available_cpus())
+    workers = max(1, settings.cpu_model_workers)
+    slot = claim_slot(workers, settings.cpu_slot_dir) if workers > 1 else 0
+    if slot is None:
+        # More model processes than configured: share the cores unpinned
+        threads = settings.cpu_threads or max(1, len(cores) // workers)
+        logger.warning(f"All {workers} CPU slots are taken; running {threads} threads unpinned")
+        configure_cpu_threads(threads, settings.cpu_interop_threads)
+        return
+
+    mine = partition(cores, workers, slot)
+    threads = settings.cpu_threads or len(mine)
+    cpus = sorted(cpu for core in mine for cpu in core)
+    configure_cpu_threads(threads, settings.cpu_interop_threads, cpus if settings.cpu_affinity else None)
+    logger.info(
+        f"CPU slot {slot + 1}/{workers}: {threads} intra-op threads on CPUs {cpus}"
+        f"{' (pinned)' if settings.cpu_affinity else ''}"
+    )
+
+def load_model() -> None:
+    """
+    Load the processor and model (plus the draft model in "draft" mode) once.
+    Loads from `prepared_model_dir` when it holds a prepared checkpoint.
+    """
+    with _load_lock:
+        if model is not None:
+            return
+
+        name = settings.model_name
+        if settings.prepared_model_dir:
+            if os.path.isfile(os.path.join(settings.prepared_model_dir, "config.json")):
+                name = settings.prepared_model_dir
+            else:
+                logger.warning(
+                    f"No prepared checkpoint in {settings.prepared_model_dir}, loading {name} "
+                    f"(run scripts/prepare_model.py once to create it)"
+                )
+        source, load_kwargs = _model_source(name)
+        device = resolve_device()
+        if device == "cpu":
+            _partition_cpu()
+        device_kwargs = _device_kwargs(device)
+
+        # 1) Load processor + model
+        with startup_phase("processor"):
+            loaded_processor = AutoProcessor.from_pretrained(
+                source, local_files_only=load_kwargs.get("local_files_only", False)
+            )
+        with startup_phase("model"):
+            loaded_model = Qwen2VLForConditionalGeneration.from_pretrained(
+                source,
+                **{**load_kwargs, **device_kwargs}
+            )
+
+        # 2) Optional draft model. It receives the same inputs as the main model
+        #    (pixel_values included), so it has to be a Qwen2-VL checkpoint too.
+        loaded_assistant = None
+        if settings.assisted_decoding == "draft":
+            if not settings.draft_model_name:
+                raise ValueError("assisted_decoding='draft' requires draft_model_name")
+            draft_source, draft_kwargs = _model_source(settings.draft_model_name)
+            with startup_phase("draft_model"):
+                loaded_assistant = Qwen2VLForConditionalGeneration.from_pretrained(
+                    draft_source,
+                    **{**draft_kwargs, **device_kwargs}
+                )
+
+        use_model(loaded_model, loaded_processor, loaded_assistant)
+        if settings.static_cache_enabled:
+            with startup_phase("static_cache_warmup"):
+                warm_static_caches()
+
+def use_model(new_model, new_processor, new_assistant_model=None) -> None:
+    """
+    Install an already-built model, e.g. the tiny random ones the benchmarks use.
     """
-    img = _normalize_image_for_model(pil_img)
+    global processor, model, assistant_model
+    _guard_candidates(new_model)
+    if new_assistant_model is not None:
+        new_assistant_model.generation_config.num_assistant_tokens = settings.assisted_draft_tokens
+        new_assistant_model.generation_config.num_assistant_tokens_schedule = settings.assisted_draft_schedule
+    processor = new_processor
+    assistant_model = new_assistant_model
+    model = new_model
+    _static_caches.clear()
+    _vision_cache.clear()
+    if _vision_cache.max_bytes > 0:
+        _cache_vision_features(new_model)
+
+class _GuardedCandidates(CandidateGenerator):
+    """
+    Trim draft candidates so the main model can always verify them.
+
+    Prompt lookup copies tokens from the prompt, image placeholders included.
+    If those reach the first verification pass, the model sees more image
+    tokens than `pixel_values` has patches and generation fails. Prompt
+    lookup can also propose tokens past `max_length`, overrunning
+    `max_new_tokens`.
+    """
+
+    def __init__(self, inner: CandidateGenerator, blocked_ids: torch.Tensor):
+        self.inner = inner
+        self.blocked_ids = blocked_ids
+
+    def __getattr__(self, name):
+        # `generate` reads assistant_model / num_assistant_tokens off the generator
+        return getattr(self.inner, name)
+
+    def get_candidates(self, input_ids):
+        candidate_ids, candidate_logits = self.inner.get_candidates(input_ids)
+        input_length = input_ids.shape[1]
+        proposed = candidate_ids.shape[1] - input_length
+        keep = proposed
+
+        max_length = getattr(self.inner, "max_length", None)
+        if max_length is not None:
+            # The verification pass adds one token of its own
+            keep = min(keep, max(0, max_length - input_length - 1))
+
+        window = candidate_ids[0, input_length:input_length + keep]
+        blocked = torch.isin(window, self.blocked_ids.to(window.device)).nonzero()
+        if blocked.numel() > 0:
+            keep = int(blocked[0, 0])
+
+        if keep < proposed:
+            candidate_ids = candidate_ids[:, :input_length + keep]
+            if candidate_logits is not None:
+                candidate_logits = candidate_logits[:, :keep]
+        return candidate_ids, candidate_logits
+
+    def update_candidate_strategy(self, input_ids, scores, num_matches):
+        self.inner.update_candidate_strategy(input_ids, scores, num_matches)
+
+def _guard_candidates(target) -> None:
+    if getattr(target, "_guarded_candidates", False):
+        return
+    config = target.config
+    blocked_ids = torch.tensor([
+        config.image_token_id,
+        config.video_token_id,
+        config.vision_start_token_id,
+        config.vision_end_token_id,
+    ])
+    make_generator = target._get_candidate_generator
+
+    def _get_candidate_generator(*args, **kwargs):
+        return _GuardedCandidates(make_generator(*args, **kwargs), blocked_ids)
+
+    target._get_candidate_generator = _get_candidate_generator
+    target._guarded_candidates = True
+
+def _cache_vision_features(target) -> None:
+    """
+    Serve `get_image_features` from `_vision_cache` when `generate_ids` knows
+    the images' keys; only images not seen before go through the vision tower.
+    """
+    inner = target.model
+    if getattr(inner, "_cached_vision_features", False):
+        return
+    compute = inner.get_image_features
+
+    def get_image_features(pixel_values, image_grid_thw=None):
+        keys = _vision_keys.get()
+        if keys is None or image_grid_thw is None or len(keys) != len(image_grid_thw):
+            return compute(pixel_values, image_grid_thw)
+
+        embeds = [_vision_cache.get(key) for key in keys]
+        missing = [index for index, cached in enumerate(embeds) if cached is None]
+        metrics.inc("vision_cache_hits_total", len(keys) - len(missing))
+        metrics.inc("vision_cache_misses_total", len(missing))
+        if missing:
+            if len(missing) < len(keys):
+                # pixel_values holds every image's patches back to back
+                ends = image_grid_thw.prod(-1).cumsum(0).tolist()
+                pixel_values = torch.cat([
+                    pixel_values[(ends[index - 1] if index else 0):ends[index]] for index in missing
+                ])
+                image_grid_thw = image_grid_thw[missing]
+            computed = compute(pixel_values, image_grid_thw)
+            for index, image_embeds in zip(missing, computed):
+                # Several images come back as views of one tensor: keep only their own rows
+                image_embeds = image_embeds.clone() if len(computed) > 1 else image_embeds
+                embeds[index] = image_embeds
+                _vision_cache.put(keys[index], image_embeds)
+        return tuple(embeds)
+
+    inner.get_image_features = get_image_features
+    inner._cached_vision_features = True
+
+def _vision_key(img: Image.Image, max_pixels: Optional[int]) -> str:
+    """
+    Vision-cache key of an image as it goes to the processor.
+    """
+    digest = hashlib.blake2b(img.tobytes(), digest_size=16).hexdigest()
+    return f"{digest}:{img.mode}:{img.width}x{img.height}:{max_pixels or 0}"
+
+def _assisted_generate_kwargs() -> dict:
+    """
+    Extra `generate` arguments for the configured assisted decoding mode.
+    Greedy output is unchanged: every drafted token is verified by the model.
+    """
+    if settings.assisted_decoding == "prompt_lookup":
+        return {"prompt_lookup_num_tokens": settings.assisted_draft_tokens}
+    if settings.assisted_decoding == "draft" and assistant_model is not None:
+        return {"assistant_model": assistant_model}
+    return {}
+
+def _static_cache(bucket: int) -> StaticCache:
+    cache = _static_caches.get(bucket)
+    if cache is None:
+        cache = StaticCache(
+            config=model.config.get_text_config(),
+            max_batch_size=1,
+            max_cache_len=bucket,
+            device=model.device,
+            dtype=model.dtype
+        )
+        _static_caches[bucket] = cache
+    else:
+        cache.reset()
+    return cache
+
+def _compile_config() -> CompileConfig:
+    config = CompileConfig(fullgraph=False, dynamic=False, mode=settings.static_cache_compile_mode)
+    # `generate` only compiles on CUDA unless told otherwise
+    config._compile_all_devices = model.device.type != "cuda"
+    return config
+
+def _static_cache_kwargs(input_length: int, max_new_tokens: int) -> dict:
+    """
+    Extra `generate` arguments for the static-cache mode: the cache of the
+    smallest bucket that fits the prompt plus `max_new_tokens`, and a compile
+    config for the decode step. The decode step's shapes depend only on the
+    cache length, so each bucket compiles once whatever the prompt length.
+
+    Empty (dynamic cache, eager decoding) when the mode is off, when assisted
+    decoding is on (it crops the cache between steps) or when nothing fits.
+    """
+    if not settings.static_cache_enabled or settings.assisted_decoding != "off":
+        return {}
+
+    needed = input_length + max_new_tokens
+    bucket = next((b for b in sorted(settings.static_cache_buckets) if b >= needed), None)
+    if bucket is None:
+        metrics.inc("static_cache_overflow_total")
+        return {}
+
+    metrics.inc("static_cache_generations_total", bucket=str(bucket))
+    return {"past_key_values": _static_cache(bucket), "compile_config": _compile_config()}
+
+def warm_static_caches() -> None:
+    """
+    Allocate every bucket's cache and compile its decode step, so the first
+    requests don't pay for compilation.
+    """
+    inputs = processor.tokenizer(["Warm up."], return_tensors="pt").to(model.device)
+    for bucket in sorted(settings.static_cache_buckets):
+        start = time.perf_counter()
+        model.generate(
+            **inputs,
+            max_new_tokens=3,
+            past_key_values=_static_cache(bucket),
+            compile_config=_compile_config()
+        )
+        logger.info(f"Warmed static cache bucket {bucket} in {time.perf_counter() - start:.1f}s")
+
+class _StopOnEvent(StoppingCriteria):
+    """Stop decoding as soon as `event` is set (e.g. the client went away)."""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full(
+            (input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device
+        )
+
+def prepare_inputs(
+    pil_img: Union[Image.Image, List[Image.Image]],
+    prompt_text: str,
+    max_dim: int = 1200,
+    max_pixels: Optional[int] = None
+):
+    """
+    CPU half of the input path: resize, chat template and the processor's
+    patchification/normalisation. Returns the processor output on the CPU.
+    `max_dim` bounds the image side (and so the number of vision tokens);
+    `max_pixels` additionally caps each image's area.
+
+    A list of images (the pages of one document) goes into a single message,
+    one image entry per page followed by the prompt.
+    """
+    if processor is None:
+        load_model()
+    images = pil_img if isinstance(pil_img, list) else [pil_img]
+    content = []
+    for img in images:
+        img = _normalize_image_for_model(img, max_dim)
+        entry = {"type": "image", "image": img}
+        if max_pixels:
+            entry["image"] = _cap_image_pixels(img, max_pixels)
+            # Keeps the processor's rounding to 28px patches within the budget too
+            entry["max_pixels"] = max_pixels
+        content.append(entry)
+    keys = None
+    if _vision_cache.max_bytes > 0:
+        keys = [_vision_key(entry["image"], max_pixels) for entry in content]
+    content.append({"type": "text", "text": prompt_text})
 
     # 1) Build single-message “chat”
     messages = [{
         "role": "user",
-        "content": [
-            {"type": "image", "image": img},
-            {"type": "text",  "text": prompt_text}
-        ],
+        "content": content,
     }]
 
     # Apply prompt template
@@ -69,23 +467,74 @@ def extract_info_from_image(pil_img: Image.Image, prompt_text: str) -> dict:
         videos=video_inputs,
         padding=True,
         return_tensors="pt"
-    ).to("cuda")
+    )
+    # Read by `generate_ids` (BatchFeature.to returns the same object)
+    inputs.vision_keys = keys
+    return inputs
 
-    # Generate output
-    generated_ids = model.generate(**inputs, max_new_tokens=256)
-    generated_ids_trimmed = [
-        out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-    ]
+def generate_ids(
+    inputs,
+    max_new_tokens: int = 256,
+    stop_event: Optional[threading.Event] = None
+) -> torch.Tensor:
+    """
+    Run the model on prepared inputs and return only the new token ids (on the CPU).
+    Setting `stop_event` ends generation early; the partial output is returned.
+    """
+    if model is None:
+        load_model()
+    vision_keys = getattr(inputs, "vision_keys", None)
+    inputs = inputs.to(model.device)
 
+    # Generate output, reusing cached vision-tower outputs of images seen before
+    stopping_criteria = StoppingCriteriaList([_StopOnEvent(stop_event)]) if stop_event else None
+    token = _vision_keys.set(vision_keys)
+    try:
+        generated_ids = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            stopping_criteria=stopping_criteria,
+            **_assisted_generate_kwargs(),
+            **_static_cache_kwargs(inputs.input_ids.shape[1], max_new_tokens)
+        )
+    finally:
+        _vision_keys.reset(token)
+    generated_ids_trimmed = generated_ids[:, inputs.input_ids.shape[1]:].cpu()
+
+    # Free VRAM
+    if model.device.type == "cuda":
+        torch.cuda.empty_cache()
+    return generated_ids_trimmed
+
+def decode_ids(generated_ids: torch.Tensor) -> str:
+    """
+    Turn the ids returned by `generate_ids` back into text.
+    """
     decoded_output = processor.batch_decode(
-        generated_ids_trimmed,
+        generated_ids,
         skip_special_tokens=True,
         clean_up_tokenization_spaces=True
     )
+    return decoded_output[0]
 
-    raw_text = decoded_output[0]
-
+def generate_text(
+    pil_img: Image.Image,
+    prompt_text: str,
+    max_new_tokens: int = 256,
+    max_dim: int = 1200,
+    stop_event: Optional[threading.Event] = None
+) -> str:
+    """
+    Given a PIL image + text prompt, run Qwen2-VL and return the raw decoded text.
+    All three stages run in the calling thread.
+    """
+    inputs = prepare_inputs(pil_img, prompt_text, max_dim)
+    return decode_ids(generate_ids(inputs, max_new_tokens, stop_event))
 
-    # 5) Free VRAM & parse into a Python dict
-    torch.cuda.empty_cache()
+def extract_info_from_image(pil_img: Image.Image, prompt_text: str) -> dict:
+    """
+    Given a PIL image + text prompt, run Qwen2-VL and return parsed JSON.
+    Prompt should demand *raw* JSON (no quotes, no code-blocks).
+    """
+    raw_text = generate_text(pil_img, prompt_text)
     return _parse_json_from_string(raw_text)
@@ -0,0 +1,92 @@
+"""Import-time budget check for the API process.
+
+Imports a module (default `app.main`) in a fresh interpreter under
+`python -X importtime` and fails if:
+
+- any of the heavy inference dependencies (torch, transformers, ...) or
+  `qwen_infer` got imported: they belong behind the OCR service boundary
+  and load on first generation (or in the lifespan), not at import; or
+- the module's cumulative import time exceeds the budget.
+
+Prints the slowest imports either way.
+
+Usage:
+    python scripts/check_import_time.py [--module app.main] [--budget-ms 2000] [--top 15]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FORBIDDEN = ("torch", "torchvision", "transformers", "qwen_vl_utils", "accelerate", "qwen_infer")
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$")
+
+
+def measure(module: str) -> List[Tuple[str, int, int]]:
+    """Return (name, self_us, cumulative_us) for every module `import module` loads."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": ROOT},
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            imports.append((name, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=2000.0)
+    parser.add_argument("--top", type=int, default=15, help="Slowest top-level packages to list")
+    args = parser.parse_args(argv)
+
+    imports = measure(args.module)
+    total_ms = next(cumulative for name, _, cumulative in reversed(imports) if name == args.module) / 1000
+    forbidden = sorted({
+        name for name, *_ in imports
+        if name.split(".")[0] in FORBIDDEN
+    })
+
+    # Cumulative time of each top-level package (its own import includes its submodules)
+    packages = {}
+    for name, _, cumulative in imports:
+        root = name.split(".")[0]
+        if name == root:
+            packages[root] = max(packages.get(root, 0), cumulative)
+    print(f"import {args.module}: {total_ms:.0f}ms (budget {args.budget_ms:.0f}ms)")
+    print(f"\n{'package':<30} {'cumulative':>10}")
+    for root, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{root:<30} {cumulative / 1000:>8.0f}ms")
+
+    failures = []
+    if forbidden:
+        roots = sorted({name.split(".")[0] for name in forbidden})
+        failures.append(f"{args.module} imports {', '.join(roots)} ({len(forbidden)} modules)")
+    if total_ms > args.budget_ms:
+        failures.append(f"{args.module} took {total_ms:.0f}ms to import, over the {args.budget_ms:.0f}ms budget")
+    if failures:
+        print("\nFAILURES:")
+        for line in failures:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
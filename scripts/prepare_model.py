@@ -0,0 +1,69 @@
+"""Write a local, ready-to-load copy of a Qwen2-VL checkpoint.
+
+Run once per image/volume; replicas then start with PREPARED_MODEL_DIR
+pointing at the output. The output holds the weights already converted to
+the target dtype as safetensors shards, the processor/tokenizer files and a
+`prepared.json` manifest recording where they came from. Loading it needs no
+network access and no dtype conversion, and the shards are memory-mapped.
+
+Usage:
+    python scripts/prepare_model.py --output /models/qwen2-vl-2b [--model Qwen/Qwen2-VL-2B-Instruct] [--dtype bfloat16]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DTYPES = ("bfloat16", "float16", "float32")
+
+
+def prepare(model_name: str, output: str, dtype: str, max_shard_size: str) -> dict:
+    import torch
+    import transformers
+    from transformers import AutoProcessor, Qwen2VLForConditionalGeneration
+    from qwen_infer import PREPARED_MANIFEST
+
+    start = time.perf_counter()
+    processor = AutoProcessor.from_pretrained(model_name)
+    model = Qwen2VLForConditionalGeneration.from_pretrained(
+        model_name, torch_dtype=getattr(torch, dtype), low_cpu_mem_usage=True
+    )
+    loaded = time.perf_counter()
+
+    os.makedirs(output, exist_ok=True)
+    model.save_pretrained(output, safe_serialization=True, max_shard_size=max_shard_size)
+    processor.save_pretrained(output)
+    manifest = {
+        "source": model_name,
+        "dtype": dtype,
+        "transformers": transformers.__version__,
+        "torch": torch.__version__,
+        "prepared_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(output, PREPARED_MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+
+    print(f"Loaded {model_name} in {loaded - start:.1f}s, wrote {output} in {time.perf_counter() - loaded:.1f}s")
+    return manifest
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=None, help="Hub id or local path (default: MODEL_NAME)")
+    parser.add_argument("--output", required=True, help="Directory for the prepared checkpoint")
+    parser.add_argument("--dtype", default="bfloat16", choices=DTYPES)
+    parser.add_argument("--max-shard-size", default="2GB")
+    args = parser.parse_args(argv)
+
+    from app.core.config import settings
+    prepare(args.model or settings.model_name, args.output, args.dtype, args.max_shard_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""Replay captured extraction traffic against a running instance.
+
+Reads a capture written with TRAFFIC_CAPTURE_ENABLED=true (see
+`app.core.capture`) and re-sends every request: same route, query string,
+scheduling headers and upload (read from the capture's blob store and
+checked against its SHA-256). Requests go out
+
+- at the original pace (`--speed 1`): each one at its captured offset from
+  the first, whether or not earlier ones have finished;
+- scaled (`--speed 4` is four times as fast); or
+- as fast as possible (`--speed max`), `--concurrency` at a time.
+
+Reports, per route, the status codes and the latency distribution of the
+replay next to the captured one, and diffs each result against the captured
+result field by field (document ids aside). Exits non-zero when any request
+fails, or with `--fail-on-diff` when any result differs. Replayed requests
+carry an `X-Traffic-Replay` header so a capturing instance does not record
+them again.
+
+Usage:
+    python scripts/replay_traffic.py captures/traffic.jsonl [--base-url http://localhost:8000] [--speed 1|4|max]
+    python scripts/replay_traffic.py captures/traffic.jsonl --speed max --concurrency 8 --report replay.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.capture import REPLAY_HEADER
+from benchmarks.common import percentiles
+
+# Differences listed per result before the rest are only counted
+MAX_LISTED_DIFFS = 5
+
+
+def load_capture(path: str, limit: Optional[int] = None, route: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Captured entries with an upload, oldest first, each with its blob's bytes."""
+    base = os.path.dirname(path)
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "blob" not in entry or (route and entry["path"] != route):
+                continue
+            entries.append(entry)
+    entries.sort(key=lambda entry: entry["time"])
+    entries = entries[:limit] if limit else entries
+
+    for entry in entries:
+        with open(os.path.join(base, entry["blob"]), "rb") as f:
+            contents = f.read()
+        if hashlib.sha256(contents).hexdigest() != entry["sha256"]:
+            raise ValueError(f"Blob {entry['blob']} does not match its captured SHA-256")
+        entry["contents"] = contents
+    return entries
+
+
+def diff_values(expected: Any, actual: Any, path: str = "") -> List[str]:
+    """Field-level differences between a captured and a replayed result."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        diffs = []
+        for key in sorted(set(expected) | set(actual)):
+            diffs += diff_values(expected.get(key), actual.get(key), f"{path}.{key}" if path else key)
+        return diffs
+    if isinstance(expected, list) and isinstance(actual, list) and len(expected) == len(actual):
+        diffs = []
+        for index, (left, right) in enumerate(zip(expected, actual)):
+            diffs += diff_values(left, right, f"{path}[{index}]")
+        return diffs
+    return [] if expected == actual else [f"{path}: {expected!r} -> {actual!r}"]
+
+
+def diff_result(entry: Dict[str, Any], status_code: int, body: Any) -> Optional[List[str]]:
+    """None when there is nothing to compare (the captured or replayed request failed)."""
+    captured = entry.get("result")
+    if captured is None or status_code != 200 or not isinstance(body, dict):
+        return None
+    diffs = diff_values(captured["status"], body.get("status"), "status")
+    return diffs + diff_values(captured["results"], body.get("results"), "results")
+
+
+async def send(client, entry: Dict[str, Any]) -> Tuple[int, Any, float]:
+    url = entry["path"] + (f"?{entry['query']}" if entry.get("query") else "")
+    files = {"file": (entry.get("filename") or "upload", entry["contents"], entry.get("content_type"))}
+    start = time.perf_counter()
+    try:
+        response = await client.post(url, files=files, headers={**(entry.get("headers") or {}), REPLAY_HEADER: "1"})
+    except Exception as e:
+        return 0, str(e), time.perf_counter() - start
+    latency = time.perf_counter() - start
+    try:
+        body = response.json()
+    except ValueError:
+        body = response.text
+    return response.status_code, body, latency
+
+
+async def replay(entries: List[Dict[str, Any]], base_url: str, speed: Optional[float],
+                 concurrency: int, timeout: float) -> List[Tuple[int, Any, float]]:
+    """Send every entry; `speed` None means as fast as `concurrency` allows."""
+    import httpx
+
+    outcomes: List[Optional[Tuple[int, Any, float]]] = [None] * len(entries)
+    limits = httpx.Limits(max_connections=None if speed else concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        if speed is None:
+            queue = iter(range(len(entries)))
+
+            async def worker():
+                for index in queue:
+                    outcomes[index] = await send(client, entries[index])
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        else:
+            first = datetime.fromisoformat(entries[0]["time"])
+            start = time.monotonic()
+
+            async def scheduled(index: int):
+                offset = (datetime.fromisoformat(entries[index]["time"]) - first).total_seconds() / speed
+                await asyncio.sleep(max(0.0, start + offset - time.monotonic()))
+                outcomes[index] = await send(client, entries[index])
+
+            await asyncio.gather(*(scheduled(index) for index in range(len(entries))))
+    return outcomes
+
+
+def summarise(entries, outcomes, wall: float) -> Dict[str, Any]:
+    routes: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+        "captured": [], "replayed": [], "status": Counter(), "identical": 0, "different": 0, "diffs": []
+    })
+    for entry, (status_code, body, latency) in zip(entries, outcomes):
+        route = routes[entry["path"]]
+        route["status"][status_code] += 1
+        route["captured"].append(entry["latency_ms"] / 1000)
+        route["replayed"].append(latency)
+        diffs = diff_result(entry, status_code, body)
+        if diffs is None:
+            continue
+        if diffs:
+            route["different"] += 1
+            route["diffs"].append({"sha256": entry["sha256"], "diffs": diffs})
+        else:
+            route["identical"] += 1
+
+    report = {"requests": len(entries), "wall_seconds": wall, "routes": {}}
+    for path, route in sorted(routes.items()):
+        report["routes"][path] = {
+            "requests": len(route["replayed"]),
+            "status": {str(code): count for code, count in sorted(route["status"].items())},
+            "captured_latency": percentiles(route["captured"]),
+            "replayed_latency": percentiles(route["replayed"]),
+            "identical": route["identical"],
+            "different": route["different"],
+            "diffs": route["diffs"],
+        }
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"Replayed {report['requests']} requests in {report['wall_seconds']:.1f}s")
+    print(f"\n{'route':<22} {'n':>5} {'':<9} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}  status")
+    for path, route in report["routes"].items():
+        status = " ".join(f"{code}x{count}" for code, count in route["status"].items())
+        for label, key in (("captured", "captured_latency"), ("replayed", "replayed_latency")):
+            latency = route[key]
+            print(f"{path if label == 'captured' else '':<22} {route['requests'] if label == 'captured' else '':>5} "
+                  f"{label:<9} " + " ".join(f"{latency[q] * 1000:>6.0f}ms" for q in ("mean", "p50", "p95", "p99"))
+                  + (f"  {status}" if label == "replayed" else ""))
+
+    print(f"\n{'route':<22} {'identical':>9} {'different':>9}")
+    for path, route in report["routes"].items():
+        print(f"{path:<22} {route['identical']:>9} {route['different']:>9}")
+        for item in route["diffs"]:
+            print(f"  {item['sha256'][:12]}:")
+            for line in item["diffs"][:MAX_LISTED_DIFFS]:
+                print(f"    {line}")
+            if len(item["diffs"]) > MAX_LISTED_DIFFS:
+                print(f"    ... {len(item['diffs']) - MAX_LISTED_DIFFS} more")
+
+
+def parse_speed(value: str) -> Optional[float]:
+    if value == "max":
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="Capture file (TRAFFIC_CAPTURE_PATH)")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--speed", type=parse_speed, default=1.0,
+                        help="Pace multiplier over the captured arrival times, or 'max'")
+    parser.add_argument("--concurrency", type=int, default=8, help="In-flight requests with --speed max")
+    parser.add_argument("--route", help="Only replay this path, e.g. /api/ic")
+    parser.add_argument("--limit", type=int, help="Only replay the first N requests")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout (seconds)")
+    parser.add_argument("--report", help="Also write the report as JSON to this file")
+    parser.add_argument("--fail-on-diff", action="store_true", help="Exit non-zero if any result differs")
+    args = parser.parse_args(argv)
+
+    entries = load_capture(args.capture, args.limit, args.route)
+    if not entries:
+        print(f"No replayable requests in {args.capture}")
+        return 1
+
+    start = time.perf_counter()
+    outcomes = asyncio.run(replay(entries, args.base_url, args.speed, args.concurrency, args.timeout))
+    report = summarise(entries, outcomes, time.perf_counter() - start)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    failed = sum(1 for status_code, _, _ in outcomes if status_code == 0 or status_code >= 500)
+    different = sum(route["different"] for route in report["routes"].values())
+    if failed:
+        print(f"\n{failed} request(s) failed")
+    return 1 if failed or (args.fail_on_diff and different) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# utils/cpu_partition.py
+# Splitting a node's CPU cores between the processes that run a model on CPU.
+
+import fcntl
+import os
+from typing import List, Optional
+
+# Lock files held by the processes that claimed a slot (kept open for the
+# life of the process; the kernel releases them when it exits)
+_claimed = []
+
+def available_cpus() -> List[int]:
+    """Logical CPUs this process may run on (honours taskset and cgroup cpusets)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def physical_cores(cpus: List[int]) -> List[List[int]]:
+    """
+    Group logical CPUs into physical cores (SMT siblings together), in CPU order.
+
+    Falls back to one core per logical CPU when the topology is not readable.
+    """
+    cores = {}
+    for cpu in cpus:
+        path = f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list"
+        try:
+            with open(path) as f:
+                key = f.read().strip()
+        except OSError:
+            key = str(cpu)
+        cores.setdefault(key, []).append(cpu)
+    return sorted(cores.values())
+
+def partition(cores: List[List[int]], workers: int, slot: int) -> List[List[int]]:
+    """
+    The physical cores of `slot` when `cores` are split between `workers`.
+
+    Slices are contiguous (neighbouring cores tend to share caches) and differ
+    in size by at most one core; with more workers than cores, slots share
+    cores round-robin.
+    """
+    if workers >= len(cores):
+        return [cores[slot % len(cores)]]
+    size, extra = divmod(len(cores), workers)
+    start = slot * size + min(slot, extra)
+    return cores[start:start + size + (1 if slot < extra else 0)]
+
+def claim_slot(workers: int, lock_dir: str, name: str = "cpu-slot") -> Optional[int]:
+    """
+    Claim the first free of `workers` slots on this node with an exclusive file lock.
+
+    Every process that loads a model calls this; the lock is held until the
+    process exits, so a restarted worker takes over the slot it left. Returns
+    None when every slot is taken.
+    """
+    os.makedirs(lock_dir, exist_ok=True)
+    for slot in range(workers):
+        fd = os.open(os.path.join(lock_dir, f"{name}-{slot}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            continue
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        _claimed.append(fd)
+        return slot
+    return None
+
+def pin_process(cpus: List[int]) -> None:
+    """
+    Restrict every thread of this process to `cpus`.
+
+    Linux applies affinity per thread, and new threads inherit it from the
+    thread that starts them, so threads that already exist are pinned too.
+    """
+    try:
+        threads = [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        threads = [0]
+    for tid in threads:
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except ProcessLookupError:
+            # The thread exited in the meantime
+            pass
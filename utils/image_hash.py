@@ -0,0 +1,127 @@
+# utils/image_hash.py
+# Perceptual hashes for spotting repeated or near-identical images.
+
+from typing import Any, Dict, Generic, List, Tuple, TypeVar
+import numpy as np
+from PIL import Image
+
+T = TypeVar("T")
+
+def compute_dhash(pil_img: Image.Image, hash_size: int = 16) -> int:
+    """
+    Compute a difference hash (dHash) of an image.
+
+    The image is reduced to (hash_size + 1) x hash_size grayscale pixels and each
+    bit records whether a pixel is brighter than its right-hand neighbour, so the
+    hash survives rescaling and recompression but changes with content.
+
+    Args:
+        pil_img: PIL.Image.Image input image.
+        hash_size: side of the bit grid; the hash has hash_size**2 bits.
+
+    Returns:
+        Hash as a Python int.
+    """
+    small = pil_img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return (a ^ b).bit_count()
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis: row k holds the k-th cosine over n samples."""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    basis = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    basis[0] /= np.sqrt(2.0)
+    return basis
+
+def compute_phash(pil_img: Image.Image, hash_size: int = 16, highfreq_factor: int = 4) -> int:
+    """
+    Compute a DCT perceptual hash (pHash) of an image.
+
+    The image is reduced to a (hash_size * highfreq_factor)² grayscale square
+    and transformed with a 2-D DCT; each bit records whether one of the
+    hash_size x hash_size lowest frequencies is above their median. Low
+    frequencies describe the overall layout, so the hash survives rescaling,
+    recompression, mild blur and brightness changes.
+
+    Args:
+        pil_img: PIL.Image.Image input image.
+        hash_size: side of the kept frequency block; the hash has hash_size**2 bits.
+        highfreq_factor: how much larger than the kept block the transformed image is.
+
+    Returns:
+        Hash as a Python int.
+    """
+    size = hash_size * highfreq_factor
+    small = pil_img.convert("L").resize((size, size), Image.Resampling.LANCZOS)
+    basis = _dct_matrix(size)
+    dct = basis @ np.asarray(small, dtype=np.float64) @ basis.T
+    low = dct[:hash_size, :hash_size].flatten()
+    # The DC term only measures overall brightness
+    bits = low > np.median(low[1:])
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+class MultiIndexHash(Generic[T]):
+    """
+    Exact radius search over fixed-width hashes under Hamming distance.
+
+    Multi-index hashing: the bits are split into `max_distance + 1` chunks,
+    each with its own table from chunk value to entries. Two hashes within
+    `max_distance` bits differ in at most `max_distance` chunks, so they are
+    equal on at least one; looking the query's chunks up in their tables
+    finds every candidate, and only the candidates are compared in full.
+    Unrelated hashes rarely share a whole chunk, so a lookup costs a few
+    dictionary probes rather than a scan.
+
+    Values are unique (adding one again replaces it).
+    """
+
+    def __init__(self, bits: int, max_distance: int):
+        self.bits = bits
+        self.max_distance = max_distance
+        chunks = min(bits, max_distance + 1)
+        bounds = [bits * i // chunks for i in range(chunks + 1)]
+        # (shift, mask) of each chunk
+        self._chunks = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self._tables: List[Dict[int, set]] = [{} for _ in self._chunks]
+        self._hashes: Dict[Any, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, hash_value: int, value: T) -> None:
+        self.remove(value)
+        self._hashes[value] = hash_value
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            table.setdefault((hash_value >> shift) & mask, set()).add(value)
+
+    def remove(self, value: T) -> bool:
+        """Remove `value`; True if it was present."""
+        hash_value = self._hashes.pop(value, None)
+        if hash_value is None:
+            return False
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            key = (hash_value >> shift) & mask
+            bucket = table[key]
+            bucket.discard(value)
+            if not bucket:
+                del table[key]
+        return True
+
+    def search(self, hash_value: int) -> List[Tuple[int, T]]:
+        """Entries within `max_distance`, as (distance, value), nearest first."""
+        candidates = set()
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            candidates.update(table.get((hash_value >> shift) & mask, ()))
+        matches = []
+        for value in candidates:
+            distance = hamming_distance(hash_value, self._hashes[value])
+            if distance <= self.max_distance:
+                matches.append((distance, value))
+        matches.sort(key=lambda match: match[0])
+        return matches
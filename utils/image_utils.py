@@ -3,3 +3,17 @@ import io
 
 def load_image_from_bytes(image_bytes: bytes):
     return Image.open(io.BytesIO(image_bytes)).convert("RGB")
+
+def resize_to_max_dim(pil_img: Image.Image, max_dim: int = 1200) -> Image.Image:
+    """Resize largest side to `max_dim` preserving aspect ratio (in place)."""
+    if max(pil_img.size) > max_dim:
+        pil_img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+    return pil_img
+
+def resize_to_max_pixels(pil_img: Image.Image, max_pixels: int) -> Image.Image:
+    """Shrink so width * height is at most `max_pixels`, preserving aspect ratio (in place)."""
+    width, height = pil_img.size
+    if width * height > max_pixels:
+        scale = (max_pixels / (width * height)) ** 0.5
+        pil_img.thumbnail((max(1, int(width * scale)), max(1, int(height * scale))), Image.Resampling.LANCZOS)
+    return pil_img
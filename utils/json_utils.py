@@ -0,0 +1,228 @@
+import ast
+import re
+import json
+from typing import Iterable, List, Optional, Tuple
+
+# Repairs that the original strict parser already performed; anything else
+# means the output would previously have come back as parse_failed.
+STRICT_REPAIRS = {"strip_fences", "unescape_string"}
+
+_LITERALS = {"None": "null", "True": "true", "False": "false", "null": "null", "true": "true", "false": "false"}
+_MAX_TRUNCATION_RETRIES = 8
+
+
+def _unwrap(text: str, repairs: List[str]) -> str:
+    """Peel fences, Python tuple/list wrappers and JSON string literals off model output."""
+    cleaned = re.sub(r"```(?:json)?", "", text).strip()
+    if cleaned != text.strip():
+        repairs.append("strip_fences")
+
+    for _ in range(3):
+        # e.g. ('{"date": ...}',) from a tuple-valued prompt
+        if cleaned[:1] in ("(", "[") and cleaned[1:].lstrip()[:1] in ("'", '"'):
+            try:
+                value = ast.literal_eval(cleaned)
+            except (ValueError, SyntaxError):
+                value = None
+            if isinstance(value, (tuple, list)) and value and isinstance(value[0], str):
+                cleaned = value[0].strip()
+                repairs.append("unwrap_sequence")
+                continue
+
+        # The model returned a JSON string literal containing JSON
+        if cleaned.startswith('"') and cleaned.endswith('"') and len(cleaned) > 1:
+            try:
+                value = json.loads(cleaned)
+            except json.JSONDecodeError:
+                try:
+                    value = bytes(cleaned[1:-1], "utf-8").decode("unicode_escape")
+                except UnicodeDecodeError:
+                    value = None
+            if isinstance(value, str):
+                cleaned = value.strip()
+                repairs.append("unescape_string")
+                continue
+        break
+    return cleaned
+
+
+def _scan_object(text: str, repairs: List[str]) -> Optional[Tuple[str, List[Tuple[int, str]], str]]:
+    """
+    Rewrite the first JSON-ish object in `text` into strict JSON tokens.
+    
+    Single-quoted strings, Python literals, unquoted keys and trailing commas
+    are normalised on the way. Returns (json_text, comma_checkpoints, open_stack),
+    where checkpoints record every top-level-of-its-container comma so a
+    truncated tail can be cut back; open_stack lists containers still open.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    if text[:start].strip():
+        repairs.append("extract_object")
+
+    out: List[str] = []
+    stack: List[str] = []
+    checkpoints: List[Tuple[int, str]] = []
+    quote: Optional[str] = None
+    i = start
+    n = len(text)
+
+    while i < n:
+        ch = text[i]
+        if quote:
+            if ch == "\\" and i + 1 < n:
+                nxt = text[i + 1]
+                if quote == "'" and nxt == "'":
+                    out.append("'")
+                else:
+                    out.append(text[i:i + 2])
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in ('"', "'"):
+            if ch == "'":
+                repairs.append("single_quotes")
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            # Drop a trailing comma before the closing bracket
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+                repairs.append("trailing_commas")
+            if stack:
+                stack.pop()
+            out.append("}" if ch == "}" else "]")
+            if not stack:
+                if text[i + 1:].strip():
+                    repairs.append("extract_object")
+                return "".join(out), checkpoints, ""
+        elif ch == ",":
+            checkpoints.append((len(out), "".join(stack)))
+            out.append(ch)
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] in "_-"):
+                j += 1
+            word = text[i:j]
+            if word in _LITERALS:
+                if _LITERALS[word] != word:
+                    repairs.append("python_literals")
+                out.append(_LITERALS[word])
+            elif text[j:].lstrip().startswith(":"):
+                repairs.append("unquoted_keys")
+                out.append(json.dumps(word))
+            else:
+                # Unquoted value such as N/A: quote everything up to the next delimiter
+                while j < n and text[j] not in ",}]\n":
+                    j += 1
+                repairs.append("bare_words")
+                out.append(json.dumps(text[i:j].strip()))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    # Ran off the end: the output was truncated mid-object
+    if quote:
+        out.append('"')
+    return "".join(out), checkpoints, "".join(stack)
+
+
+def _close(fragment: str, stack: str) -> str:
+    fragment = fragment.rstrip()
+    while fragment.endswith((",", ":")):
+        fragment = fragment[:-1].rstrip()
+    return fragment + "".join("}" if c == "{" else "]" for c in reversed(stack))
+
+
+def recover_json(raw: str, expected_keys: Optional[Iterable[str]] = None) -> Tuple[dict, List[str]]:
+    """
+    Leniently parse model output into a dict.
+    
+    Tries a strict load first, then extracts the first balanced object and
+    repairs common defects: code fences, tuple/string wrappers, leading or
+    trailing prose, single quotes, Python literals, unquoted keys, trailing
+    commas and truncation (unterminated strings/objects are closed, and a
+    dangling key is dropped). Keys in `expected_keys` that are missing are
+    filled with None; an object that only came out of repair and holds none
+    of them (e.g. `{` closed up) counts as a failure rather than an all-null
+    extraction. Strictly valid JSON is returned as the model wrote it.
+    
+    Args:
+        raw: Decoded model output
+        expected_keys: Schema keys the prompt asked for
+        
+    Returns:
+        Tuple of (parsed dict, repairs applied). On failure the dict is
+        {"error": "parse_failed", "raw": raw}.
+    """
+    repairs: List[str] = []
+    data = None
+    recovered = False
+    cleaned = _unwrap(raw or "", repairs)
+
+    try:
+        value = json.loads(cleaned)
+        if isinstance(value, dict):
+            data = value
+    except json.JSONDecodeError:
+        pass
+
+    if data is None:
+        scanned = _scan_object(cleaned, repairs)
+        if scanned is not None:
+            fragment, checkpoints, stack = scanned
+            if stack:
+                repairs.append("close_truncated")
+            candidates = [(fragment, stack)] + [
+                (fragment[:pos], open_stack) for pos, open_stack in reversed(checkpoints)
+            ][:_MAX_TRUNCATION_RETRIES] if stack else [(fragment, stack)]
+            for candidate, open_stack in candidates:
+                try:
+                    value = json.loads(_close(candidate, open_stack))
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(value, dict):
+                    data = value
+                    recovered = True
+                    break
+
+    if data is None:
+        return {"error": "parse_failed", "raw": raw}, list(dict.fromkeys(repairs))
+
+    if expected_keys:
+        expected_keys = list(expected_keys)
+        missing = [key for key in expected_keys if key not in data]
+        if recovered and len(missing) == len(expected_keys):
+            return {"error": "parse_failed", "raw": raw}, list(dict.fromkeys(repairs))
+        for key in missing:
+            data[key] = None
+        if missing:
+            repairs.append("fill_missing_keys")
+
+    # Keep the first occurrence of each repair, in the order applied
+    return data, list(dict.fromkeys(repairs))
+
+
+def parse_json_from_string(raw: str) -> dict:
+    """Parse model output into a dict, repairing it where possible."""
+    return recover_json(raw)[0]
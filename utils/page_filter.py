@@ -0,0 +1,59 @@
+# utils/page_filter.py
+# Cheap pre-inference page classification for multi-page documents.
+
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from utils.image_hash import compute_dhash, hamming_distance
+
+BLANK = "blank_page"
+DUPLICATE = "duplicate_page"
+
+def compute_ink_coverage(pil_img: Image.Image, contrast: int = 60, size: int = 512) -> float:
+    """
+    Fraction (0–1) of pixels noticeably darker than the page background.
+
+    The background level is the 90th brightness percentile, so tinted paper and
+    uneven scans are handled; faint bleed-through from the reverse side stays
+    below `contrast` and does not count as ink.
+    """
+    small = pil_img.convert("L")
+    small.thumbnail((size, size))
+    gray = np.asarray(small, dtype=np.int16)
+    background = np.percentile(gray, 90)
+    return float(np.mean(gray < background - contrast))
+
+def classify_page(
+    pil_img: Image.Image,
+    seen_hashes: List[int],
+    max_std: float = 6.0,
+    min_ink: float = 0.002,
+    max_distance: int = 6
+) -> Tuple[Optional[str], int, Optional[int]]:
+    """
+    Decide whether a page is worth sending to the model.
+
+    Args:
+        pil_img: page image.
+        seen_hashes: dHashes of earlier pages of the same document, in page order.
+        max_std: pixel standard deviation at or below which a page is blank.
+        min_ink: ink coverage below which a page is blank.
+        max_distance: Hamming distance (of 256 bits) at or below which a page
+            repeats an earlier one.
+
+    Returns:
+        (reason, page_hash, duplicate_index): reason is None, BLANK or DUPLICATE;
+        duplicate_index is the index into `seen_hashes` of the repeated page.
+    """
+    # Work on one small grayscale copy; every measure below is resolution-independent
+    small = pil_img.copy()
+    small.thumbnail((512, 512), Image.Resampling.BILINEAR)
+    small = small.convert("L")
+    if float(np.asarray(small).std()) <= max_std or compute_ink_coverage(small) < min_ink:
+        return BLANK, 0, None
+
+    page_hash = compute_dhash(small)
+    for index, previous in enumerate(seen_hashes):
+        if previous is not None and hamming_distance(page_hash, previous) <= max_distance:
+            return DUPLICATE, page_hash, index
+    return None, page_hash, None
@@ -1,5 +1,7 @@
 import re
-from typing import Optional
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from PIL import Image
 
 def normalize_passport_number(num: str, country_code: Optional[str] = None) -> Optional[str]:
     """
@@ -34,3 +36,146 @@ def normalize_passport_number(num: str, country_code: Optional[str] = None) -> O
     
     # Keep only first 9 chars (ICAO field length)
     return s[:9] if s else None
+
+
+# ICAO 9303 TD3 (passport) machine readable zone: two lines of 44 characters
+MRZ_LINE_LENGTH = 44
+_MRZ_WEIGHTS = (7, 3, 1)
+_MONTHS = ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC")
+# Letters commonly misread for digits in numeric-only MRZ fields
+_DIGIT_FIXES = str.maketrans({"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "Z": "2", "S": "5", "B": "8", "G": "6"})
+
+
+def mrz_check_digit(field: str) -> int:
+    """
+    Compute the ICAO 9303 check digit of an MRZ field.
+    
+    Digits keep their value, A-Z map to 10-35 and the '<' filler counts as 0;
+    values are weighted 7, 3, 1 repeating and summed modulo 10.
+    """
+    total = 0
+    for i, ch in enumerate(field):
+        if ch.isdigit():
+            value = int(ch)
+        elif "A" <= ch <= "Z":
+            value = ord(ch) - ord("A") + 10
+        else:
+            value = 0
+        total += value * _MRZ_WEIGHTS[i % 3]
+    return total % 10
+
+
+def _check(field: str, digit: str) -> bool:
+    # An all-filler optional field may carry '<' instead of 0 as its check digit
+    if digit == "<":
+        return field.strip("<") == ""
+    return digit.isdigit() and mrz_check_digit(field) == int(digit)
+
+
+def extract_mrz_lines(text: str) -> Optional[Tuple[str, str]]:
+    """
+    Pick the two TD3 MRZ lines out of raw OCR/model text.
+    
+    Whitespace inside a line is dropped; the last two candidate lines of
+    exactly 44 MRZ characters are returned, or None if there are not two.
+    """
+    if not text:
+        return None
+    candidates = []
+    for line in str(text).upper().splitlines():
+        cleaned = re.sub(r"\s+", "", line).replace("«", "<")
+        if len(cleaned) == MRZ_LINE_LENGTH and re.fullmatch(r"[A-Z0-9<]+", cleaned):
+            candidates.append(cleaned)
+    if len(candidates) < 2:
+        return None
+    return candidates[-2], candidates[-1]
+
+
+def _format_mrz_date(yymmdd: str, future: bool) -> Optional[str]:
+    """YYMMDD -> DD MMM YYYY. Birth dates resolve to the past, expiry dates to the future."""
+    if not yymmdd.isdigit():
+        return None
+    yy, mm, dd = int(yymmdd[:2]), int(yymmdd[2:4]), int(yymmdd[4:])
+    if not 1 <= mm <= 12 or not 1 <= dd <= 31:
+        return None
+    current = datetime.now().year % 100
+    if future:
+        century = 2000 if yy < current + 50 else 1900
+    else:
+        century = 1900 if yy > current else 2000
+    return f"{dd:02d} {_MONTHS[mm - 1]} {century + yy}"
+
+
+def _repair_line2(line2: str) -> str:
+    """Map letters misread for digits in the numeric-only fields of line 2."""
+    chars = list(line2)
+    for start, end in ((9, 10), (13, 20), (21, 28), (43, 44)):
+        chars[start:end] = list("".join(chars[start:end]).translate(_DIGIT_FIXES))
+    return "".join(chars)
+
+
+def mrz_check_results(line2: str) -> Dict[str, bool]:
+    """Validate every check digit of a TD3 line 2."""
+    return {
+        "passportNumber": _check(line2[0:9], line2[9]),
+        "dateOfBirth": _check(line2[13:19], line2[19]),
+        "dateOfExpiry": _check(line2[21:27], line2[27]),
+        "nationalId": _check(line2[28:42], line2[42]),
+        "composite": _check(line2[0:10] + line2[13:20] + line2[21:43], line2[43]),
+    }
+
+
+def parse_td3_mrz(line1: str, line2: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse a TD3 passport MRZ into the passport prompt's field names.
+    
+    Args:
+        line1: First MRZ line (document type, issuing state, name)
+        line2: Second MRZ line (number, nationality, dates, personal number)
+        
+    Returns:
+        Dictionary of decoded fields plus `checkDigits` (field -> valid) and
+        `checksValid`, or None if the lines are not TD3 shaped
+    """
+    if len(line1) != MRZ_LINE_LENGTH or len(line2) != MRZ_LINE_LENGTH or line1[0] != "P":
+        return None
+
+    checks = mrz_check_results(line2)
+    if not all(checks.values()):
+        repaired = _repair_line2(line2)
+        repaired_checks = mrz_check_results(repaired)
+        if sum(repaired_checks.values()) > sum(checks.values()):
+            line2, checks = repaired, repaired_checks
+
+    surname, _, given = line1[5:].partition("<<")
+    last_name = surname.replace("<", " ").strip() or None
+    first_name = given.replace("<", " ").strip() or None
+    sex = line2[20] if line2[20] in ("M", "F") else None
+
+    return {
+        "type": line1[0:2].replace("<", "") or None,
+        "countryCode": line1[2:5].replace("<", "") or None,
+        "passportNumber": line2[0:9].replace("<", "") or None,
+        "nationality": line2[10:13].replace("<", "") or None,
+        "fullName": " ".join(n for n in (last_name, first_name) if n) or None,
+        "lastName": last_name,
+        "firstName": first_name,
+        "nationalId": line2[28:42].replace("<", "") or None,
+        "dateOfBirth": _format_mrz_date(line2[13:19], future=False),
+        "sex": sex,
+        "dateOfExpiry": _format_mrz_date(line2[21:27], future=True),
+        "checkDigits": checks,
+        "checksValid": all(checks.values()),
+    }
+
+
+def crop_mrz_band(pil_img: Image.Image, fraction: float = 0.3) -> Image.Image:
+    """Crop the bottom `fraction` of a passport data page, where the TD3 MRZ sits."""
+    width, height = pil_img.size
+    return pil_img.crop((0, int(height * (1.0 - fraction)), width, height))
+
+
+def crop_visual_zone(pil_img: Image.Image, mrz_fraction: float = 0.3) -> Image.Image:
+    """Crop a passport data page above the MRZ band (photo and printed fields)."""
+    width, height = pil_img.size
+    return pil_img.crop((0, 0, width, int(height * (1.0 - mrz_fraction))))